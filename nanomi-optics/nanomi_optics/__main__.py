@@ -1,9 +1,70 @@
-from .gui.window_main import MainWindow
+import argparse
+import importlib
 
+# subcommand to the module running it and its help
+COMMANDS = {
+    "batch": ("batch", "evaluate configurations without the GUI"),
+    "startup": ("startup", "profile the imports done before the GUI is shown"),
+    "bench": ("benchmark", "time the engine and compare with a baseline"),
+    "tolerance": ("tolerance", "spread of the lower column over lens errors"),
+    "render": ("render", "write the diagram of configurations as images"),
+}
 
-def main():
-    main_window = MainWindow()
-    main_window.mainloop()
+
+class CommandParser(argparse.ArgumentParser):
+    """parser of a subcommand, its module is imported when it is used
+
+    The modules of the subcommands import the engine, so the GUI does
+    not wait for the modules of subcommands it never runs.
+    """
+    def __init__(self, *args, module=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.module_name = module
+        self.module = None
+
+    def load(self):
+        """import the module of the subcommand and add its arguments"""
+        if self.module is None:
+            self.module = importlib.import_module(
+                f".{self.module_name}", __package__
+            )
+            self.module.add_arguments(self)
+            self.set_defaults(run=self.module.main)
+        return self.module
+
+    def parse_known_args(self, args=None, namespace=None):
+        """parse the arguments of the subcommand, once it is loaded"""
+        self.load()
+        return super().parse_known_args(args, namespace)
+
+    def format_help(self):
+        """help of the subcommand, once it is loaded"""
+        self.load()
+        return super().format_help()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="nanomi_optics")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="show the time spent in every stage of the diagram updates"
+    )
+    subparsers = parser.add_subparsers(
+        dest="command", parser_class=CommandParser
+    )
+    for command, (module, description) in COMMANDS.items():
+        subparsers.add_parser(command, module=module, help=description)
+    args = parser.parse_args(argv)
+    if args.profile and args.command is not None:
+        parser.error("--profile only applies to the GUI")
+
+    if args.command is not None:
+        args.run(args)
+    else:
+        # tkinter and matplotlib are only imported to open the GUI
+        from .gui.window_main import MainWindow
+        main_window = MainWindow(profile=args.profile)
+        main_window.mainloop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,343 @@
+"""
+Headless evaluation of many column configurations.
+Reads configurations from a CSV or NPZ file and writes one columnar
+result file, NPZ, HDF5 or Parquet, or a CSV file, without importing
+tkinter or matplotlib.
+"""
+
+import csv
+import os
+import numpy as np
+from .engine.ray_transfer import trace_column
+from .engine.optimization import optimize_focal_length
+from .engine.lens_excitation import ur_symmetric, ur_asymmetric
+from .engine.save_results import (
+    ResultsWriter, batch_schema, is_columnar, results_schema
+)
+from .engine.parallel import map_chunks
+from .engine.layout import (
+    LENS_NAMES, FOCAL_LENGTHS, CA_DIAMETER, SOURCE_LOCATION,
+    SAMPLE_LOCATION, SCINTILLATOR_LOCATION, SOURCE_RAYS,
+    UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS, sample_rays
+)
+
+# initial distance from the optical axis at the sample in [nm]
+DEFAULT_DISTANCE = 10
+
+# configurations evaluated at once by a worker
+CHUNK_SIZE = 10000
+
+
+def parse_bool(value):
+    """reads an active flag written as 1/0, true/false or on/off"""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "on", "yes")
+    return bool(value)
+
+
+def parse_lens(value):
+    """reads the lens to optimize as a lower lens index, -1 for none"""
+    if isinstance(value, str):
+        value = value.strip()
+        if value in LENS_NAMES[3:]:
+            return LENS_NAMES[3:].index(value)
+        if value in ("", "None", "none"):
+            return -1
+    return int(float(value))
+
+
+def check_lenses(optimize_lens):
+    """raise a ValueError naming the first configuration whose lens to
+    optimize is not a lower lens index or -1"""
+    num_lenses = len(LENS_NAMES[3:])
+    optimize_lens = np.asarray(optimize_lens)
+    invalid = np.flatnonzero(
+        (optimize_lens < -1) | (optimize_lens >= num_lenses)
+    )
+    if len(invalid):
+        row = invalid[0]
+        raise ValueError(
+            f"configuration {row}: optimize_lens {optimize_lens[row]} is "
+            f"not a lower lens index from 0 to {num_lenses - 1} or -1"
+        )
+
+
+def read_configurations(path):
+    """read column configurations from a CSV or NPZ file
+
+    Every column is optional, missing ones take the GUI initial values:
+    f_<lens> focal length [mm], active_<lens> on/off, distance [nm]
+    from the optical axis at the sample, optimize_lens (lower lens name
+    or index, -1 for none) and optimize_mode (Image or Diffraction).
+
+    Args:
+        path (str): CSV file with a header row, or NPZ file of columns
+
+    Returns:
+        (dict): column name to array of one value per configuration
+
+    Raises:
+        ValueError: a lens to optimize is not a lower lens
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            raw = {key: data[key] for key in data.files}
+    else:
+        with open(path, "r", newline="") as file:
+            rows = list(csv.DictReader(file))
+        raw = {key: [row[key] for row in rows] for key in rows[0]} \
+            if rows else {}
+    size = len(next(iter(raw.values()))) if raw else 0
+
+    def column(name, default, parse):
+        if name not in raw:
+            return np.full(size, default)
+        return np.array([parse(value) for value in raw[name]])
+
+    configurations = {}
+    for name, default in zip(LENS_NAMES, FOCAL_LENGTHS):
+        configurations[f"f_{name}"] = column(f"f_{name}", default, float)
+    for name in LENS_NAMES:
+        configurations[f"active_{name}"] = column(
+            f"active_{name}", True, parse_bool
+        )
+    configurations["distance"] = column("distance", DEFAULT_DISTANCE, float)
+    configurations["optimize_lens"] = column("optimize_lens", -1, parse_lens)
+    check_lenses(configurations["optimize_lens"])
+    configurations["optimize_mode"] = column(
+        "optimize_mode", "Image", lambda value: str(value).strip()
+    )
+    return configurations
+
+
+def trace_batch(rays, locations, focal_lengths, active, object_location,
+                screen_location):
+    """trace configurations grouped by their active lenses
+
+    Rays may differ between configurations, they are traced as the two
+    unit rays and combined since the path is linear in the ray.
+
+    Args:
+        rays: (M, N, 2) rays of every configuration
+        locations: K lens locations from origin
+        focal_lengths: (M, K) focal lengths of every configuration
+        active: (M, K) bool active lenses of every configuration
+        object_location: location the rays start from
+        screen_location: location of the final plane
+
+    Returns:
+        heights (np.array): (M, N, K + 1) heights at lenses and screen,
+            nan for inactive lenses
+        output_planes (np.array): (M, K) output plane of every lens
+        magnifications (np.array): (M, K) lens magnifications, 0 inactive
+    """
+    size, num_lenses = focal_lengths.shape
+    heights = np.full((size, rays.shape[1], num_lenses + 1), np.nan)
+    output_planes = np.full((size, num_lenses), np.nan)
+    magnifications = np.zeros((size, num_lenses))
+    # every pattern of active lenses as the bits of an integer
+    patterns = active @ (1 << np.arange(num_lenses))
+    for pattern in np.flatnonzero(np.bincount(patterns)):
+        rows = np.flatnonzero(patterns == pattern)
+        lenses = np.flatnonzero(pattern >> np.arange(num_lenses) & 1)
+        trace = trace_column(
+            np.identity(2), np.asarray(locations)[lenses],
+            focal_lengths[np.ix_(rows, lenses)],
+            object_location, screen_location
+        )
+        # (rows, 2, K + 1) heights of the unit rays
+        unit = np.concatenate(
+            [trace.lens_heights, trace.screen_heights[..., None]], axis=-1
+        )
+        if len(lenses) == 0:
+            unit = unit[..., -1:]
+        columns = np.append(lenses, num_lenses)
+        heights[np.ix_(rows, np.arange(rays.shape[1]), columns)] = \
+            np.einsum("rnj,rjk->rnk", rays[rows], unit)
+        output_planes[np.ix_(rows, lenses)] = trace.output_plane_locations
+        magnifications[np.ix_(rows, lenses)] = trace.magnifications
+    return heights, output_planes, magnifications
+
+
+def evaluate_configurations(configurations):
+    """compute ray paths, magnifications and optimizations
+
+    Args:
+        configurations (dict): columns from read_configurations
+
+    Returns:
+        (dict): result column name to array
+    """
+    focal_lengths = np.stack(
+        [configurations[f"f_{name}"] for name in LENS_NAMES], axis=-1
+    ).astype(float)
+    active = np.stack(
+        [configurations[f"active_{name}"] for name in LENS_NAMES], axis=-1
+    ).astype(bool)
+    distance = np.asarray(configurations["distance"], dtype=float) * 1e-6
+    size = len(distance)
+    lower_rays = sample_rays(distance)
+
+    # optimized lenses are always on, as in the GUI
+    optimize_lens = np.asarray(configurations["optimize_lens"], dtype=int)
+    check_lenses(optimize_lens)
+    for row in np.flatnonzero(optimize_lens != -1):
+        lens = optimize_lens[row]
+        active[row, 3 + lens] = True
+        focal_lengths[row, 3 + lens] = optimize_focal_length(
+            configurations["optimize_mode"][row], lens,
+            LOWER_LENS_LOCATIONS, list(focal_lengths[row, 3:]),
+            lower_rays[row, 0:2], list(active[row, 3:])
+        )
+
+    upper_heights, upper_planes, upper_mag = trace_batch(
+        np.broadcast_to(SOURCE_RAYS, (size,) + SOURCE_RAYS.shape),
+        UPPER_LENS_LOCATIONS, focal_lengths[:, :3], active[:, :3],
+        SOURCE_LOCATION, SAMPLE_LOCATION
+    )
+    lower_heights, lower_planes, lower_mag = trace_batch(
+        lower_rays, LOWER_LENS_LOCATIONS, focal_lengths[:, 3:],
+        active[:, 3:], SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+    )
+    # the scattered ray, so unlike the transverse magnification of a
+    # sweep this includes B lambda / distance ** 2, as in the GUI
+    magnification = np.abs(lower_heights[:, 1, -1] / distance)
+
+    results = {}
+    for i, name in enumerate(LENS_NAMES):
+        results[f"f_{name}"] = focal_lengths[:, i]
+    results["ur_C1"] = ur_symmetric(focal_lengths[:, 0])
+    results["ur_C2"] = ur_asymmetric(focal_lengths[:, 1])
+    results["ur_C3"] = ur_asymmetric(focal_lengths[:, 2])
+    magnifications = np.concatenate([upper_mag, lower_mag], axis=-1)
+    for i, name in enumerate(LENS_NAMES):
+        results[f"mag_{name}"] = magnifications[:, i]
+    for i, name in enumerate(LENS_NAMES):
+        results[f"active_{name}"] = active[:, i]
+    results["distance"] = distance
+    results["aperture"] = np.full(size, CA_DIAMETER)
+    results["magnification"] = magnification
+    results["upper_output_planes"] = upper_planes
+    results["lower_output_planes"] = lower_planes
+    results["upper_ray_heights"] = upper_heights
+    results["lower_ray_heights"] = lower_heights
+    return results
+
+
+def configuration_rows(configurations, start, stop):
+    """the configurations between two row indices"""
+    return {key: value[start:stop] for key, value in configurations.items()}
+
+
+def batch_chunks(configurations, processes=None, chunk_size=CHUNK_SIZE):
+    """evaluate configurations in chunks across a process pool
+
+    Args:
+        configurations (dict): columns from read_configurations
+        processes (int): worker processes of map_chunks
+        chunk_size (int): configurations evaluated at once
+
+    Yields:
+        (dict): result column name to array of every chunk, in order
+    """
+    size = len(configurations["distance"])
+    starts = list(range(0, size, chunk_size)) or [0]
+    stops = [min(start + chunk_size, size) for start in starts]
+    # every worker is only sent the rows of its own chunk
+    arguments = [
+        (configuration_rows(configurations, start, stop),)
+        for start, stop in zip(starts, stops)
+    ]
+    yield from map_chunks(evaluate_configurations, arguments, processes)
+
+
+def run_batch(configurations, processes=None, chunk_size=CHUNK_SIZE):
+    """evaluate configurations in chunks across a process pool
+
+    Args:
+        configurations (dict): columns from read_configurations
+        processes (int): worker processes of map_chunks
+        chunk_size (int): configurations evaluated at once
+
+    Returns:
+        (dict): result column name to array
+    """
+    chunks = list(batch_chunks(configurations, processes, chunk_size))
+    return {
+        key: np.concatenate([chunk[key] for chunk in chunks])
+        for key in chunks[0]
+    }
+
+
+def flatten_columns(results):
+    """split multi-dimensional result columns into scalar CSV columns"""
+    columns = {}
+    for key, value in results.items():
+        if value.ndim == 1:
+            columns[key] = value
+            continue
+        for index in np.ndindex(value.shape[1:]):
+            suffix = "_".join(str(i) for i in index)
+            columns[f"{key}_{suffix}"] = value[(slice(None),) + index]
+    return columns
+
+
+def write_results(results, path):
+    """write result columns to a columnar file, or a CSV file with a header
+
+    Args:
+        results (dict): result column name to array
+        path (str): output file, the extension selects the format: NPZ,
+            HDF5 and Parquet as in ResultsWriter, CSV for any other
+    """
+    if is_columnar(path):
+        with ResultsWriter(path, results_schema(results)) as writer:
+            writer.append(results)
+        return
+    columns = flatten_columns(results)
+    table = np.column_stack(
+        [np.asarray(value, dtype=float) for value in columns.values()]
+    )
+    np.savetxt(
+        path, table, fmt="%.17g", delimiter=",",
+        header=",".join(columns), comments=""
+    )
+
+
+def add_arguments(parser):
+    """add the batch command line arguments to a parser"""
+    parser.add_argument("input", help="CSV or NPZ file of configurations")
+    parser.add_argument(
+        "output", help="CSV, NPZ, HDF5 or Parquet file for the results"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="worker processes, one per core by default"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE,
+        help="configurations evaluated at once by a worker"
+    )
+
+
+def main(args):
+    """run the batch command with parsed command line arguments
+
+    Columnar outputs are written chunk by chunk as the workers finish,
+    any other output as CSV once every configuration is evaluated.
+    """
+    configurations = read_configurations(args.input)
+    if is_columnar(args.output):
+        with ResultsWriter(args.output, batch_schema()) as writer:
+            for chunk in batch_chunks(
+                configurations, args.processes, args.chunk_size
+            ):
+                writer.append(chunk)
+        size = writer.rows
+    else:
+        results = run_batch(configurations, args.processes, args.chunk_size)
+        write_results(results, args.output)
+        size = len(results["distance"])
+    print(
+        f"{size} configurations written to {os.path.abspath(args.output)}"
+    )
@@ -0,0 +1,334 @@
+"""
+Speed benchmarks of the optics engine.
+Results are kept as JSON baselines, one file per machine, and a new run
+is compared against a baseline to flag regressions.
+"""
+
+import itertools
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import timeit
+import weakref
+import numpy as np
+from .engine.operating_point import CACHE_SIZE
+from .engine.optimization import optimize_focal_length
+from .engine.ray_transfer import trace_column
+from .engine.save_results import ResultsWriter, batch_schema, save_csv
+from .startup import cold_start
+from .engine.layout import (
+    FOCAL_LENGTHS, SAMPLE_LOCATION, SCINTILLATOR_LOCATION,
+    LOWER_LENS_LOCATIONS, sample_rays
+)
+
+# folder of the baselines
+BASELINE_DIR = "benchmarks"
+
+# timings taken of every benchmark, the best and the median are kept
+REPEAT = 5
+
+# relative slow down before a benchmark counts as a regression
+THRESHOLD = 0.2
+
+# rays of the bundle benchmark
+BUNDLE_SIZE = 10000
+
+# distance from the optical axis at the sample in mm, as in the GUI
+DISTANCE = 1e-5
+
+
+def single_ray():
+    """one ray through the lower lenses"""
+    rays = sample_rays(DISTANCE)[1:2]
+    return lambda: trace_column(
+        rays, LOWER_LENS_LOCATIONS, FOCAL_LENGTHS[3:], SAMPLE_LOCATION,
+        SCINTILLATOR_LOCATION
+    )
+
+
+def ray_bundle():
+    """a bundle of rays through the lower lenses"""
+    rng = np.random.default_rng(0)
+    rays = np.column_stack([
+        rng.uniform(-DISTANCE, DISTANCE, BUNDLE_SIZE),
+        rng.uniform(-1e-3, 1e-3, BUNDLE_SIZE)
+    ])
+    return lambda: trace_column(
+        rays, LOWER_LENS_LOCATIONS, FOCAL_LENGTHS[3:], SAMPLE_LOCATION,
+        SCINTILLATOR_LOCATION
+    )
+
+
+def live_diagram():
+    """the diagram of the GUI on an Agg canvas, drawn once, and the
+    scales of the focal lengths of its timed updates"""
+    # matplotlib is only imported to run this benchmark
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from .gui.artwork import LiveDiagram
+    diagram = LiveDiagram()
+    figure = Figure(figsize=(10, 10))
+    diagram.setup_diagram(figure, FigureCanvasAgg(figure))
+    diagram.display_u_rays()
+    diagram.display_l_rays()
+    diagram.redraw()
+    # more settings than the operating point caches keep, so every
+    # update traces the column as a slider move does
+    scales = itertools.cycle(np.linspace(1, 1.0001, 2 * CACHE_SIZE))
+    return diagram, scales
+
+
+def upper_rays():
+    """ray paths of the upper lenses, as a move of an upper slider"""
+    diagram, scales = live_diagram()
+
+    def update():
+        focal_lengths = [cf * next(scales) for cf in diagram.cf_u]
+        diagram.show_u_rays(
+            diagram.compute_u_rays(focal_lengths, diagram.active_lu)
+        )
+        diagram.redraw()
+
+    return update
+
+
+def lower_rays():
+    """ray paths of the lower lenses, as a move of a lower slider"""
+    diagram, scales = live_diagram()
+
+    def update():
+        focal_lengths = [cf * next(scales) for cf in diagram.cf_l]
+        diagram.show_l_rays(diagram.compute_l_rays(
+            focal_lengths, diagram.active_ll, diagram.distance_from_optical
+        ))
+        diagram.redraw()
+
+    return update
+
+
+def optimize(mode):
+    """optimize the projective focal length in a mode"""
+    rays = sample_rays(DISTANCE)[0:2]
+    return lambda: optimize_focal_length(
+        mode, 2, LOWER_LENS_LOCATIONS, list(FOCAL_LENGTHS[3:]), rays,
+        [True, True, True]
+    )
+
+
+def temporary_folder(function, folder):
+    """remove a folder once a timed function is released, return it"""
+    weakref.finalize(function, shutil.rmtree, folder, ignore_errors=True)
+    return function
+
+
+def results_csv():
+    """write the results file of the GUI"""
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "results.csv")
+
+    def write():
+        save_csv(
+            FOCAL_LENGTHS[:3], [True] * 3, [1.0] * 3, FOCAL_LENGTHS[3:],
+            [True] * 3, [1.0] * 3, [1.0] * 3, 0.01, 1.0, path
+        )
+
+    return temporary_folder(write, folder)
+
+
+def results_npz():
+    """write a bundle of batch results to a columnar NPZ file"""
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, "results.npz")
+    rng = np.random.default_rng(0)
+    results = {
+        name: rng.random((BUNDLE_SIZE,) + shape).astype(dtype)
+        for name, (dtype, shape) in batch_schema().items()
+    }
+
+    def write():
+        with ResultsWriter(path) as writer:
+            writer.append(results)
+
+    return temporary_folder(write, folder)
+
+
+# name to a function returning the timed function, set up untimed
+BENCHMARKS = {
+    "single_ray": single_ray,
+    "ray_bundle": ray_bundle,
+    "upper_rays": upper_rays,
+    "lower_rays": lower_rays,
+    "optimize_image": lambda: optimize("Image"),
+    "optimize_diffraction": lambda: optimize("Diffraction"),
+    "save_csv": results_csv,
+    "write_npz": results_npz,
+    # a fresh interpreter importing the GUI, as the startup command
+    "cold_start": lambda: lambda: cold_start(repeat=1),
+}
+
+
+def machine_name():
+    """name of this machine, usable as a file name"""
+    name = f"{platform.node()}-{platform.machine()}-py" \
+        f"{platform.python_version()}"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def run_benchmarks(names=None, repeat=REPEAT):
+    """time benchmarks
+
+    Every benchmark is called often enough to take at least 0.2 s per
+    timing, the timing is repeated and the best and median are kept.
+
+    Args:
+        names (list): benchmarks to run, None for all
+        repeat (int): timings taken of every benchmark
+
+    Returns:
+        (dict): machine description and seconds per call by benchmark
+    """
+    names = list(BENCHMARKS) if names is None else names
+    results = {}
+    for name in names:
+        timer = timeit.Timer(BENCHMARKS[name]())
+        number, _ = timer.autorange()
+        times = [t / number for t in timer.repeat(repeat, number)]
+        results[name] = {
+            "best": min(times), "median": statistics.median(times),
+            "number": number
+        }
+    return {
+        "machine": machine_name(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "benchmarks": results
+    }
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """compare the best times of two runs
+
+    Args:
+        baseline (dict): earlier run
+        current (dict): new run
+        threshold (float): relative slow down flagged as a regression
+
+    Returns:
+        (list): (name, baseline seconds, current seconds, ratio,
+            regressed) of every benchmark in both runs
+    """
+    rows = []
+    for name, result in current["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        before = baseline["benchmarks"][name]["best"]
+        ratio = result["best"] / before
+        rows.append(
+            (name, before, result["best"], ratio, ratio > 1 + threshold)
+        )
+    return rows
+
+
+def merge_runs(baseline, run):
+    """a baseline updated with the benchmarks of a newer run
+
+    Args:
+        baseline (dict): earlier run
+        run (dict): new run, possibly of only some benchmarks
+
+    Returns:
+        (dict): the machine description of the new run and the timings
+            of both, the new run taking precedence
+    """
+    merged = dict(run)
+    merged["benchmarks"] = {**baseline["benchmarks"], **run["benchmarks"]}
+    return merged
+
+
+def read_run(path):
+    """read a run written by write_run"""
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def write_run(run, path):
+    """write a run to a JSON file, creating its folder"""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(run, file, indent=2)
+
+
+def add_arguments(parser):
+    """add the bench command line arguments to a parser"""
+    parser.add_argument(
+        "--baseline", default=None,
+        help="JSON baseline, benchmarks/<machine>.json by default"
+    )
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="compare with the baseline instead of updating it"
+    )
+    parser.add_argument(
+        "--current", default=None,
+        help="JSON run to compare instead of running the benchmarks"
+    )
+    parser.add_argument(
+        "--output", default=None, help="JSON file for the new run"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=THRESHOLD,
+        help="relative slow down flagged as a regression"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=REPEAT,
+        help="timings taken of every benchmark"
+    )
+    parser.add_argument(
+        "names", nargs="*",
+        help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}"
+    )
+
+
+def main(args):
+    """run the benchmarks, write or compare with the baseline"""
+    baseline_path = args.baseline or os.path.join(
+        BASELINE_DIR, f"{machine_name()}.json"
+    )
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        sys.exit(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    if args.current is not None:
+        run = read_run(args.current)
+    else:
+        run = run_benchmarks(args.names or None, args.repeat)
+        for name, result in run["benchmarks"].items():
+            print(f"{name:<24}{result['best'] * 1e3:12.4f} ms")
+    if args.output is not None:
+        write_run(run, args.output)
+
+    if not args.compare:
+        # benchmarks not run keep their earlier timings in the baseline
+        if os.path.exists(baseline_path):
+            run = merge_runs(read_run(baseline_path), run)
+        write_run(run, baseline_path)
+        print(f"baseline written to {os.path.abspath(baseline_path)}")
+        return
+    if not os.path.exists(baseline_path):
+        sys.exit(f"no baseline at {baseline_path}, run without --compare")
+    rows = compare(read_run(baseline_path), run, args.threshold)
+    print(f"{'benchmark':<24}{'baseline [ms]':>14}{'current [ms]':>14}"
+          f"{'ratio':>8}")
+    for name, before, after, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<24}{before * 1e3:14.4f}{after * 1e3:14.4f}"
+              f"{ratio:8.2f}{flag}")
+    if any(row[-1] for row in rows):
+        sys.exit(1)
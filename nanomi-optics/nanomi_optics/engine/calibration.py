@@ -0,0 +1,361 @@
+"""Lens excitation models backed by calibration tables.
+
+A table holds the focal length of a lens at increasing excitations. The
+forward map, excitation to focal length, is a monotone cubic (PCHIP)
+interpolant of the table and the inverse map interpolates the forward
+one densely, so the two undo each other. Both are resampled on knots
+spaced evenly in the logarithm, converting arrays is a vectorized
+lookup without a search.
+Tables are tabulated from the power laws of lens_excitation, or fit to
+measured focal lengths. Focal lengths are in mm.
+"""
+from collections import namedtuple
+import csv
+import functools
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+from .layout import LENS_NAMES, UPPER_LENS_SYMMETRIC, LOWER_LENS_SYMMETRIC
+
+# knots of a tabulated map
+TABLE_SIZE = 2049
+
+# excitations tabulated from a model, focal lengths of about 2 to 3000 mm
+EXCITATION_RANGE = (0.1, 1.25)
+
+# fit models of measured focal lengths
+MODELS = ("pchip", "power_law")
+
+PowerLaw = namedtuple("PowerLaw", ["scale", "exponent", "offset"])
+PowerLaw.__doc__ = """Focal length f = scale * excitation ** -exponent - offset
+
+    Attributes:
+        scale: focal length at unit excitation, plus the offset
+        exponent: fall of the focal length with the excitation
+        offset: focal length approached at high excitation, negated
+    """
+
+# power laws of lens_excitation
+SYMMETRIC = PowerLaw(9.709, 2.503, 3.723)
+ASYMMETRIC = PowerLaw(7.59, 2.727, 0.811)
+
+
+def power_law(excitation, scale, exponent, offset):
+    """focal length of a power law lens at an excitation"""
+    return scale * np.asarray(excitation, dtype=float) ** -exponent - offset
+
+
+def fit_power_law(excitations, focal_lengths, initial=SYMMETRIC):
+    """least squares power law through measured focal lengths
+
+    Args:
+        excitations: (N) measured excitations
+        focal_lengths: (N) focal length measured at every excitation
+        initial (PowerLaw): starting guess of the fit
+
+    Returns:
+        PowerLaw: fitted parameters
+    """
+    # scipy.optimize is slow to import, only load it when needed
+    import scipy.optimize
+    parameters, _ = scipy.optimize.curve_fit(
+        power_law, np.asarray(excitations, dtype=float),
+        np.asarray(focal_lengths, dtype=float), p0=tuple(initial),
+        maxfev=10 ** 5
+    )
+    return PowerLaw(*(float(p) for p in parameters))
+
+
+LookupTable = namedtuple(
+    "LookupTable", ["knots", "coefficients", "log_start", "log_step"]
+)
+LookupTable.__doc__ = """Monotone cubic map on knots spaced geometrically
+
+    The knots are evenly spaced in the logarithm of the argument, the
+    cell of an argument is found without a search.
+
+    Attributes:
+        knots: (N) positive arguments, increasing
+        coefficients: (4, N - 1) cubic of every cell in the argument less
+            the knot, highest power first
+        log_start: logarithm of the first knot
+        log_step: logarithm of the ratio of neighbouring knots
+    """
+
+
+def lookup_table(x, y, table_size=TABLE_SIZE):
+    """PCHIP of monotone values resampled on knots spaced geometrically
+
+    Args:
+        x: (N) positive arguments, increasing
+        y: (N) values at every argument, monotone
+        table_size (int): knots of the lookup table
+
+    Returns:
+        LookupTable: the resampled map
+    """
+    knots = np.geomspace(x[0], x[-1], table_size)
+    # the ends are kept exact against rounding of the logarithms
+    knots[[0, -1]] = x[0], x[-1]
+    interpolator = PchipInterpolator(
+        knots, PchipInterpolator(x, y)(knots)
+    )
+    log_start, log_end = np.log(knots[[0, -1]])
+    return LookupTable(
+        knots, np.ascontiguousarray(interpolator.c), log_start,
+        (log_end - log_start) / (table_size - 1)
+    )
+
+
+def lookup(table, x):
+    """evaluate a lookup table at arguments, nan outside its knots"""
+    x = np.asarray(x, dtype=float)
+    knots = table.knots
+    inside = (x >= knots[0]) & (x <= knots[-1])
+    safe = np.where(inside, x, knots[0])
+    cell = np.minimum(
+        ((np.log(safe) - table.log_start) / table.log_step).astype(np.intp),
+        len(knots) - 2
+    )
+    d = safe - knots.take(cell)
+    c0, c1, c2, c3 = table.coefficients
+    y = ((c0.take(cell) * d + c1.take(cell)) * d + c2.take(cell)) * d \
+        + c3.take(cell)
+    return np.where(inside, y, np.nan)
+
+
+class CalibrationTable:
+    """Monotone maps between the excitation and focal length of a lens
+
+    The forward map is the PCHIP interpolant of the knots, the inverse
+    the PCHIP interpolant of the forward map at the knots of its lookup
+    table, both on lookup tables spaced geometrically. Outside the
+    tabulated excitations and focal lengths they give nan rather than
+    extrapolating a fit.
+
+    Attributes:
+        excitations (np.array): (N) knots, increasing
+        focal_lengths (np.array): (N) positive focal length at every
+            knot, decreasing
+        measured (np.array): (M, 2) excitation and focal length of the
+            measurements the table was fit to, empty for a model
+        forward (LookupTable): excitation to focal length
+        inverse (LookupTable): focal length to excitation
+        errors (dict): largest errors of the table, by check
+    """
+    def __init__(
+        self, excitations, focal_lengths, measured=None,
+        table_size=TABLE_SIZE
+    ):
+        """Init the maps from the knots
+
+        Args:
+            excitations: (N) knots, increasing
+            focal_lengths: (N) focal length at every knot, decreasing
+            measured: (M, 2) excitation and focal length of measurements
+            table_size (int): knots of the lookup tables
+        """
+        self.excitations = np.asarray(excitations, dtype=float)
+        self.focal_lengths = np.asarray(focal_lengths, dtype=float)
+        if self.excitations[0] <= 0 or np.any(np.diff(self.excitations) <= 0):
+            raise ValueError(
+                "excitations of a table must be positive and increase"
+            )
+        if self.focal_lengths[-1] <= 0 \
+                or np.any(np.diff(self.focal_lengths) >= 0):
+            raise ValueError(
+                "focal lengths of a table must be positive and decrease "
+                "with the excitation"
+            )
+        self.measured = np.zeros((0, 2)) if measured is None \
+            else np.asarray(measured, dtype=float).reshape(-1, 2)
+        self.forward = lookup_table(
+            self.excitations, self.focal_lengths, table_size
+        )
+        # the inverse interpolates the dense knots of the forward map, so
+        # the two undo each other between sparse measurements as well
+        knots = self.forward.knots
+        self.inverse = lookup_table(
+            lookup(self.forward, knots)[::-1], knots[::-1], table_size
+        )
+        self.errors = {}
+
+    def focal_length(self, excitation):
+        """focal length at excitations, nan outside the table"""
+        return lookup(self.forward, excitation)
+
+    def excitation(self, focal_length):
+        """excitation giving focal lengths, nan outside the table"""
+        return lookup(self.inverse, focal_length)
+
+    def validate(self, model=None):
+        """largest errors of the maps
+
+        The round trip is checked halfway between the knots of the
+        lookup table, where the interpolation is the least accurate.
+
+        Args:
+            model (func): exact focal length of an excitation, None if
+                the table was not tabulated from a model
+
+        Returns:
+            (dict): largest round trip excitation error, relative error
+                at the measurements and relative error to the model
+        """
+        knots = self.forward.knots
+        middle = (knots[1:] + knots[:-1]) / 2
+        self.errors = {"round_trip": float(np.max(np.abs(
+            self.excitation(self.focal_length(middle)) - middle
+        )))}
+        if len(self.measured):
+            excitations, focal_lengths = self.measured.T
+            self.errors["measured"] = float(np.max(np.abs(
+                self.focal_length(excitations) / focal_lengths - 1
+            )))
+        if model is not None:
+            self.errors["model"] = float(np.max(np.abs(
+                self.focal_length(middle) / model(middle) - 1
+            )))
+        return self.errors
+
+    def save(self, path):
+        """write the table to a NPZ file"""
+        np.savez(
+            path, excitations=self.excitations,
+            focal_lengths=self.focal_lengths, measured=self.measured,
+            table_size=len(self.forward.knots), error_names=list(self.errors),
+            error_values=list(self.errors.values())
+        )
+
+    @classmethod
+    def load(cls, path):
+        """read a table written by save"""
+        with np.load(path) as data:
+            table = cls(
+                data["excitations"], data["focal_lengths"], data["measured"],
+                int(data["table_size"])
+            )
+            table.errors = dict(zip(
+                data["error_names"].tolist(), data["error_values"].tolist()
+            ))
+        return table
+
+
+def tabulate(
+    model, excitation_range=EXCITATION_RANGE, table_size=TABLE_SIZE,
+    measured=None
+):
+    """table of a focal length model at excitations spaced geometrically
+
+    Args:
+        model (func): focal length of an array of excitations
+        excitation_range (tuple): lowest and highest excitation
+        table_size (int): knots of the table
+        measured: (M, 2) measurements the model was fit to
+
+    Returns:
+        CalibrationTable: the validated table
+    """
+    excitations = np.geomspace(*excitation_range, table_size)
+    table = CalibrationTable(
+        excitations, model(excitations), measured, table_size
+    )
+    table.validate(model)
+    return table
+
+
+def fit_calibration(
+    excitations, focal_lengths, model="pchip", table_size=TABLE_SIZE
+):
+    """table of a lens fit to measured focal lengths
+
+    The pchip model passes through every measurement, to the accuracy
+    of the lookup tables, and needs focal lengths falling with the
+    excitation, noisy measurements are better
+    fit with the power law. The table spans the measured excitations.
+
+    Args:
+        excitations: (M) measured excitations
+        focal_lengths: (M) focal length measured at every excitation
+        model (str): "pchip" or "power_law"
+        table_size (int): knots of the table
+
+    Returns:
+        CalibrationTable: the validated table
+    """
+    excitations = np.asarray(excitations, dtype=float)
+    focal_lengths = np.asarray(focal_lengths, dtype=float)
+    order = np.argsort(excitations)
+    excitations, focal_lengths = excitations[order], focal_lengths[order]
+    measured = np.stack([excitations, focal_lengths], axis=-1)
+    if model not in MODELS:
+        raise ValueError(f"unknown calibration model: {model}")
+    if model == "power_law":
+        law = fit_power_law(excitations, focal_lengths)
+        return tabulate(
+            functools.partial(power_law, **law._asdict()),
+            (excitations[0], excitations[-1]), table_size, measured
+        )
+    if np.any(np.diff(excitations) <= 0) \
+            or np.any(np.diff(focal_lengths) >= 0):
+        raise ValueError(
+            "measured focal lengths do not fall with the excitation, "
+            "fit a power law instead"
+        )
+    # the measurements are the knots of the table
+    table = CalibrationTable(excitations, focal_lengths, measured, table_size)
+    table.validate()
+    return table
+
+
+def read_measurements(path):
+    """read measured focal lengths from a CSV file
+
+    The file has a header row with the columns lens, excitation and
+    focal_length [mm], one row per measurement.
+
+    Args:
+        path (str): CSV file
+
+    Returns:
+        (dict): lens name to (excitations, focal lengths) arrays
+    """
+    with open(path, "r", newline="") as file:
+        rows = list(csv.DictReader(file))
+    measurements = {}
+    for row in rows:
+        points = measurements.setdefault(row["lens"].strip(), ([], []))
+        points[0].append(float(row["excitation"]))
+        points[1].append(float(row["focal_length"]))
+    return {
+        lens: (np.array(excitations), np.array(focal_lengths))
+        for lens, (excitations, focal_lengths) in measurements.items()
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def power_law_table(symmetric):
+    """table of the symmetric or asymmetric power law, built once"""
+    law = SYMMETRIC if symmetric else ASYMMETRIC
+    return tabulate(functools.partial(power_law, **law._asdict()))
+
+
+def calibration_tables(measurements=None, model="pchip"):
+    """table of every lens, fit to measurements where there are some
+
+    Args:
+        measurements (dict): lens name to (excitations, focal lengths),
+            as read_measurements, None to use the power laws only
+        model (str): fit model of the measured lenses
+
+    Returns:
+        (dict): lens name to CalibrationTable
+    """
+    measurements = {} if measurements is None else measurements
+    tables = {}
+    symmetric = UPPER_LENS_SYMMETRIC + LOWER_LENS_SYMMETRIC
+    for name, sym in zip(LENS_NAMES, symmetric):
+        if name in measurements:
+            tables[name] = fit_calibration(*measurements[name], model=model)
+        else:
+            tables[name] = power_law_table(sym)
+    return tables
@@ -0,0 +1,141 @@
+from collections import namedtuple
+import numpy as np
+from .column import lower_column
+from .lens_excitation import (
+    ur_symmetric, ur_asymmetric, cf_symmetric, cf_asymmetric
+)
+from .system_matrix import system_matrix
+from .layout import BEAM_ENERGY
+
+ChromaticResult = namedtuple(
+    "ChromaticResult", [
+        "energy_offsets", "focal_lengths", "magnification",
+        "magnification_change", "image_locations", "image_shift"
+    ]
+)
+ChromaticResult.__doc__ = """Column imaged at many beam energies at once
+
+    Attributes:
+        energy_offsets: (...) beam energy above the nominal in eV
+        focal_lengths: (..., K) focal length of every active lens
+        magnification: (...) magnification object to screen
+        magnification_change: (...) magnification over the nominal one,
+            less one
+        image_locations: (...) location of the image of the object after
+            the last active lens
+        image_shift: (...) image location less the nominal one
+    """
+
+
+def chromatic_focal_lengths(
+    focal_lengths, symmetric, energy_offsets, beam_energy=BEAM_ENERGY,
+    tables=None
+):
+    """focal lengths seen by electrons away from the beam energy
+
+    The excitation of a lens scales with its voltage over the electron
+    energy, a faster electron sees a weaker lens.
+
+    Args:
+        focal_lengths (list): (K) focal lengths at the beam energy
+        symmetric (list): (K) bool for symmetric lenses
+        energy_offsets: (N) electron energy above the beam energy in eV
+        beam_energy (float): energy the focal lengths are set for in eV
+        tables (list): (K) CalibrationTable of every lens, None for the
+            power laws of lens_excitation
+
+    Returns:
+        (np.array): (N, K) focal length of every lens for every electron
+
+    Raises:
+        ValueError: a focal length or a shifted excitation is outside
+            the calibration table of its lens
+    """
+    scale = beam_energy / (beam_energy + np.asarray(energy_offsets))
+    chromatic = np.empty(np.shape(scale) + (len(focal_lengths),))
+    for k, (focal_length, sym) in enumerate(zip(focal_lengths, symmetric)):
+        if tables is not None:
+            chromatic[..., k] = tables[k].focal_length(
+                tables[k].excitation(focal_length) * scale
+            )
+            # tables give nan outside their range, never pass it on
+            if np.isnan(chromatic[..., k]).any():
+                raise ValueError(
+                    f"lens {k} at focal length {focal_length} leaves its "
+                    "calibration table over the energy offsets"
+                )
+        elif sym:
+            chromatic[..., k] = cf_symmetric(
+                ur_symmetric(focal_length) * scale
+            )
+        else:
+            chromatic[..., k] = cf_asymmetric(
+                ur_asymmetric(focal_length) * scale
+            )
+    return chromatic
+
+
+def chromatic_ensemble(
+    energy_offsets=None, beam_energies=None, column=None,
+    beam_energy=BEAM_ENERGY, tables=None
+):
+    """image shift and magnification change of a column over beam energies
+
+    The lens voltages stay at their setting for the nominal beam energy,
+    every focal length follows the energy through its excitation, and
+    the columns of all energies are multiplied in one pass. A ripple of
+    the accelerating voltage in V is an energy offset in eV.
+
+    Args:
+        energy_offsets: (...) beam energy above the nominal in eV, or
+            accelerating voltage ripple in V
+        beam_energies: (...) beam energies in eV, instead of the offsets
+        column (Column): column at its nominal focal lengths, only active
+            lenses are used, None for the lower column
+        beam_energy (float): energy the focal lengths are set for in eV
+        tables (dict): lens name to CalibrationTable, as
+            calibration_tables, None for the power laws of lens_excitation
+
+    Returns:
+        ChromaticResult: focal lengths, magnification and image location
+            of every energy
+    """
+    if (energy_offsets is None) == (beam_energies is None):
+        raise ValueError("give either energy offsets or beam energies")
+    if energy_offsets is None:
+        energy_offsets = np.asarray(beam_energies, dtype=float) \
+            - beam_energy
+    energy_offsets = np.asarray(energy_offsets, dtype=float)
+    column = lower_column() if column is None else column
+    active_index = column.active_index()
+    if not len(active_index):
+        raise ValueError("no active lens in the column")
+    locations = column.locations[active_index]
+    focal_lengths = chromatic_focal_lengths(
+        column.focal_lengths[active_index], column.symmetric[active_index],
+        energy_offsets, beam_energy,
+        None if tables is None
+        else [tables[column.names[i]] for i in active_index]
+    )
+
+    matrices = system_matrix(
+        locations, focal_lengths, column.object_location, locations[-1]
+    )
+    # the image forms where B + z D = 0 after the last lens
+    image_locations = locations[-1] - matrices[..., 0, 1] \
+        / matrices[..., 1, 1]
+    # magnification at the screen, free space adds a multiple of the angle
+    distance = column.screen_location - locations[-1]
+    magnification = matrices[..., 0, 0] + distance * matrices[..., 1, 0]
+
+    nominal = system_matrix(
+        locations, column.focal_lengths[active_index],
+        column.object_location, locations[-1]
+    )
+    nominal_image = locations[-1] - nominal[0, 1] / nominal[1, 1]
+    nominal_magnification = nominal[0, 0] + distance * nominal[1, 0]
+    return ChromaticResult(
+        energy_offsets, focal_lengths, magnification,
+        magnification / nominal_magnification - 1, image_locations,
+        image_locations - nominal_image
+    )
@@ -0,0 +1,218 @@
+import numpy as np
+from .ray_transfer import as_ray_array
+from .system_matrix import SystemMatrixCache, system_matrix
+from .layout import (
+    LENS_NAMES, FOCAL_LENGTHS, SOURCE_LOCATION, SAMPLE_LOCATION,
+    SCINTILLATOR_LOCATION, UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS,
+    UPPER_LENS_SYMMETRIC, LOWER_LENS_SYMMETRIC
+)
+
+# steps of the ray path drawn for a lens: up to the lens, to its image
+# plane, and from the lens to its image
+ONE_STEP = 1
+TWO_STEP = 2
+THREE_STEP = 3
+
+
+class Element:
+    """View of a single element of a Column
+
+    Reads and writes go to the arrays of the column, the view holds no
+    state of its own.
+
+    Attributes:
+        column (Column): column the element belongs to
+        index (int): index of the element in the column
+    """
+    __slots__ = ("column", "index")
+
+    def __init__(self, column, index):
+        self.column = column
+        self.index = index
+
+    def __repr__(self):
+        return (
+            f"Element({self.name!r}, location={self.location}, "
+            f"focal_length={self.focal_length}, active={self.active})"
+        )
+
+    @property
+    def name(self):
+        return self.column.names[self.index]
+
+    @property
+    def location(self):
+        return float(self.column.locations[self.index])
+
+    @property
+    def focal_length(self):
+        return float(self.column.focal_lengths[self.index])
+
+    @focal_length.setter
+    def focal_length(self, focal_length):
+        self.column.focal_lengths[self.index] = focal_length
+
+    @property
+    def active(self):
+        return bool(self.column.active[self.index])
+
+    @active.setter
+    def active(self, active):
+        self.column.active[self.index] = active
+
+    @property
+    def type(self):
+        return int(self.column.types[self.index])
+
+    @property
+    def symmetric(self):
+        return bool(self.column.symmetric[self.index])
+
+    def crossover_location(self):
+        """location of the crossover of rays parallel to the axis"""
+        return self.location + self.focal_length
+
+
+class Column:
+    """Elements of a column stored in contiguous arrays
+
+    Element i is locations[i], focal_lengths[i], active[i], types[i] and
+    symmetric[i], no element points to its neighbours. The active
+    elements are traced in one pass, the transfer matrices of every set
+    of active elements are cached and only the changed focal lengths are
+    recomputed.
+
+    Attributes:
+        names (tuple): name of every element
+        locations (np.array): location of every element from origin
+        focal_lengths (np.array): focal length of every element
+        active (np.array): bool for active elements
+        types (np.array): ray path steps drawn for every element
+        symmetric (np.array): bool for symmetric lenses
+        object_location: location where the rays start
+        screen_location: location of the final plane
+    """
+    def __init__(
+        self, names, locations, focal_lengths, object_location,
+        screen_location, active=None, types=None, symmetric=None
+    ):
+        """Init the column arrays, all elements are active three step
+        asymmetric lenses unless given
+
+        Args:
+            names (list): name of every element
+            locations (list): location of every element from origin
+            focal_lengths (list): focal length of every element
+            object_location: location where the rays start
+            screen_location: location of the final plane
+            active (list): bool list with for active elements
+            types (list): ray path steps drawn for every element
+            symmetric (list): bool list with for symmetric lenses
+        """
+        size = len(names)
+        self.names = tuple(names)
+        self.locations = np.array(locations, dtype=float)
+        self.focal_lengths = np.array(focal_lengths, dtype=float)
+        self.active = np.ones(size, dtype=bool) if active is None \
+            else np.array(active, dtype=bool)
+        self.types = np.full(size, THREE_STEP, dtype=np.int8) \
+            if types is None else np.array(types, dtype=np.int8)
+        self.symmetric = np.zeros(size, dtype=bool) if symmetric is None \
+            else np.array(symmetric, dtype=bool)
+        self.object_location = object_location
+        self.screen_location = screen_location
+        self.matrix_caches = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            index = self.names.index(index)
+        elif not -len(self) <= index < len(self):
+            raise IndexError("column element index out of range")
+        return Element(self, index % len(self))
+
+    def __iter__(self):
+        return (Element(self, i) for i in range(len(self)))
+
+    def set_focal_lengths(self, focal_lengths):
+        """change the focal length of every element
+
+        Args:
+            focal_lengths (list): new focal lengths
+        """
+        self.focal_lengths[:] = focal_lengths
+
+    def set_active(self, active):
+        """change which elements are active
+
+        Args:
+            active (list): bool list with for active elements
+        """
+        self.active[:] = active
+
+    def active_index(self):
+        """indices of the active elements"""
+        return np.flatnonzero(self.active)
+
+    def matrix_cache(self):
+        """matrix cache of the active elements, at the focal lengths
+
+        A new cache is built the first time a set of active elements is
+        used, afterwards only the changed focal lengths are recomputed.
+
+        Returns:
+            SystemMatrixCache: cache of the active elements
+        """
+        active_index = self.active_index()
+        key = tuple(active_index)
+        cache = self.matrix_caches.get(key)
+        if cache is None:
+            cache = SystemMatrixCache(
+                self.locations[active_index],
+                self.focal_lengths[active_index],
+                self.object_location, self.screen_location
+            )
+            self.matrix_caches[key] = cache
+        else:
+            cache.set_focal_lengths(self.focal_lengths[active_index])
+        return cache
+
+    def system_matrix(self):
+        """transfer matrix of the active elements, object to screen"""
+        active_index = self.active_index()
+        return system_matrix(
+            self.locations[active_index], self.focal_lengths[active_index],
+            self.object_location, self.screen_location
+        )
+
+    def trace(self, rays):
+        """trace rays from the object plane through the active elements
+
+        Args:
+            rays: (N, 2) ray heights and angles at the object plane
+
+        Returns:
+            ColumnTrace: ray heights, output planes and magnifications
+        """
+        return self.matrix_cache().trace(as_ray_array(rays))
+
+
+def upper_column():
+    """condenser lenses, from the source to the sample"""
+    return Column(
+        LENS_NAMES[:3], UPPER_LENS_LOCATIONS, FOCAL_LENGTHS[:3],
+        SOURCE_LOCATION, SAMPLE_LOCATION, symmetric=UPPER_LENS_SYMMETRIC
+    )
+
+
+def lower_column():
+    """lenses from the sample to the scintillator, the image of the
+    projective lens is drawn without the line from the lens"""
+    return Column(
+        LENS_NAMES[3:], LOWER_LENS_LOCATIONS, FOCAL_LENGTHS[3:],
+        SAMPLE_LOCATION, SCINTILLATOR_LOCATION,
+        types=[THREE_STEP, THREE_STEP, TWO_STEP],
+        symmetric=LOWER_LENS_SYMMETRIC
+    )
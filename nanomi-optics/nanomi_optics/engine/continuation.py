@@ -0,0 +1,173 @@
+import numpy as np
+from .optimization import (
+    FOCAL_LENGTH_BOUNDS, optimize_focal_length, optimized_rays
+)
+from .system_matrix import system_matrix_derivatives
+from .layout import SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+
+
+class FocalLengthTracker:
+    """Tracks the optimized focal length while the other lenses change
+
+    The last solution and its sensitivity to the other focal lengths are
+    kept between calls. A new solve predicts the solution from the change
+    of the other lenses and refines it with Newton steps on the lens
+    power, where the optimized residual is linear, so one or two steps
+    are enough. A bracketed search is used when the branch is lost.
+
+    Attributes:
+        bounds: lowest and highest focal length allowed
+        tolerance: relative focal length change that ends the refinement
+        max_iterations: Newton steps allowed before the branch is lost
+        iterations: Newton steps used by the last solve
+        fallbacks: number of solves that needed the bracketed search
+    """
+    def __init__(
+        self, bounds=FOCAL_LENGTH_BOUNDS, tolerance=1e-12, max_iterations=4
+    ):
+        self.bounds = bounds
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.fallbacks = 0
+        self.reset()
+
+    def reset(self):
+        """forget the last solution, the next solve starts from scratch"""
+        self.key = None
+        self.solution = None
+        self.parameters = None
+        self.sensitivity = None
+        self.iterations = 0
+
+    def evaluate(
+        self, mode, lens_locations, focal_lengths, rays, active_index
+    ):
+        """optimized residual and its derivatives by every focal length
+
+        Returns:
+            residual (float): output ray or difference between outputs
+            derivatives (np.array): residual derivative by each lens
+        """
+        matrix, derivatives = system_matrix_derivatives(
+            [lens_locations[i] for i in active_index],
+            [focal_lengths[i] for i in active_index],
+            SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+        )
+        weights = [1] if mode == "Image" else [1, -1]
+        opt_rays = optimized_rays(mode, rays)
+        residual = weights @ (opt_rays @ matrix[0])
+        gradient = np.zeros(len(focal_lengths))
+        gradient[active_index] = np.einsum(
+            "r,rj,kj->k", weights, opt_rays, derivatives[:, 0, :]
+        )
+        return residual, gradient
+
+    def solve(self, mode, lens, lens_locations, focal_lengths, rays, active):
+        """solves the optimized focal length, warm started if possible
+
+        Args:
+            mode (str): "Image" or "Diffraction"
+            lens (int): lens index to optimize focal length
+            lens_locations (float): lens distance from origin
+            focal_lengths (list): list for lens' focal length
+            rays (list): list with ray vectors
+            active (list): bool list with for active lenses
+
+        Returns:
+            float: optimized focal length
+        """
+        if not active[lens]:
+            self.reset()
+            return focal_lengths[lens]
+        key = (mode, lens, tuple(active))
+        parameters = np.array(focal_lengths, dtype=float)
+        active_index = [i for i, act in enumerate(active) if act]
+
+        # predict from the last solution and the change of the others
+        if self.key == key:
+            change = parameters - self.parameters
+            change[lens] = 0
+            focal_length = self.solution + self.sensitivity @ change
+        else:
+            self.reset()
+            self.key = key
+            focal_length = parameters[lens]
+
+        def evaluate(value):
+            parameters[lens] = value
+            return self.evaluate(
+                mode, lens_locations, parameters, rays, active_index
+            )
+
+        focal_length, gradient = self.refine(
+            evaluate, focal_length, lens
+        )
+        if focal_length is None:
+            self.fallbacks += 1
+            focal_length = self.bracketed_search(
+                evaluate, mode, lens, lens_locations, focal_lengths, rays,
+                active
+            )
+            gradient = evaluate(focal_length)[1]
+
+        # df/dtheta = -(dr/dtheta) / (dr/df) at the solution
+        self.solution = focal_length
+        parameters[lens] = focal_length
+        self.parameters = parameters
+        if gradient[lens] != 0:
+            self.sensitivity = -gradient / gradient[lens]
+            self.sensitivity[lens] = 0
+        else:
+            self.sensitivity = np.zeros(len(parameters))
+        return focal_length
+
+    def refine(self, evaluate, focal_length, lens):
+        """Newton steps on the lens power from a predicted focal length
+
+        Returns:
+            focal_length (float): refined focal length, None if lost
+            gradient (np.array): residual derivatives at the solution
+        """
+        if not np.isfinite(focal_length):
+            return None, None
+        focal_length = np.clip(focal_length, *self.bounds)
+        for iteration in range(self.max_iterations):
+            self.iterations = iteration + 1
+            residual, gradient = evaluate(focal_length)
+            # dr/d(1/f) = -f^2 dr/df
+            slope = -focal_length ** 2 * gradient[lens]
+            if slope == 0:
+                return None, None
+            new_focal_length = 1 / (1 / focal_length - residual / slope)
+            if not np.isfinite(new_focal_length) or not \
+                    self.bounds[0] <= new_focal_length <= self.bounds[1]:
+                return None, None
+            step = abs(new_focal_length - focal_length)
+            focal_length = new_focal_length
+            if step <= self.tolerance * abs(focal_length):
+                return float(focal_length), gradient
+        return None, None
+
+    def bracketed_search(
+        self, evaluate, mode, lens, lens_locations, focal_lengths, rays,
+        active
+    ):
+        """finds the root between the bounds, or the closest focal length
+
+        Returns:
+            float: optimized focal length
+        """
+        low, high = self.bounds
+        residual_low = evaluate(low)[0]
+        residual_high = evaluate(high)[0]
+        if np.sign(residual_low) != np.sign(residual_high):
+            # the residual is monotonic in the lens power
+            import scipy.optimize
+            power = scipy.optimize.brentq(
+                lambda q: evaluate(1 / q)[0], 1 / high, 1 / low,
+                xtol=1e-15, rtol=4 * np.finfo(float).eps
+            )
+            return 1 / power
+        return optimize_focal_length(
+            mode, lens, lens_locations, focal_lengths, rays, active
+        )
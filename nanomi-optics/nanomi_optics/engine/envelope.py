@@ -0,0 +1,287 @@
+from collections import namedtuple
+import numpy as np
+from .parallel import chunk_sizes, map_chunks
+from .layout import (
+    LENS_NAMES, FOCAL_LENGTHS, LENS_BORE, CA_DIAMETER, TIP_RADIUS,
+    SYMMETRIC_LENS_BORE, ASYMMETRIC_LENS_BORE, SOURCE_LOCATION,
+    CONDENSOR_APERATURE_LOCATION, SCINTILLATOR_LOCATION,
+    UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS, UPPER_LENS_SYMMETRIC,
+    LOWER_LENS_SYMMETRIC
+)
+
+# widest angle of the source rays drawn in the diagram
+SOURCE_HALF_ANGLE = (CA_DIAMETER / 2 + TIP_RADIUS) \
+    / CONDENSOR_APERATURE_LOCATION
+
+# rays propagated at once by a worker
+CHUNK_SIZE = 50000
+
+# envelope grid points sharing a bound on the rays that can reach them
+BLOCK_SIZE = 32
+
+Aperture = namedtuple("Aperture", ["name", "start", "end", "radius"])
+Aperture.__doc__ = """A round opening rays must pass, a bore or a plane
+
+    Attributes:
+        name: name of the element it belongs to
+        start: location where it begins
+        end: location where it ends, equal to start for a plane
+        radius: radius of the opening
+    """
+
+EnvelopeResult = namedtuple(
+    "EnvelopeResult", [
+        "z", "r_max", "surviving", "transmission", "apertures", "clipped",
+        "num_rays"
+    ]
+)
+EnvelopeResult.__doc__ = """Beam envelope of a ray bundle and its clipping
+
+    Attributes:
+        z: (G) locations of the envelope grid
+        r_max: (G) largest radius of the rays not clipped before z
+        surviving: (G) fraction of the rays not clipped before z
+        transmission: fraction of the rays reaching the end of the column
+        apertures: list of Aperture checked
+        clipped: (A) number of rays stopped by each aperture
+        num_rays: number of rays sampled
+    """
+
+
+def lens_bore(name, location, symmetric):
+    """the bore of a lens around its lens plane"""
+    before, after = SYMMETRIC_LENS_BORE if symmetric \
+        else ASYMMETRIC_LENS_BORE
+    return Aperture(name, location - before, location + after, LENS_BORE)
+
+
+# condensor aperature and the bore of every lens, on or off
+COLUMN_APERTURES = [
+    Aperture(
+        "Cond. Apert", CONDENSOR_APERATURE_LOCATION,
+        CONDENSOR_APERATURE_LOCATION, CA_DIAMETER / 2
+    )
+] + [
+    lens_bore(name, location, symmetric)
+    for name, location, symmetric in zip(
+        LENS_NAMES, UPPER_LENS_LOCATIONS + LOWER_LENS_LOCATIONS,
+        UPPER_LENS_SYMMETRIC + LOWER_LENS_SYMMETRIC
+    )
+]
+
+
+def sample_disk(rng, num_rays, radius):
+    """uniform (x, y) points inside a disk
+
+    Returns:
+        (np.array): (num_rays, 2) points
+    """
+    r = radius * np.sqrt(rng.random(num_rays))
+    phi = 2 * np.pi * rng.random(num_rays)
+    return np.stack([r * np.cos(phi), r * np.sin(phi)], axis=-1)
+
+
+def block_envelope(a, b, c, t):
+    """largest value of a + 2 b t + c t^2 over the rays at every t
+
+    Each ray is convex in t, so its largest value over a block of grid
+    points is at the ends of the block. A block is then only evaluated
+    for the rays whose end values reach the smallest envelope value of
+    the ray highest at the ends.
+
+    Args:
+        a, b, c: (N) squared radius coefficients of every ray
+        t: (G) sorted distances from where the coefficients hold
+
+    Returns:
+        (np.array): (G) largest squared radius
+    """
+    envelope = np.empty(len(t))
+    edges = list(range(0, len(t), BLOCK_SIZE))
+    first, last = t[edges], t[[min(e + BLOCK_SIZE, len(t)) - 1 for e in edges]]
+    ends = np.maximum(
+        a[:, None] + first * (2 * b[:, None] + c[:, None] * first),
+        a[:, None] + last * (2 * b[:, None] + c[:, None] * last)
+    )
+    for k, edge in enumerate(edges):
+        block = t[edge:edge + BLOCK_SIZE]
+        seed = np.argmax(ends[:, k])
+        bound = np.min(a[seed] + block * (2 * b[seed] + c[seed] * block))
+        rays = ends[:, k] >= bound
+        envelope[edge:edge + BLOCK_SIZE] = np.max(
+            a[rays, None]
+            + block * (2 * b[rays, None] + c[rays, None] * block),
+            axis=0
+        )
+    return envelope
+
+
+def segment_envelope(position, angle, t, length, radius):
+    """envelope of rays along a straight segment, clipped by a bore
+
+    A ray inside a bore is stopped where its radius first reaches the
+    bore radius, and only counts in the envelope before that point.
+
+    Args:
+        position: (N, 2) ray positions at the start of the segment
+        angle: (N, 2) ray angles along the segment
+        t: (G) sorted grid distances from the start of the segment
+        length (float): length of the segment
+        radius (float): bore radius over the segment, None without a bore
+
+    Returns:
+        envelope (np.array): (G) largest squared radius
+        surviving (np.array): (G) number of rays not stopped yet
+        passed (np.array): (N) bool rays reaching the end of the segment
+    """
+    a = np.sum(position ** 2, axis=-1)
+    b = np.sum(position * angle, axis=-1)
+    c = np.sum(angle ** 2, axis=-1)
+    passed = np.ones(len(a), dtype=bool)
+    if radius is not None:
+        # a ray is convex along the segment, it stays inside the bore if
+        # it is inside at both ends
+        passed = a + length * (2 * b + c * length) <= radius ** 2
+
+    envelope = np.zeros(len(t))
+    surviving = np.full(len(t), np.count_nonzero(passed))
+    if len(t) and np.any(passed):
+        envelope = block_envelope(a[passed], b[passed], c[passed], t)
+    if len(t) and not np.all(passed):
+        a, b, c = a[~passed], b[~passed], c[~passed]
+        stop = (-b + np.sqrt(b ** 2 - c * (a - radius ** 2))) / c
+        inside = t < stop[:, None]
+        squared = a[:, None] + t * (2 * b[:, None] + c[:, None] * t)
+        envelope = np.maximum(
+            envelope, np.max(np.where(inside, squared, 0), axis=0)
+        )
+        surviving = surviving + np.count_nonzero(inside, axis=0)
+    return envelope, surviving, passed
+
+
+def envelope_chunk(
+    seed, num_rays, source_radius, half_angle, locations, focal_lengths,
+    apertures, z
+):
+    """propagate a chunk of sampled rays and clip them on the apertures
+
+    Returns:
+        (tuple): squared envelope, surviving rays and clipped rays by
+            aperture, of the chunk
+    """
+    rng = np.random.default_rng(seed)
+    position = sample_disk(rng, num_rays, source_radius)
+    angle = sample_disk(rng, num_rays, half_angle)
+    start, end = z[0], z[-1]
+
+    # the column is split into straight segments at every lens and at
+    # both ends of every aperture
+    events = {end}
+    events.update(
+        location for location in locations if start <= location <= end
+    )
+    for aperture in apertures:
+        events.update(
+            plane for plane in (aperture.start, aperture.end)
+            if start < plane < end
+        )
+
+    envelope = np.zeros(len(z))
+    surviving = np.zeros(len(z))
+    clipped = np.zeros(len(apertures))
+    last = start
+    grid = 0
+    for event in sorted(events):
+        # narrowest bore around the segment up to the event
+        bores = [
+            (aperture.radius, index)
+            for index, aperture in enumerate(apertures)
+            if aperture.start <= last and event <= aperture.end
+            and aperture.start < aperture.end
+        ]
+        radius, index = min(bores) if bores else (None, None)
+        stop = max(grid, np.searchsorted(z, event, side="left"))
+        envelope[grid:stop], surviving[grid:stop], passed = \
+            segment_envelope(
+                position, angle, z[grid:stop] - last, event - last, radius
+            )
+        if index is not None:
+            clipped[index] += np.count_nonzero(~passed)
+        grid = stop
+        position = position[passed] + (event - last) * angle[passed]
+        angle = angle[passed]
+        last = event
+
+        # rays hitting the face of a plane or of a bore entrance
+        for index, aperture in enumerate(apertures):
+            if aperture.start == event and event != end:
+                passed = np.sum(position ** 2, axis=-1) \
+                    <= aperture.radius ** 2
+                clipped[index] += np.count_nonzero(~passed)
+                position, angle = position[passed], angle[passed]
+        for location, focal_length in zip(locations, focal_lengths):
+            if location == event:
+                angle = angle - position / focal_length
+
+    envelope[grid:], surviving[grid:], _ = segment_envelope(
+        position, angle, z[grid:] - last, 0, None
+    )
+    return envelope, surviving, clipped
+
+
+def beam_envelope(
+    num_rays=100000, focal_lengths=FOCAL_LENGTHS, active=(True,) * 6,
+    locations=UPPER_LENS_LOCATIONS + LOWER_LENS_LOCATIONS,
+    apertures=COLUMN_APERTURES, source_radius=TIP_RADIUS,
+    half_angle=SOURCE_HALF_ANGLE, start=SOURCE_LOCATION,
+    end=SCINTILLATOR_LOCATION, spacing=0.5, seed=0,
+    chunk_size=CHUNK_SIZE, processes=None
+):
+    """trace a sampled source phase space through the column
+
+    Rays start uniformly over the source disk with angles uniform over a
+    disk of half angle, both transverse planes are traced with the same
+    thin lens matrices. A ray is removed at the first aperture it hits.
+    Chunks of rays are spread across processes by map_chunks.
+
+    Args:
+        num_rays (int): rays sampled at the source
+        focal_lengths (list): focal length of every lens
+        active (list): bool list with for active lenses
+        locations (list): location of every lens
+        apertures (list): Aperture the rays must pass
+        source_radius (float): radius of the emitting area
+        half_angle (float): largest emission angle
+        start (float): location of the source
+        end (float): location where the rays stop
+        spacing (float): distance between envelope grid points
+        seed (int): seed of the sampled rays
+        chunk_size (int): rays propagated at once
+        processes (int): worker processes of map_chunks
+
+    Returns:
+        EnvelopeResult: envelope, transmission and clipped rays
+    """
+    z = np.append(np.arange(start, end, spacing), end)
+    lenses = [i for i, act in enumerate(active) if act]
+    lens_locations = [locations[i] for i in lenses]
+    lens_focal_lengths = [focal_lengths[i] for i in lenses]
+    sizes = chunk_sizes(num_rays, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [
+        (
+            chunk_seed, size, source_radius, half_angle, lens_locations,
+            lens_focal_lengths, list(apertures), z
+        )
+        for chunk_seed, size in zip(seeds, sizes)
+    ]
+    results = list(map_chunks(envelope_chunk, arguments, processes))
+
+    envelope = np.max([result[0] for result in results], axis=0)
+    surviving = np.sum([result[1] for result in results], axis=0)
+    clipped = np.sum([result[2] for result in results], axis=0)
+    return EnvelopeResult(
+        z, np.sqrt(envelope), surviving / num_rays,
+        surviving[-1] / num_rays, list(apertures), clipped.astype(int),
+        num_rays
+    )
@@ -0,0 +1,188 @@
+from collections import namedtuple
+import numpy as np
+from .system_matrix import system_matrix_derivatives
+from .optimization import FOCAL_LENGTH_BOUNDS
+from .layout import (
+    SOURCE_LOCATION, SAMPLE_LOCATION, SCINTILLATOR_LOCATION, SOURCE_RAYS,
+    UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS
+)
+
+# C1, C2, C3, Objective, Intermediate, Projective
+COLUMN_LENS_LOCATIONS = UPPER_LENS_LOCATIONS + LOWER_LENS_LOCATIONS
+
+# corners of the source phase space let through by the condenser
+# aperature, the other two corners are these rays negated
+PROBE_RAYS = SOURCE_RAYS[[0, 3]]
+
+DesignResult = namedtuple(
+    "DesignResult", ["focal_lengths", "residuals", "success", "iterations"]
+)
+
+
+def probe_diameter(matrices, rays=PROBE_RAYS):
+    """geometric diameter of the beam at the end of a transfer matrix
+
+    Args:
+        matrices: (..., 2, 2) transfer matrices from the source
+        rays: (N, 2) rays bounding the beam at the source
+
+    Returns:
+        (np.array): (...) beam diameter
+    """
+    heights = np.asarray(matrices)[..., 0, :] @ np.asarray(rays).T
+    return 2 * np.max(np.abs(heights), axis=-1)
+
+
+class Crossover:
+    """Target: the object plane is imaged onto (crosses over at) a plane
+
+    Attributes:
+        plane: location of the crossover
+        object_location: location of the imaged plane
+    """
+    def __init__(self, plane, object_location=SOURCE_LOCATION):
+        self.plane = plane
+        self.object_location = object_location
+
+    def residuals(self, matrix):
+        """residuals of the target given the transfer matrix to the plane"""
+        length = self.plane - self.object_location
+        return np.array([matrix[0, 1] / length])
+
+    def gradients(self, matrix):
+        """(R, 2, 2) derivatives of the residuals by the matrix entries"""
+        gradients = np.zeros((1, 2, 2))
+        gradients[0, 0, 1] = 1 / (self.plane - self.object_location)
+        return gradients
+
+
+class Magnification(Crossover):
+    """Target: the object plane is imaged onto a plane with a magnification
+
+    Attributes:
+        magnification: magnification image/object at the plane
+        plane: location of the image
+        object_location: location of the imaged plane
+    """
+    def __init__(
+        self, magnification, plane=SCINTILLATOR_LOCATION,
+        object_location=SAMPLE_LOCATION
+    ):
+        super().__init__(plane, object_location)
+        self.magnification = magnification
+
+    def residuals(self, matrix):
+        scale = abs(self.magnification)
+        return np.append(
+            super().residuals(matrix),
+            (matrix[0, 0] - self.magnification) / scale
+        )
+
+    def gradients(self, matrix):
+        gradients = np.zeros((2, 2, 2))
+        gradients[0:1] = super().gradients(matrix)
+        gradients[1, 0, 0] = 1 / abs(self.magnification)
+        return gradients
+
+
+class ProbeSize:
+    """Target: geometric diameter of the beam at a plane
+
+    Attributes:
+        diameter: probe diameter at the plane
+        plane: location of the probe
+        object_location: location of the source
+        rays: rays bounding the beam at the source
+    """
+    def __init__(
+        self, diameter, plane=SAMPLE_LOCATION,
+        object_location=SOURCE_LOCATION, rays=PROBE_RAYS
+    ):
+        self.diameter = diameter
+        self.plane = plane
+        self.object_location = object_location
+        self.rays = np.asarray(rays, dtype=float)
+
+    def residuals(self, matrix):
+        return np.array(
+            [probe_diameter(matrix, self.rays) / self.diameter - 1]
+        )
+
+    def gradients(self, matrix):
+        # the widest ray sets the diameter
+        heights = self.rays @ matrix[0]
+        widest = np.argmax(np.abs(heights))
+        gradients = np.zeros((1, 2, 2))
+        gradients[0, 0] = 2 * np.sign(heights[widest]) \
+            * self.rays[widest] / self.diameter
+        return gradients
+
+
+def design_focal_lengths(
+    targets, focal_lengths, active, locations=COLUMN_LENS_LOCATIONS,
+    bounds=FOCAL_LENGTH_BOUNDS
+):
+    """Solves all active focal lengths of a column at once for targets
+
+    Each target only depends on the active lenses between its object
+    plane and its plane. The residual Jacobian is built from the exact
+    derivatives of the transfer matrices by every focal length.
+
+    Args:
+        targets (list): Crossover, Magnification and ProbeSize targets
+        focal_lengths (list): initial focal length of every lens
+        active (list): bool list with for active lenses
+        locations (list): lens distance from origin
+        bounds (tuple): lowest and highest focal length allowed
+
+    Returns:
+        DesignResult: focal lengths, final residuals, success and number
+        of residual evaluations
+    """
+    focal_lengths = np.array(focal_lengths, dtype=float)
+    locations = np.asarray(locations, dtype=float)
+    lens_sets = []
+    for target in targets:
+        lens_set = [
+            i for i in range(len(locations)) if active[i]
+            and target.object_location < locations[i] < target.plane
+        ]
+        if not lens_set:
+            raise ValueError(
+                f"no active lens between {target.object_location} and "
+                f"{target.plane} to reach {type(target).__name__}"
+            )
+        lens_sets.append(lens_set)
+    free = sorted(set(i for lens_set in lens_sets for i in lens_set))
+    column = {i: k for k, i in enumerate(free)}
+
+    def evaluate(x):
+        cf = focal_lengths.copy()
+        cf[free] = x
+        residuals, jacobian = [], []
+        for target, lens_set in zip(targets, lens_sets):
+            matrix, derivatives = system_matrix_derivatives(
+                locations[lens_set], cf[lens_set], target.object_location,
+                target.plane
+            )
+            gradients = target.gradients(matrix)
+            rows = np.zeros((len(gradients), len(free)))
+            rows[:, [column[i] for i in lens_set]] = np.einsum(
+                "rij,kij->rk", gradients, derivatives
+            )
+            residuals.append(target.residuals(matrix))
+            jacobian.append(rows)
+        return np.concatenate(residuals), np.concatenate(jacobian)
+
+    # dogbox handles the focal length bounds without shrinking the steps
+    # near them, which keeps the solve to a few iterations
+    x0 = np.clip(focal_lengths[free], *bounds)
+    import scipy.optimize
+    result = scipy.optimize.least_squares(
+        lambda x: evaluate(x)[0], x0, jac=lambda x: evaluate(x)[1],
+        bounds=bounds, method="dogbox", xtol=1e-12, ftol=1e-12, gtol=1e-12
+    )
+    focal_lengths[free] = result.x
+    return DesignResult(
+        focal_lengths, result.fun, bool(result.success), result.nfev
+    )
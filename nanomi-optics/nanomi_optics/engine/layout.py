@@ -0,0 +1,74 @@
+"""Geometry of the NanoMi column shared by the engine and the GUI.
+
+All locations are distances from the source along the optical axis in mm.
+"""
+import numpy as np
+
+LAMBDA_ELECTRON = 0.0112e-6
+
+# kinetic energy of the beam electrons in eV, giving LAMBDA_ELECTRON
+BEAM_ENERGY = 11.85e3
+
+LENS_BORE = 25.4*0.1/2
+
+# diameter of condensor aperature
+CA_DIAMETER = 0.01
+
+# radius of the source tip
+TIP_RADIUS = 1.5e-2
+
+SOURCE_LOCATION = 0
+CONDENSOR_APERATURE_LOCATION = 192.4
+SAMPLE_LOCATION = 528.9
+SCINTILLATOR_LOCATION = 972.7
+
+# C1, C2, C3
+UPPER_LENS_LOCATIONS = [257.03, 349, 517]
+# Objective, Intermediate, Projective
+LOWER_LENS_LOCATIONS = [551.6, 706.4, 826.9]
+
+# only C1 is a symmetric lens, the others are asymmetric
+UPPER_LENS_SYMMETRIC = [True, False, False]
+LOWER_LENS_SYMMETRIC = [False, False, False]
+
+LENS_NAMES = [
+    "C1", "C2", "C3", "Objective", "Intermediate", "Projective"
+]
+
+# initial focal distance of the lenses in [mm]
+FOCAL_LENGTHS = [67.29, 22.94, 39.88, 19.67, 6.498, 6]
+
+# length of the lens bore before and after the lens plane
+SYMMETRIC_LENS_BORE = (63.5 / 2, 63.5 / 2)
+ASYMMETRIC_LENS_BORE = (52.2, 11.6)
+
+# pin condenser aperture angle limited as per location and diameter
+SOURCE_RAYS = np.array([
+    [TIP_RADIUS, CA_DIAMETER/2 - TIP_RADIUS],
+    # 2nd ray, at r = 0, angle limited by CA
+    [0, CA_DIAMETER/2],
+    # 3rd ray, at r = tip edge, parallel to opt. axis
+    [TIP_RADIUS, 0],
+    # 4th ray, at -rG, angle up to +CA edge CRAZY BEAM
+    [-TIP_RADIUS, CA_DIAMETER/2 + TIP_RADIUS]
+]) / [1, CONDENSOR_APERATURE_LOCATION]
+
+
+def sample_rays(distance_from_optical):
+    """rays scattered by the sample at a distance from the optical axis
+
+    Args:
+        distance_from_optical (float): distance from the axis in mm, or
+            an array of distances
+
+    Returns:
+        (np.array): (..., 3, 2) scattered ray, shifted ray and parallel ray
+    """
+    distance = np.asarray(distance_from_optical, dtype=float)
+    scattering_angle = LAMBDA_ELECTRON / distance
+    zero = np.zeros_like(distance)
+    return np.stack([
+        np.stack([zero, scattering_angle], axis=-1),
+        np.stack([distance, scattering_angle], axis=-1),
+        np.stack([distance, zero], axis=-1)
+    ], axis=-2)
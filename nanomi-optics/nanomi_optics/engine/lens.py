@@ -1,8 +1,8 @@
 import numpy as np
-
-ONE_STEP = 1
-TWO_STEP = 2
-THREE_STEP = 3
+from .ray_transfer import (
+    free_space_matrices, thin_lens_matrices, image_plane
+)
+from .column import ONE_STEP, THREE_STEP
 
 
 class Lens:
@@ -64,7 +64,7 @@ class Lens:
         Return:
             (np.array): transfer matrix
         """
-        return np.array([[1, distance], [0, 1]], dtype=float)
+        return free_space_matrices(distance)
 
     @staticmethod
     def vacuum_matrix(distance, ray_in_vector):
@@ -85,7 +85,7 @@ class Lens:
 
     # transfer matrix for thin lens
     def transfer_thin_lens(self):
-        return np.array([[1, 0], [-1/self.focal_length, 1]], dtype=float)
+        return thin_lens_matrices(self.focal_length)
 
     # In matlab the location was used to plot the line
 
@@ -103,19 +103,14 @@ class Lens:
         """
 
         # locate image z & crossover
-        # temporary matrix calculating transfer vacuum to lens, and lens
-        temp_matrix = np.matmul(
-            self.transfer_thin_lens(),
-            self.transfer_free_space(self.source_distance - obj_location)
+        self.output_plane_location, distance, mag_out = image_plane(
+            self.source_distance, self.focal_length, obj_location
         )
-        distance = -temp_matrix[0, 1]/temp_matrix[1, 1]
-        self.output_plane_location = self.source_distance + distance
         overall_ray_out = np.matmul(
             self.transfer_free_space(distance),
             np.matmul(self.transfer_thin_lens(), ray_in)
         )
         ray_out = np.matmul(self.transfer_thin_lens(), ray_in)
-        mag_out = 1/temp_matrix[1, 1]
 
         return ray_out, overall_ray_out, distance, mag_out
 
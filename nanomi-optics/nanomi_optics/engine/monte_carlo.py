@@ -0,0 +1,241 @@
+from collections import namedtuple
+import numpy as np
+from .chromatic import chromatic_focal_lengths
+from .envelope import sample_disk
+from .system_matrix import system_matrix
+from .parallel import chunk_sizes, map_chunks
+from .layout import (
+    FOCAL_LENGTHS, BEAM_ENERGY, CA_DIAMETER, TIP_RADIUS, SOURCE_LOCATION,
+    CONDENSOR_APERATURE_LOCATION, SAMPLE_LOCATION, SCINTILLATOR_LOCATION,
+    UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS, UPPER_LENS_SYMMETRIC,
+    LOWER_LENS_SYMMETRIC
+)
+
+# electrons traced at once by a worker
+CHUNK_SIZE = 200000
+
+# electrons traced up front to size the histograms
+PILOT_SIZE = 20000
+
+# full width at half maximum of a normal distribution over its sigma
+FWHM_SIGMA = 2 * np.sqrt(2 * np.log(2))
+
+Histogram = namedtuple("Histogram", ["edges", "counts", "overflow", "rms"])
+Histogram.__doc__ = """Distribution of a radius over the electrons
+
+    Attributes:
+        edges: (B + 1) bin edges from 0
+        counts: (B) electrons in every bin
+        overflow: electrons beyond the last edge
+        rms: root mean square radius over all electrons
+    """
+
+MonteCarloResult = namedtuple(
+    "MonteCarloResult", [
+        "sample_spot", "scintillator_spot", "image_blur", "magnification",
+        "num_samples"
+    ]
+)
+MonteCarloResult.__doc__ = """Spot and blur of electrons traced down the column
+
+    Attributes:
+        sample_spot: Histogram of the distance from the axis at the sample
+        scintillator_spot: Histogram of the distance from the axis at the
+            scintillator
+        image_blur: Histogram of the distance at the scintillator from the
+            nominal image of where the electron crossed the sample
+        magnification: nominal magnification sample to scintillator
+        num_samples: number of electrons traced
+    """
+
+
+def sample_electrons(
+    rng, num_samples, source_radius, aperture_radius, energy_spread
+):
+    """electrons leaving the source through the condensor aperature
+
+    Every electron joins a point uniform over the source to a point
+    uniform over the aperature, the same rays a uniform emission cone
+    clipped by the aperature keeps, without sampling the clipped ones.
+
+    Args:
+        rng (np.random.Generator): source of random numbers
+        num_samples (int): electrons to sample
+        source_radius (float): radius of the emitting area
+        aperture_radius (float): radius of the condensor aperature
+        energy_spread (float): full width at half maximum of the electron
+            energies in eV
+
+    Returns:
+        position (np.array): (N, 2) x, y at the source
+        angle (np.array): (N, 2) x', y' at the source
+        energy_offsets (np.array): (N) energy above the beam energy in eV
+    """
+    position = sample_disk(rng, num_samples, source_radius)
+    target = sample_disk(rng, num_samples, aperture_radius)
+    angle = (target - position) \
+        / (CONDENSOR_APERATURE_LOCATION - SOURCE_LOCATION)
+    energy_offsets = rng.normal(0, energy_spread / FWHM_SIGMA, num_samples)
+    return position, angle, energy_offsets
+
+
+def electron_radii(
+    seed, num_samples, source_radius, aperture_radius, energy_spread,
+    beam_energy, locations, focal_lengths, symmetric
+):
+    """trace sampled electrons to the sample and the scintillator
+
+    Returns:
+        (np.array): (3, N) distance from the axis at the sample and the
+            scintillator, and distance from the nominal image
+    """
+    rng = np.random.default_rng(seed)
+    position, angle, energy_offsets = sample_electrons(
+        rng, num_samples, source_radius, aperture_radius, energy_spread
+    )
+    locations = np.asarray(locations, dtype=float)
+    chromatic = chromatic_focal_lengths(
+        focal_lengths, symmetric, energy_offsets, beam_energy
+    )
+    upper = locations < SAMPLE_LOCATION
+    # x and y go through the same matrix of every electron
+    rays = np.stack([position, angle], axis=-2)
+    rays = system_matrix(
+        locations[upper], chromatic[:, upper], SOURCE_LOCATION,
+        SAMPLE_LOCATION
+    ) @ rays
+    sample = rays[:, 0]
+    rays = system_matrix(
+        locations[~upper], chromatic[:, ~upper], SAMPLE_LOCATION,
+        SCINTILLATOR_LOCATION
+    ) @ rays
+    nominal = system_matrix(
+        locations[~upper], np.asarray(focal_lengths)[~upper],
+        SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+    )
+    return np.stack([
+        np.hypot(*sample.T),
+        np.hypot(*rays[:, 0].T),
+        np.hypot(*(rays[:, 0] - nominal[0, 0] * sample).T)
+    ])
+
+
+def monte_carlo_chunk(edges, *arguments):
+    """histogram the radii of a chunk of electrons
+
+    Args:
+        edges (list): bin edges of every histogram
+        *arguments: arguments of electron_radii
+
+    Returns:
+        (tuple): counts, overflow and sum of squared radii by histogram
+    """
+    radii = electron_radii(*arguments)
+    counts = [np.histogram(r, e)[0] for r, e in zip(radii, edges)]
+    overflow = [np.count_nonzero(r > e[-1]) for r, e in zip(radii, edges)]
+    return counts, overflow, np.sum(radii ** 2, axis=1)
+
+
+def histogram_diameter(histogram, fraction=0.5):
+    """diameter of the disk holding a fraction of the electrons
+
+    Args:
+        histogram (Histogram): radius distribution
+        fraction (float): fraction of the electrons inside the disk
+
+    Returns:
+        float: diameter interpolated within its bin, inf if the fraction
+            reaches the overflow
+    """
+    cumulative = np.cumsum(histogram.counts)
+    total = cumulative[-1] + histogram.overflow
+    if fraction * total > cumulative[-1]:
+        return np.inf
+    return 2 * np.interp(
+        fraction * total, np.append(0, cumulative), histogram.edges
+    )
+
+
+def monte_carlo(
+    num_samples=1000000, energy_spread=1.0, source_radius=TIP_RADIUS,
+    aperture_radius=CA_DIAMETER / 2, focal_lengths=FOCAL_LENGTHS,
+    active=(True,) * 6, locations=UPPER_LENS_LOCATIONS + LOWER_LENS_LOCATIONS,
+    symmetric=UPPER_LENS_SYMMETRIC + LOWER_LENS_SYMMETRIC,
+    beam_energy=BEAM_ENERGY, bins=200, limits=None, seed=0,
+    chunk_size=CHUNK_SIZE, processes=None
+):
+    """trace electrons with an energy spread and a finite source down the
+    column
+
+    The focal length of every lens is perturbed for every electron
+    through its excitation. Only histograms leave the workers, memory
+    stays bounded by the chunk size whatever the number of samples.
+    Chunks are spread across processes by map_chunks.
+
+    Args:
+        num_samples (int): electrons traced
+        energy_spread (float): full width at half maximum of the electron
+            energies in eV
+        source_radius (float): radius of the emitting area
+        aperture_radius (float): radius of the condensor aperature
+        focal_lengths (list): focal length of every lens at the beam energy
+        active (list): bool list with for active lenses
+        locations (list): location of every lens
+        symmetric (list): bool list with for symmetric lenses
+        beam_energy (float): energy of the beam in eV
+        bins (int): bins of every histogram
+        limits (list): largest radius of the sample spot, scintillator
+            spot and image blur histograms, None to size them from a
+            pilot run
+        seed (int): seed of the sampled electrons
+        chunk_size (int): electrons traced at once
+        processes (int): worker processes of map_chunks
+
+    Returns:
+        MonteCarloResult: spot and blur histograms
+    """
+    lenses = [i for i, act in enumerate(active) if act]
+    column = (
+        [locations[i] for i in lenses], [focal_lengths[i] for i in lenses],
+        [symmetric[i] for i in lenses]
+    )
+    pilot_seed, chunk_seed = np.random.SeedSequence(seed).spawn(2)
+    if limits is None:
+        pilot = electron_radii(
+            pilot_seed, min(num_samples, PILOT_SIZE), source_radius,
+            aperture_radius, energy_spread, beam_energy, *column
+        )
+        limits = 2 * np.quantile(pilot, 0.999, axis=1)
+    # a histogram over a single value still needs a width
+    edges = [
+        np.linspace(0, limit if limit > 0 else 1e-12, bins + 1)
+        for limit in limits
+    ]
+
+    sizes = chunk_sizes(num_samples, chunk_size)
+    seeds = chunk_seed.spawn(len(sizes))
+    arguments = [
+        (
+            edges, chunk, size, source_radius, aperture_radius,
+            energy_spread, beam_energy, *column
+        )
+        for chunk, size in zip(seeds, sizes)
+    ]
+    counts = np.zeros((3, bins), dtype=int)
+    overflow = np.zeros(3, dtype=int)
+    squares = np.zeros(3)
+    for result in map_chunks(monte_carlo_chunk, arguments, processes):
+        counts += result[0]
+        overflow += result[1]
+        squares += result[2]
+
+    histograms = [
+        Histogram(e, c, o, np.sqrt(s / num_samples))
+        for e, c, o, s in zip(edges, counts, overflow, squares)
+    ]
+    lower = [location >= SAMPLE_LOCATION for location in column[0]]
+    nominal = system_matrix(
+        np.compress(lower, column[0]), np.compress(lower, column[1]),
+        SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+    )
+    return MonteCarloResult(*histograms, nominal[0, 0], num_samples)
@@ -0,0 +1,188 @@
+from collections import OrderedDict, namedtuple
+import threading
+import numpy as np
+from .column import ONE_STEP, THREE_STEP
+
+# operating points kept by a cache
+CACHE_SIZE = 256
+
+# focal lengths closer than this in mm share an operating point
+FOCAL_LENGTH_QUANTUM = 1e-9
+
+OperatingPoint = namedtuple(
+    "OperatingPoint", [
+        "focal_lengths", "active", "rays", "lines", "magnifications",
+        "crossovers", "screen_heights"
+    ]
+)
+OperatingPoint.__doc__ = """Ray paths of a column at one setting of its lenses
+
+    Attributes:
+        focal_lengths: focal length of every lens
+        active: bool list with for active lenses
+        rays: (N, 2) rays at the object plane
+        lines: for each ray, (z, y) data of the path, from the lenses to
+            their images and marking the images, None without active
+            lenses
+        magnifications: (K) magnification of every active lens
+        crossovers: location of the crossover of every active lens
+        screen_heights: (N) ray height at the screen
+    """
+
+
+def segments(z_start, y_start, z_end, y_end):
+    """join separate line segments into the data of one line
+
+    Args:
+        z_start (np.array): start location of every segment
+        y_start (np.array): start height of every segment
+        z_end (np.array): end location of every segment
+        y_end (np.array): end height of every segment
+
+    Returns:
+        z, y (np.array): segment points separated by nan
+    """
+    gap = np.full(len(z_start), np.nan)
+    return (
+        np.stack([z_start, z_end, gap], axis=-1).ravel(),
+        np.stack([y_start, y_end, gap], axis=-1).ravel()
+    )
+
+
+def trace_operating_point(column, rays):
+    """trace a column at its current settings into drawable ray paths
+
+    Args:
+        column (Column): lenses, focal lengths and active flags
+        rays (np.array): (N, 2) rays at the object plane
+
+    Returns:
+        OperatingPoint: ray paths, magnifications and crossovers
+    """
+    active_index = column.active_index()
+    locations = column.locations[active_index]
+    crossovers = locations + column.focal_lengths[active_index]
+    point = OperatingPoint(
+        tuple(column.focal_lengths), tuple(column.active), rays, None, (),
+        crossovers, None
+    )
+    if not len(active_index):
+        return point
+
+    trace = column.trace(rays)
+    types = column.types[active_index]
+    imaged = types > ONE_STEP
+    three_step = types == THREE_STEP
+    images = trace.output_plane_locations
+    path_z = np.concatenate(
+        [[column.object_location], locations, [column.screen_location]]
+    )
+    lines = [
+        (
+            (path_z, np.concatenate([
+                [ray[0]], lens_heights, [screen_height]
+            ])),
+            # line from the lens to its image
+            segments(
+                locations[three_step], lens_heights[three_step],
+                images[three_step], image_heights[three_step]
+            ),
+            # line from the axis to the image
+            segments(
+                images[imaged], np.zeros(np.count_nonzero(imaged)),
+                images[imaged], image_heights[imaged]
+            )
+        )
+        for ray, lens_heights, image_heights, screen_height in zip(
+            rays, trace.lens_heights, trace.image_heights,
+            trace.screen_heights
+        )
+    ]
+    return point._replace(
+        lines=lines, magnifications=tuple(trace.magnifications),
+        screen_heights=trace.screen_heights
+    )
+
+
+class OperatingPointCache:
+    """Least recently used operating points of a column
+
+    Keys are the active flags, the focal lengths rounded to a quantum
+    and the exact rays, with any other setting the result depends on.
+    Coming back to a setting returns the stored point without tracing.
+
+    Attributes:
+        max_size: operating points kept, the least recently used is
+            dropped first
+        quantum: focal lengths closer than this share a point
+        hits: lookups answered from the cache
+        misses: lookups that had to compute
+    """
+    def __init__(self, max_size=CACHE_SIZE, quantum=FOCAL_LENGTH_QUANTUM):
+        self.max_size = max_size
+        self.quantum = quantum
+        self.hits = 0
+        self.misses = 0
+        self.points = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.points)
+
+    def __repr__(self):
+        return (
+            f"OperatingPointCache(size={len(self)}/{self.max_size}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+    @property
+    def hit_rate(self):
+        """fraction of the lookups answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def key(self, focal_lengths, active, rays, *settings):
+        """hashable key of a lens setting"""
+        return (
+            tuple(bool(act) for act in active),
+            tuple(
+                int(round(f / self.quantum))
+                for f in np.asarray(focal_lengths, dtype=float)
+            ),
+            np.asarray(rays, dtype=float).tobytes(), settings
+        )
+
+    def lookup(self, compute, focal_lengths, active, rays, *settings):
+        """operating point of a setting, computed only on a miss
+
+        Args:
+            compute (func): called without arguments to get the point
+            focal_lengths (list): focal length of every lens
+            active (list): bool list with for active lenses
+            rays (np.array): (N, 2) rays at the object plane
+            *settings: other hashable values the point depends on
+
+        Returns:
+            the stored or computed operating point
+        """
+        key = self.key(focal_lengths, active, rays, *settings)
+        with self.lock:
+            point = self.points.get(key)
+            if point is not None:
+                self.hits += 1
+                self.points.move_to_end(key)
+                return point
+            self.misses += 1
+        point = compute()
+        with self.lock:
+            self.points[key] = point
+            while len(self.points) > self.max_size:
+                self.points.popitem(last=False)
+        return point
+
+    def clear(self):
+        """drop every point and reset the counters"""
+        with self.lock:
+            self.points.clear()
+            self.hits = 0
+            self.misses = 0
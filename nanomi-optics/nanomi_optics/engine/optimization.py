@@ -1,5 +1,28 @@
-import scipy.optimize
-from .lens import Lens
+import numpy as np
+from .ray_transfer import as_ray_array
+from .system_matrix import system_matrix
+from .layout import SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+
+# focal lengths the lower lenses can reach
+FOCAL_LENGTH_BOUNDS = (6, 300)
+
+
+def optimized_rays(mode, rays):
+    """selects the rays used by an optimization mode
+
+    Args:
+        mode (str): "Image" or "Diffraction"
+        rays (list): list with ray vectors
+
+    Returns:
+        (np.array): (N, 2) rays whose screen heights are optimized
+    """
+    rays = as_ray_array(rays)
+    if mode == "Image":
+        return rays[0:1]
+    elif mode == "Diffraction":
+        return rays[0:2]
+    raise ValueError(f"unknown optimization mode: {mode}")
 
 
 def create_optimizable_funcion(
@@ -12,8 +35,12 @@ def create_optimizable_funcion(
     Return:
         (func): function to optimize
     """
+    opt_rays = optimized_rays(mode, rays)
+    active_index = [i for i in range(len(focal_lengths)) if active[i]]
+    locations = [lens_location[i] for i in active_index]
+
     def cf_function(x):
-        """_summary_
+        """height of the optimized rays at the scintillator
 
         Args:
             x (float): focal length
@@ -21,39 +48,11 @@ def create_optimizable_funcion(
         Returns:
             float: output ray or difference between outputs
         """
-        sample = Lens(528.9, None, None, None)
-        lenses = []
-        for i, cf in enumerate(focal_lengths):
-            if active[i]:
-                lenses.append(
-                    Lens(
-                        lens_location[i],
-                        x[0] if lens_i == i else cf,
-                        lenses[-1] if len(lenses) else sample,
-                        3 if i < 2 else 2
-                    )
-                )
-
-        if len(lenses):
-            sc = Lens(972.7, 0, lenses[-1], 1)
-
-        if mode == "Image":
-            opt_rays = [rays[0]]
-        elif mode == "Diffraction":
-            opt_rays = [rays[0], rays[1]]
-        results = []
-
-        for ray in opt_rays:
-            for j, lens in enumerate(lenses):
-                if j != 0:
-                    lens.update_output_plane_location()
-                lens.ray_path(
-                    ray if j == 0 else
-                    lenses[j - 1].ray_out_lens
-                )
-            sc.update_output_plane_location()
-            sc.ray_path(lenses[-1].ray_out_lens)
-            results.append(sc.ray_in_vac[0][0])
+        cf = [x[0] if lens_i == i else focal_lengths[i] for i in active_index]
+        matrix = system_matrix(
+            locations, cf, SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+        )
+        results = opt_rays @ matrix[0]
 
         if len(results) == 1:
             return results[0]
@@ -63,6 +62,59 @@ def create_optimizable_funcion(
     return cf_function
 
 
+def solve_focal_length(
+    mode, lens, lens_locations, focal_lengths, rays, active,
+    bounds=FOCAL_LENGTH_BOUNDS
+):
+    """Solves the focal length of a lens in closed form
+
+    The scintillator height of a ray is a + b * (-1 / f) for the
+    optimized lens, so the root of either optimization mode is exact.
+
+    Args:
+        mode (str): "Image" or "Diffraction"
+        lens (int): lens index to optimize focal length
+        lens_locations (float): lens distance from origin
+        focal_lengths (list): list for lens' focal length
+        rays (list): list with ray vectors
+        active (list): bool list with for active lenses
+        bounds (tuple): lowest and highest focal length allowed
+
+    Returns:
+        float: focal length, None if there is no root inside the bounds
+    """
+    if not active[lens]:
+        return None
+    before = [i for i in range(lens) if active[i]]
+    after = [i for i in range(lens + 1, len(focal_lengths)) if active[i]]
+    # object plane to the lens, and lens to the scintillator
+    to_lens = system_matrix(
+        [lens_locations[i] for i in before],
+        [focal_lengths[i] for i in before],
+        SAMPLE_LOCATION, lens_locations[lens]
+    )
+    to_screen = system_matrix(
+        [lens_locations[i] for i in after],
+        [focal_lengths[i] for i in after],
+        lens_locations[lens], SCINTILLATOR_LOCATION
+    )
+    at_lens = optimized_rays(mode, rays) @ to_lens.T
+    constant = at_lens @ to_screen[0]
+    slope = to_screen[0, 1] * at_lens[:, 0]
+    if mode == "Diffraction":
+        constant = constant[0:1] - constant[1:2]
+        slope = slope[0:1] - slope[1:2]
+
+    # a + b * (-1 / f) = 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        focal_length = slope[0] / constant[0]
+    if not np.isfinite(focal_length):
+        return None
+    if not bounds[0] <= focal_length <= bounds[1]:
+        return None
+    return float(focal_length)
+
+
 def optimize_focal_length(
     mode, lens, lens_locations, focal_lengths, rays, active
 ):
@@ -79,13 +131,21 @@ def optimize_focal_length(
     Returns:
         float: optimized focal length
     """
-    # get function to optimize
+    focal_length = solve_focal_length(
+        mode, lens, lens_locations, focal_lengths, rays, active
+    )
+    if focal_length is not None:
+        return focal_length
+
+    # no exact root inside the bounds, get as close as possible
+    # scipy.optimize is slow to import, only load it when needed
+    import scipy.optimize
     opt_function = create_optimizable_funcion(
         mode, lens, lens_locations, focal_lengths, rays, active
     )
 
     result = scipy.optimize.least_squares(
-        opt_function, focal_lengths[lens], bounds=(6, 300),
+        opt_function, focal_lengths[lens], bounds=FOCAL_LENGTH_BOUNDS,
         ftol=1e-15, xtol=1e-15, gtol=1e-15
     )
     return result.x[0]
@@ -0,0 +1,37 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+def chunk_sizes(size, chunk_size):
+    """sizes of the chunks splitting a number of items, one empty chunk
+    when there are none"""
+    return [
+        min(chunk_size, size - start) for start in range(0, size, chunk_size)
+    ] or [0]
+
+
+def map_chunks(function, arguments, processes=None):
+    """call a function on the arguments of every chunk across a process
+    pool
+
+    Results are yielded in the order of the chunks, as the workers finish
+    them. Workers are started with the default method of the platform,
+    which is spawn on Windows and macOS: the function must be defined at
+    module level, and a script calling this needs its entry point under
+    a ``if __name__ == "__main__"`` guard, or every worker runs the
+    script again.
+
+    Args:
+        function (callable): function of a chunk, at module level
+        arguments (list): tuple of the arguments of every chunk
+        processes (int): worker processes, None for one per core and 1
+            to run in this process, as with a single chunk
+
+    Yields:
+        the result of every chunk, in order
+    """
+    if processes == 1 or len(arguments) <= 1:
+        for args in arguments:
+            yield function(*args)
+        return
+    with ProcessPoolExecutor(processes) as executor:
+        yield from executor.map(function, *zip(*arguments))
@@ -0,0 +1,156 @@
+from collections import namedtuple
+import numpy as np
+
+ColumnTrace = namedtuple(
+    "ColumnTrace",
+    [
+        "lens_heights", "exit_angles", "image_heights", "screen_heights",
+        "screen_angles", "output_plane_locations", "image_distances",
+        "magnifications"
+    ]
+)
+ColumnTrace.__doc__ = """Result of tracing a bundle of rays through a column
+
+    Attributes:
+        lens_heights: (..., N, K) ray height at every lens plane
+        exit_angles: (..., N, K) ray angle just after every lens
+        image_heights: (..., N, K) ray height at every lens output plane
+        screen_heights: (..., N) ray height at the screen plane
+        screen_angles: (..., N) ray angle at the screen plane
+        output_plane_locations: (..., K) image location of every lens
+        image_distances: (..., K) lens centre-image distance along z
+        magnifications: (..., K) lens magnification on image/object
+    """
+
+
+def as_ray_array(rays):
+    """converts rays to an (N, 2) array of [height, angle] rows
+
+    Args:
+        rays: a single ray, an (N, 2) array or a list of 2x1 ray vectors
+
+    Returns:
+        (np.array): (N, 2) ray array
+    """
+    return np.asarray(rays, dtype=float).reshape(-1, 2)
+
+
+def free_space_matrices(distances):
+    """calculate transfer matrices for free space
+
+    Args:
+        distances: scalar or array of distances in micrometers
+
+    Returns:
+        (np.array): (..., 2, 2) stack of transfer matrices
+    """
+    distances = np.asarray(distances, dtype=float)
+    matrices = np.zeros(distances.shape + (2, 2))
+    matrices[..., 0, 0] = 1
+    matrices[..., 0, 1] = distances
+    matrices[..., 1, 1] = 1
+    return matrices
+
+
+def thin_lens_matrices(focal_lengths):
+    """calculate transfer matrices for thin lenses
+
+    Args:
+        focal_lengths: scalar or array of focal lengths in micrometers
+
+    Returns:
+        (np.array): (..., 2, 2) stack of transfer matrices
+    """
+    focal_lengths = np.asarray(focal_lengths, dtype=float)
+    matrices = np.zeros(focal_lengths.shape + (2, 2))
+    matrices[..., 0, 0] = 1
+    matrices[..., 1, 0] = -1 / focal_lengths
+    matrices[..., 1, 1] = 1
+    return matrices
+
+
+def image_plane(location, focal_length, object_location):
+    """locate the image formed by a thin lens
+
+    Args:
+        location: lens location from origin
+        focal_length: lens focal length
+        object_location: location of the object from origin
+
+    Returns:
+        output_plane_location: image location from origin
+        distance: lens centre-image distance along z
+        mag_out: magnification image/object
+    """
+    object_distance = location - object_location
+    # bottom right entry of the thin lens times free space matrix
+    denominator = (-1 / focal_length) * object_distance + 1
+    distance = -object_distance / denominator
+    return location + distance, distance, 1 / denominator
+
+
+def trace_column(
+    rays, locations, focal_lengths, object_location, screen_location
+):
+    """trace a bundle of rays through a column of thin lenses at once
+
+    Every lens images the output plane of the lens before it, the first
+    lens images the object plane. Leading dimensions of locations and
+    focal_lengths are broadcast against each other, so many columns can
+    be traced in the same pass.
+
+    Args:
+        rays: (N, 2) ray heights and angles at the object plane
+        locations: (..., K) lens locations from origin
+        focal_lengths: (..., K) lens focal lengths
+        object_location: location of the object plane (rays start here)
+        screen_location: location of the final plane (e.g. scintillator)
+
+    Returns:
+        ColumnTrace: ray heights, output planes and magnifications
+    """
+    rays = as_ray_array(rays)
+    locations, focal_lengths = np.broadcast_arrays(
+        np.asarray(locations, dtype=float),
+        np.asarray(focal_lengths, dtype=float)
+    )
+    batch = locations.shape[:-1]
+    num_lenses = locations.shape[-1]
+    num_rays = rays.shape[0]
+
+    lens_heights = np.empty(batch + (num_rays, num_lenses))
+    exit_angles = np.empty(batch + (num_rays, num_lenses))
+    image_heights = np.empty(batch + (num_rays, num_lenses))
+    output_locations = np.empty(batch + (num_lenses,))
+    distances = np.empty(batch + (num_lenses,))
+    magnifications = np.empty(batch + (num_lenses,))
+
+    height = np.broadcast_to(rays[:, 0], batch + (num_rays,))
+    angle = np.broadcast_to(rays[:, 1], batch + (num_rays,))
+    last_location = np.full(batch, float(object_location))
+    last_output = np.full(batch, float(object_location))
+    for j in range(num_lenses):
+        location = locations[..., j]
+        focal_length = focal_lengths[..., j]
+        # vacuum from the last lens, then the thin lens
+        height = height + (location - last_location)[..., None] * angle
+        angle = (-1 / focal_length)[..., None] * height + angle
+        output, distance, mag = image_plane(
+            location, focal_length, last_output
+        )
+        lens_heights[..., j] = height
+        exit_angles[..., j] = angle
+        image_heights[..., j] = height + distance[..., None] * angle
+        output_locations[..., j] = output
+        distances[..., j] = distance
+        magnifications[..., j] = mag
+        last_location = location
+        last_output = output
+
+    screen_heights = height + (screen_location - last_location)[..., None] \
+        * angle
+    return ColumnTrace(
+        lens_heights, exit_angles, image_heights, screen_heights,
+        np.broadcast_to(angle, screen_heights.shape).copy(),
+        output_locations, distances, magnifications
+    )
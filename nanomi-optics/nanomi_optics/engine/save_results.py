@@ -1,4 +1,30 @@
 import csv
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+import numpy as np
+from .layout import LENS_NAMES, SOURCE_RAYS
+
+# rows gathered in memory before a columnar write
+CHUNK_ROWS = 65536
+
+# bytes of a chunk of an HDF5 dataset, fitting the 1 MiB chunk cache of
+# h5py so partial reads decompress every chunk once
+HDF5_CHUNK_BYTES = 1 << 20
+
+# columnar formats by file extension
+FORMATS = {
+    ".npz": "npz", ".h5": "hdf5", ".hdf5": "hdf5", ".parquet": "parquet"
+}
+
+# Parquet metadata key of the column dtypes and row shapes
+SCHEMA_KEY = "nanomi_optics.schema"
+
+# bytes copied at once from a spill file into the archive
+SPILL_BLOCK = 1 << 24
 
 
 def save_csv(
@@ -45,3 +71,462 @@ def save_csv(
     with open(file_path, 'w', newline='') as file:
         csv_writer = csv.writer(file)
         csv_writer.writerows(data)
+
+
+def results_schema(results):
+    """schema of result columns, name to dtype and shape of one row
+
+    Args:
+        results (dict): result column name to array, rows first
+
+    Returns:
+        (dict): column name to (dtype, row shape)
+    """
+    schema = {}
+    for name, value in results.items():
+        value = np.asarray(value)
+        schema[name] = (value.dtype.str, value.shape[1:])
+    return schema
+
+
+def batch_schema():
+    """schema of the batch results: focal lengths, UR, magnifications,
+    active flags, aperture, total magnification and ray intercepts"""
+    schema = {}
+    for name in LENS_NAMES:
+        schema[f"f_{name}"] = ("<f8", ())
+    for name in LENS_NAMES[:3]:
+        schema[f"ur_{name}"] = ("<f8", ())
+    for name in LENS_NAMES:
+        schema[f"mag_{name}"] = ("<f8", ())
+    for name in LENS_NAMES:
+        schema[f"active_{name}"] = ("|b1", ())
+    schema["distance"] = ("<f8", ())
+    schema["aperture"] = ("<f8", ())
+    schema["magnification"] = ("<f8", ())
+    schema["upper_output_planes"] = ("<f8", (3,))
+    schema["lower_output_planes"] = ("<f8", (3,))
+    schema["upper_ray_heights"] = ("<f8", (len(SOURCE_RAYS), 4))
+    schema["lower_ray_heights"] = ("<f8", (3, 4))
+    return schema
+
+
+def is_columnar(path):
+    """the extension of a file is one of a columnar format"""
+    return os.path.splitext(path)[1].lower() in FORMATS
+
+
+def file_format(path):
+    """columnar format of a file from its extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(
+            f"no columnar format for {extension or path}, use one of "
+            f"{', '.join(FORMATS)}"
+        )
+    return FORMATS[extension]
+
+
+def hdf5_chunk_rows(dtype, shape):
+    """rows of an HDF5 chunk of a column, HDF5_CHUNK_BYTES at most"""
+    row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape))
+    return max(1, HDF5_CHUNK_BYTES // row_bytes)
+
+
+def flat_names(name, shape):
+    """scalar column names of a column in a flat table, as in a CSV"""
+    if not shape:
+        return [name]
+    return [
+        f"{name}_{'_'.join(str(i) for i in index)}"
+        for index in np.ndindex(shape)
+    ]
+
+
+class ResultsWriter:
+    """Appends configurations to a columnar results file in chunks
+
+    Rows are gathered in a buffer of every column and written a chunk
+    at a time, so millions of rows never sit in memory at once. The
+    extension selects the format: NPZ (.npz), HDF5 (.h5, .hdf5, needs
+    h5py) or Parquet (.parquet, needs pyarrow). The NPZ members are
+    stored uncompressed, np.load reads them and ResultsReader maps them
+    from the disk without reading.
+
+    Attributes:
+        path (str): results file
+        schema (dict): column name to (dtype, row shape)
+        chunk_rows (int): rows buffered in memory before a write
+        rows (int): rows appended so far
+    """
+    def __init__(self, path, schema=None, chunk_rows=CHUNK_ROWS):
+        """Open the results file
+
+        Args:
+            path (str): results file, the extension selects the format
+            schema (dict): column name to (dtype, row shape), the batch
+                schema by default
+            chunk_rows (int): rows buffered in memory before a write
+        """
+        self.path = path
+        self.format = file_format(path)
+        self.schema = {
+            name: (np.dtype(dtype), tuple(shape))
+            for name, (dtype, shape) in
+            (batch_schema() if schema is None else schema).items()
+        }
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.buffered = 0
+        self.buffers = {
+            name: np.empty((chunk_rows,) + shape, dtype)
+            for name, (dtype, shape) in self.schema.items()
+        }
+        if self.format == "npz":
+            # every column is spilled to a raw file, zipped on close
+            self.spill = tempfile.TemporaryDirectory(
+                dir=os.path.dirname(os.path.abspath(path))
+            )
+            self.files = {
+                name: open(os.path.join(self.spill.name, f"{i}.raw"), "wb")
+                for i, name in enumerate(self.schema)
+            }
+        elif self.format == "hdf5":
+            import h5py
+            self.file = h5py.File(path, "w")
+            # the attribute keeps the column order
+            self.file.attrs[SCHEMA_KEY] = self.schema_json()
+            for name, (dtype, shape) in self.schema.items():
+                # compressed, a small batch does not fill whole chunks.
+                # lzf is the fast filter of h5py, other HDF5 readers
+                # need its plugin
+                self.file.create_dataset(
+                    name, (0,) + shape, dtype, maxshape=(None,) + shape,
+                    chunks=(hdf5_chunk_rows(dtype, shape),) + shape,
+                    compression="lzf", shuffle=True
+                )
+        else:
+            import pyarrow
+            import pyarrow.parquet
+            fields = []
+            for name, (dtype, shape) in self.schema.items():
+                fields += [
+                    pyarrow.field(flat, pyarrow.from_numpy_dtype(dtype))
+                    for flat in flat_names(name, shape)
+                ]
+            metadata = {SCHEMA_KEY: self.schema_json()}
+            self.file = pyarrow.parquet.ParquetWriter(
+                path, pyarrow.schema(fields, metadata=metadata)
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.abort()
+
+    def schema_json(self):
+        """schema as JSON, stored with the HDF5 and Parquet files"""
+        return json.dumps({
+            name: [dtype.str, list(shape)]
+            for name, (dtype, shape) in self.schema.items()
+        })
+
+    def append(self, results):
+        """append rows of every column of the schema
+
+        Args:
+            results (dict): column name to array of the new rows
+        """
+        if set(results) != set(self.schema):
+            missing = set(self.schema) - set(results)
+            extra = set(results) - set(self.schema)
+            raise ValueError(
+                f"results do not match the schema, missing "
+                f"{sorted(missing)}, extra {sorted(extra)}"
+            )
+        size = len(next(iter(results.values())))
+        start = 0
+        while start < size:
+            stop = min(start + self.chunk_rows - self.buffered, size)
+            end = self.buffered + stop - start
+            for name, buffer in self.buffers.items():
+                buffer[self.buffered:end] = results[name][start:stop]
+            self.buffered = end
+            start = stop
+            if self.buffered == self.chunk_rows:
+                self.flush()
+
+    def flush(self):
+        """write the buffered rows"""
+        if not self.buffered:
+            return
+        rows = self.buffered
+        if self.format == "npz":
+            for name, buffer in self.buffers.items():
+                self.files[name].write(buffer[:rows].tobytes())
+        elif self.format == "hdf5":
+            for name, buffer in self.buffers.items():
+                dataset = self.file[name]
+                dataset.resize(self.rows + rows, axis=0)
+                dataset[self.rows:] = buffer[:rows]
+        else:
+            import pyarrow
+            arrays = []
+            for name, buffer in self.buffers.items():
+                flat = np.ascontiguousarray(buffer[:rows].reshape(rows, -1).T)
+                arrays += [pyarrow.array(column) for column in flat]
+            self.file.write_table(pyarrow.Table.from_arrays(
+                arrays, schema=self.file.schema
+            ))
+        self.rows += rows
+        self.buffered = 0
+
+    def close(self):
+        """write the remaining rows and finish the file"""
+        self.flush()
+        if self.format != "npz":
+            self.file.close()
+            return
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED) as archive:
+            for name, (dtype, shape) in self.schema.items():
+                self.files[name].close()
+                header = {
+                    "descr": np.lib.format.dtype_to_descr(dtype),
+                    "fortran_order": False,
+                    "shape": (self.rows,) + shape
+                }
+                with archive.open(f"{name}.npy", "w", force_zip64=True) \
+                        as member, open(self.files[name].name, "rb") as raw:
+                    np.lib.format.write_array_header_1_0(member, header)
+                    shutil.copyfileobj(raw, member, SPILL_BLOCK)
+        self.spill.cleanup()
+
+    def abort(self):
+        """close the file without finishing it and remove it
+
+        A batch failing halfway leaves no file with only some rows.
+        """
+        if self.format == "npz":
+            # the archive is only written on close
+            for file in self.files.values():
+                file.close()
+            self.spill.cleanup()
+            return
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ResultsReader:
+    """Lazy columns of a results file written by ResultsWriter
+
+    Only the columns asked for are read. Uncompressed NPZ members are
+    memory mapped, HDF5 datasets and the Parquet row groups holding the
+    rows asked for are read on access.
+
+    Attributes:
+        path (str): results file
+        schema (dict): column name to (dtype, row shape)
+    """
+    def __init__(self, path):
+        """Open a results file, the extension selects the format"""
+        self.path = path
+        self.format = file_format(path)
+        if self.format == "npz":
+            self.members = {}
+            with zipfile.ZipFile(path) as archive, open(path, "rb") as file:
+                for info in archive.infolist():
+                    self.members[info.filename[:-len(".npy")]] = \
+                        npy_member(archive, file, info)
+            self.schema = {
+                name: (dtype, shape[1:])
+                for name, (dtype, shape, _) in self.members.items()
+            }
+            self.rows = next(iter(self.members.values()))[1][0] \
+                if self.members else 0
+        elif self.format == "hdf5":
+            import h5py
+            self.file = h5py.File(path, "r")
+            self.schema = parse_schema(self.file.attrs[SCHEMA_KEY])
+            self.rows = len(self.file[self.columns[0]]) \
+                if self.schema else 0
+        else:
+            import pyarrow.parquet
+            self.file = pyarrow.parquet.ParquetFile(path)
+            self.schema = parse_schema(
+                self.file.schema_arrow.metadata[SCHEMA_KEY.encode()]
+            )
+            self.rows = self.file.metadata.num_rows
+            # row index of the start of every row group, then the end
+            self.group_starts = np.cumsum([0] + [
+                self.file.metadata.row_group(i).num_rows
+                for i in range(self.file.num_row_groups)
+            ])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, name):
+        return name in self.schema
+
+    def __getitem__(self, name):
+        """every row of a column"""
+        return self.column(name)
+
+    @property
+    def columns(self):
+        """names of the columns"""
+        return list(self.schema)
+
+    def column(self, name, start=0, stop=None):
+        """rows of a column between two row indices
+
+        Returns:
+            (np.array): (rows, *row shape) values, a read only memory
+                map for NPZ files
+        """
+        if name not in self.schema:
+            raise KeyError(name)
+        if self.format == "npz":
+            dtype, shape, offset = self.members[name]
+            if offset is None:
+                # compressed members can not be mapped
+                with np.load(self.path) as data:
+                    return data[name][start:stop]
+            return np.memmap(
+                self.path, dtype, "r", offset, shape
+            )[start:stop]
+        if self.format == "hdf5":
+            return self.file[name][start:stop]
+        # only the row groups holding the rows are read
+        start, stop, _ = slice(start, stop).indices(self.rows)
+        stop = max(start, stop)
+        groups = np.flatnonzero(
+            (self.group_starts[:-1] < stop) & (self.group_starts[1:] > start)
+        )
+        if not len(groups):
+            dtype, shape = self.schema[name]
+            return np.empty((0,) + shape, dtype)
+        dtype, shape = self.schema[name]
+        table = self.file.read_row_groups(
+            groups.tolist(), columns=flat_names(name, shape)
+        )
+        first = self.group_starts[groups[0]]
+        return self.arrow_column(table, name)[start - first:stop - first]
+
+    def arrow_column(self, table, name):
+        """column of a Parquet table or record batch as an array"""
+        dtype, shape = self.schema[name]
+        values = np.stack(
+            [np.asarray(table.column(flat))
+             for flat in flat_names(name, shape)], axis=-1
+        ).astype(dtype, copy=False)
+        return values.reshape((-1,) + shape)
+
+    def chunks(self, names=None, chunk_rows=CHUNK_ROWS):
+        """iterate over the rows a chunk at a time
+
+        Only the rows of one chunk of the columns asked for are read at
+        once. Parquet chunks may be shorter at row group boundaries.
+
+        Args:
+            names (list): columns to read, None for all
+            chunk_rows (int): largest number of rows of a chunk
+
+        Yields:
+            (dict): column name to the rows of the chunk
+        """
+        names = self.columns if names is None else names
+        if self.format == "parquet":
+            flat = [
+                column for name in names
+                for column in flat_names(name, self.schema[name][1])
+            ]
+            for batch in self.file.iter_batches(
+                batch_size=chunk_rows, columns=flat
+            ):
+                yield {name: self.arrow_column(batch, name) for name in names}
+            return
+        # NPZ columns are mapped once, HDF5 rows read chunk by chunk
+        columns = {name: self.column(name) for name in names} \
+            if self.format == "npz" else None
+        for start in range(0, self.rows, chunk_rows):
+            stop = start + chunk_rows
+            if columns is None:
+                yield {name: self.file[name][start:stop] for name in names}
+            else:
+                yield {
+                    name: value[start:stop]
+                    for name, value in columns.items()
+                }
+
+    def close(self):
+        """close the file, the memory maps stay valid"""
+        if self.format != "npz":
+            self.file.close()
+
+
+def parse_schema(text):
+    """schema stored by ResultsWriter.schema_json"""
+    return {
+        name: (np.dtype(dtype), tuple(shape))
+        for name, (dtype, shape) in json.loads(text).items()
+    }
+
+
+def npy_header(file):
+    """read the header of an NPY array, leaving the file at its data
+
+    Returns:
+        dtype and shape of the array
+    """
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = \
+            np.lib.format.read_array_header_1_0(file)
+    else:
+        shape, fortran_order, dtype = \
+            np.lib.format.read_array_header_2_0(file)
+    if fortran_order:
+        raise ValueError("arrays in Fortran order are not supported")
+    return dtype, shape
+
+
+def npy_member(archive, file, info):
+    """dtype, shape and data offset of an NPY member of a ZIP file
+
+    Args:
+        archive (ZipFile): the ZIP file
+        file (file): the ZIP file opened for binary reading
+        info (ZipInfo): the member
+
+    Returns:
+        dtype, shape and the offset of the data in the file, None when
+        the member is compressed
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        with archive.open(info) as member:
+            return npy_header(member) + (None,)
+    # the local header is 30 bytes then the name and the extra field
+    file.seek(info.header_offset + 26)
+    name_length, extra_length = struct.unpack("<HH", file.read(4))
+    file.seek(info.header_offset + 30 + name_length + extra_length)
+    return npy_header(file) + (file.tell(),)
+
+
+def read_results(path):
+    """open a results file for lazy reading, see ResultsReader"""
+    return ResultsReader(path)
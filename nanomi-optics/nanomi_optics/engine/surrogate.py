@@ -0,0 +1,230 @@
+from collections import namedtuple
+import numpy as np
+from .optimization import FOCAL_LENGTH_BOUNDS
+from .ray_transfer import trace_column
+from .system_matrix import system_matrix
+from .parallel import map_chunks
+from .layout import (
+    SAMPLE_LOCATION, SCINTILLATOR_LOCATION, LOWER_LENS_LOCATIONS
+)
+
+# grid points along the power of every lens
+GRID_POINTS = 17
+
+# grid points evaluated at once by a worker
+CHUNK_SIZE = 20000
+
+# random settings the table is checked against the exact trace with
+VALIDATION_POINTS = 2000
+
+SurrogateResult = namedtuple(
+    "SurrogateResult", ["magnification", "image_locations"]
+)
+SurrogateResult.__doc__ = """Lower column quantities read from a table
+
+    Attributes:
+        magnification: (...) magnification sample to scintillator
+        image_locations: (..., 3) image location of every lower lens
+    """
+
+
+def table_chunk(powers, start, stop, locations):
+    """matrix entries at a contiguous block of flattened grid points
+
+    Args:
+        powers (list): grid powers of every lens
+        start (int): first flattened grid index
+        stop (int): flattened grid index after the last
+        locations (list): location of every lens
+
+    Returns:
+        (np.array): (block, 1 + 2K) magnification, then B and D of the
+            matrix sample to just after every lens
+    """
+    shape = tuple(len(p) for p in powers)
+    index = np.unravel_index(np.arange(start, stop), shape)
+    focal_lengths = np.stack(
+        [1 / p[i] for p, i in zip(powers, index)], axis=-1
+    )
+    values = [
+        system_matrix(
+            locations, focal_lengths, SAMPLE_LOCATION, SCINTILLATOR_LOCATION
+        )[:, 0, 0]
+    ]
+    for j, location in enumerate(locations):
+        # sample to just after lens j
+        matrix = system_matrix(
+            locations[:j + 1], focal_lengths[:, :j + 1], SAMPLE_LOCATION,
+            location
+        )
+        values += [matrix[:, 0, 1], matrix[:, 1, 1]]
+    return np.stack(values, axis=-1)
+
+
+class SurrogateTable:
+    """Lookup table of the lower column over the lens powers
+
+    Every entry of a column matrix is affine in the power 1 / f of each
+    lens, so multilinear interpolation over a grid of powers gives the
+    magnification and the matrix entries with only rounding error, at
+    any grid density. Image locations are rational in the powers, they
+    are derived from the interpolated entries B and D of the matrix
+    sample to just after each lens, the image is where B + z D = 0.
+
+    Attributes:
+        powers (list): grid powers of every lens, increasing
+        values (np.array): (*grid, 1 + 2K) tabulated entries
+        locations (np.array): location of every lens
+        errors (dict): largest error against the exact trace, by quantity
+    """
+    def __init__(self, powers, values, locations, errors=None):
+        """Init the table from its grid
+
+        Args:
+            powers (list): grid powers of every lens, increasing
+            values (np.array): (*grid, 1 + 2K) tabulated entries
+            locations (list): location of every lens
+            errors (dict): largest error against the exact trace
+        """
+        self.powers = [np.asarray(p, dtype=float) for p in powers]
+        self.values = np.asarray(values, dtype=float)
+        self.locations = np.asarray(locations, dtype=float)
+        self.errors = {} if errors is None else dict(errors)
+
+    def interpolate(self, focal_lengths):
+        """multilinear interpolation of the tabulated entries
+
+        Settings outside the grid are extrapolated from the closest cell,
+        which is exact as well.
+
+        Args:
+            focal_lengths: (..., K) lens focal lengths
+
+        Returns:
+            (np.array): (..., 1 + 2K) interpolated entries
+        """
+        powers = 1 / np.asarray(focal_lengths, dtype=float)
+        shape = self.values.shape[:-1]
+        flat = self.values.reshape(-1, self.values.shape[-1])
+        strides = np.cumprod((1,) + shape[:0:-1])[::-1]
+        base = 0
+        weights = np.ones(powers.shape[:-1] + (1,))
+        offsets = np.zeros(1, dtype=int)
+        for axis, grid in enumerate(self.powers):
+            power = powers[..., axis]
+            cell = np.clip(
+                np.searchsorted(grid, power) - 1, 0, len(grid) - 2
+            )
+            fraction = (power - grid[cell]) / (grid[cell + 1] - grid[cell])
+            base = base + cell * strides[axis]
+            # corners of the cell, lower then upper along this axis
+            weights = np.concatenate([
+                weights * (1 - fraction)[..., None],
+                weights * fraction[..., None]
+            ], axis=-1)
+            offsets = np.concatenate([offsets, offsets + strides[axis]])
+        corners = flat[base[..., None] + offsets]
+        return np.einsum("...c,...cq->...q", weights, corners)
+
+    def __call__(self, focal_lengths):
+        """read the magnification and image locations of lens settings
+
+        Args:
+            focal_lengths: (..., K) lens focal lengths
+
+        Returns:
+            SurrogateResult: magnification and image locations
+        """
+        values = self.interpolate(focal_lengths)
+        b, d = values[..., 1::2], values[..., 2::2]
+        return SurrogateResult(values[..., 0], self.locations - b / d)
+
+    def save(self, path):
+        """write the table to a NPZ file"""
+        np.savez(
+            path, values=self.values, locations=self.locations,
+            error_names=list(self.errors),
+            error_values=list(self.errors.values()),
+            **{f"powers_{i}": p for i, p in enumerate(self.powers)}
+        )
+
+    @classmethod
+    def load(cls, path):
+        """read a table written by save"""
+        with np.load(path) as data:
+            powers = [
+                data[f"powers_{i}"] for i in range(len(data["locations"]))
+            ]
+            errors = dict(zip(
+                data["error_names"].tolist(), data["error_values"].tolist()
+            ))
+            return cls(powers, data["values"], data["locations"], errors)
+
+    def validate(self, num_points=VALIDATION_POINTS, seed=0):
+        """largest error against the exact trace at random settings
+
+        Focal lengths are drawn uniform in power inside the grid.
+
+        Returns:
+            (dict): largest magnification error, and largest image
+                location error relative to the lens to image distance
+        """
+        rng = np.random.default_rng(seed)
+        powers = np.stack([
+            rng.uniform(p[0], p[-1], num_points) for p in self.powers
+        ], axis=-1)
+        exact = trace_column(
+            [[1, 0]], self.locations, 1 / powers, SAMPLE_LOCATION,
+            SCINTILLATOR_LOCATION
+        )
+        table = self(1 / powers)
+        magnification = np.abs(
+            table.magnification - exact.screen_heights[:, 0]
+        )
+        images = np.abs(
+            table.image_locations - exact.output_plane_locations
+        ) / np.abs(exact.image_distances)
+        self.errors = {
+            "magnification": float(np.max(magnification)),
+            "image_locations": float(np.max(images))
+        }
+        return self.errors
+
+
+def build_table(
+    num_points=GRID_POINTS, bounds=FOCAL_LENGTH_BOUNDS,
+    locations=LOWER_LENS_LOCATIONS, chunk_size=CHUNK_SIZE, processes=None
+):
+    """tabulate the lower column over a grid of lens powers
+
+    All lenses are active. The grid is uniform in power between the
+    focal length bounds, it is split into chunks spread across processes
+    by map_chunks. The table is checked against the exact trace once
+    built.
+
+    Args:
+        num_points (int): grid points along every lens power
+        bounds (tuple): lowest and highest focal length of the grid
+        locations (list): location of every lens
+        chunk_size (int): grid points evaluated at once
+        processes (int): worker processes of map_chunks
+
+    Returns:
+        SurrogateTable: the validated table
+    """
+    locations = [float(z) for z in locations]
+    powers = [
+        np.linspace(1 / bounds[1], 1 / bounds[0], num_points)
+        for _ in locations
+    ]
+    shape = tuple(len(p) for p in powers)
+    size = int(np.prod(shape))
+    arguments = [
+        (powers, start, min(start + chunk_size, size), locations)
+        for start in range(0, size, chunk_size)
+    ]
+    results = map_chunks(table_chunk, arguments, processes)
+    values = np.concatenate(list(results)).reshape(shape + (-1,))
+    table = SurrogateTable(powers, values, locations)
+    table.validate()
+    return table
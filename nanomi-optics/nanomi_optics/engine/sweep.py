@@ -0,0 +1,190 @@
+from collections import namedtuple
+import numpy as np
+from .ray_transfer import trace_column
+from .inverse_design import PROBE_RAYS
+from .symbolic import column_kernel
+from .parallel import map_chunks
+from .layout import (
+    LENS_NAMES, FOCAL_LENGTHS, SOURCE_LOCATION, SAMPLE_LOCATION,
+    SCINTILLATOR_LOCATION, UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS
+)
+
+# number of grid points evaluated at once by a worker
+CHUNK_SIZE = 100000
+
+SweepResult = namedtuple(
+    "SweepResult", [
+        "axes", "transverse_magnification", "probe_diameter",
+        "crossover_locations", "image_locations"
+    ]
+)
+SweepResult.__doc__ = """Quantities evaluated over a sweep grid
+
+    Attributes:
+        axes: dict of swept parameter name to its values, in grid order
+        transverse_magnification: (grid) signed A element of the lower
+            column, sample to scintillator. The magnification of the GUI
+            and the batch results, the screen height of the scattered
+            ray over its distance from the axis, is unsigned and adds
+            B * lambda / distance ** 2
+        probe_diameter: (grid) beam diameter at the sample
+        crossover_locations: (grid, upper) output plane of active C lenses
+        image_locations: (grid, lower) output plane of active lower lenses
+    """
+
+
+def parameter_index(name):
+    """split a sweep parameter name into its kind and lens index
+
+    Parameters are "f_<lens>" for a focal length and "z_<lens>" for a
+    lens location, e.g. "f_C1" or "z_Objective".
+
+    Returns:
+        kind (str): "f" or "z"
+        index (int): index of the lens in LENS_NAMES
+    """
+    kind, _, lens = name.partition("_")
+    if kind not in ("f", "z") or lens not in LENS_NAMES:
+        raise ValueError(f"unknown sweep parameter: {name}")
+    return kind, LENS_NAMES.index(lens)
+
+
+def sweep_chunk(
+    names, values, start, stop, focal_lengths, locations, active,
+    kernels=None
+):
+    """evaluate a contiguous block of flattened grid points
+
+    Args:
+        names (list): swept parameter names
+        values (list): values of every swept parameter
+        start (int): first flattened grid index
+        stop (int): flattened grid index after the last
+        focal_lengths (list): focal lengths of the lenses not swept
+        locations (list): locations of the lenses not swept
+        active (list): bool list with for active lenses
+        kernels (tuple): upper and lower ColumnKernel to evaluate instead
+            of tracing, only when no location is swept
+
+    Returns:
+        (tuple): transverse magnification, probe diameter, crossover and
+        image locations of the block
+    """
+    shape = tuple(len(v) for v in values)
+    grid_index = np.unravel_index(np.arange(start, stop), shape)
+    cf = np.tile(np.asarray(focal_lengths, dtype=float), (stop - start, 1))
+    cz = np.tile(np.asarray(locations, dtype=float), (stop - start, 1))
+    for name, value, index in zip(names, values, grid_index):
+        kind, lens = parameter_index(name)
+        (cf if kind == "f" else cz)[:, lens] = np.asarray(value)[index]
+
+    upper = [i for i in range(3) if active[i]]
+    lower = [i for i in range(3, 6) if active[i]]
+    if kernels is not None:
+        upper_kernel, lower_kernel = kernels
+        upper_column = upper_kernel(cf[:, upper])
+        lower_column = lower_kernel(cf[:, lower])
+        probe = 2 * np.max(np.abs(
+            upper_column.matrix[:, None, 0, 0] * PROBE_RAYS[:, 0]
+            + upper_column.matrix[:, None, 0, 1] * PROBE_RAYS[:, 1]
+        ), axis=-1)
+        return (
+            lower_column.matrix[:, 0, 0], probe,
+            upper_column.output_plane_locations,
+            lower_column.output_plane_locations
+        )
+    # corner rays of the source give the probe diameter
+    upper_trace = trace_column(
+        PROBE_RAYS, cz[:, upper], cf[:, upper], SOURCE_LOCATION,
+        SAMPLE_LOCATION
+    )
+    probe = 2 * np.max(np.abs(upper_trace.screen_heights), axis=-1)
+    # a unit ray parallel to the axis gives the magnification
+    lower_trace = trace_column(
+        [[1, 0]], cz[:, lower], cf[:, lower], SAMPLE_LOCATION,
+        SCINTILLATOR_LOCATION
+    )
+    return (
+        lower_trace.screen_heights[:, 0], probe,
+        upper_trace.output_plane_locations,
+        lower_trace.output_plane_locations
+    )
+
+
+def sweep(
+    ranges, focal_lengths=FOCAL_LENGTHS,
+    locations=UPPER_LENS_LOCATIONS + LOWER_LENS_LOCATIONS,
+    active=(True,) * 6, chunk_size=CHUNK_SIZE, processes=None,
+    kernels=False
+):
+    """evaluate the column over the grid of every combination of ranges
+
+    The grid is flattened and split into chunks, every chunk is traced
+    with broadcasting in one pass. Chunks are spread across processes by
+    map_chunks.
+
+    Args:
+        ranges (dict): parameter name ("f_C1", "z_Objective", ...) to the
+            values it takes
+        focal_lengths (list): focal lengths of the lenses not swept
+        locations (list): locations of the lenses not swept
+        active (list): bool list with for active lenses
+        chunk_size (int): grid points evaluated at once
+        processes (int): worker processes of map_chunks
+        kernels (bool): evaluate the columns with kernels generated by
+            the symbolic module, needs sympy the first time the lens
+            locations are seen, ignored when a location is swept
+
+    Returns:
+        SweepResult: quantities over the grid
+    """
+    names = list(ranges)
+    values = [np.asarray(ranges[name], dtype=float) for name in names]
+    for name in names:
+        parameter_index(name)
+    shape = tuple(len(v) for v in values)
+    size = int(np.prod(shape))
+    num_upper = sum(bool(act) for act in active[:3])
+    num_lower = sum(bool(act) for act in active[3:])
+    # the kernels are specific to the lens locations
+    kernels = kernels and not any(name.startswith("z_") for name in names)
+    if kernels:
+        # derived here once, the workers are sent their source
+        kernels = (
+            column_kernel(
+                [locations[i] for i in range(3) if active[i]],
+                SOURCE_LOCATION, SAMPLE_LOCATION, False
+            ),
+            column_kernel(
+                [locations[i] for i in range(3, 6) if active[i]],
+                SAMPLE_LOCATION, SCINTILLATOR_LOCATION, False
+            )
+        )
+    else:
+        kernels = None
+
+    magnification = np.empty(size)
+    probe = np.empty(size)
+    crossovers = np.empty((size, num_upper))
+    images = np.empty((size, num_lower))
+    starts = range(0, size, chunk_size)
+    arguments = [
+        (
+            names, values, start, min(start + chunk_size, size),
+            focal_lengths, locations, active, kernels
+        )
+        for start in starts
+    ]
+    results = map_chunks(sweep_chunk, arguments, processes)
+    for start, result in zip(starts, results):
+        stop = start + len(result[0])
+        magnification[start:stop] = result[0]
+        probe[start:stop] = result[1]
+        crossovers[start:stop] = result[2]
+        images[start:stop] = result[3]
+
+    return SweepResult(
+        dict(zip(names, values)), magnification.reshape(shape),
+        probe.reshape(shape), crossovers.reshape(shape + (num_upper,)),
+        images.reshape(shape + (num_lower,))
+    )
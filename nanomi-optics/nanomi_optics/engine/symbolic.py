@@ -0,0 +1,307 @@
+"""Column transfer functions derived once with sympy as NumPy kernels.
+
+For a fixed set of lens locations the column matrix, its focal length
+derivatives, the image planes and the magnifications are rational
+functions of the focal lengths. They are derived symbolically, reduced
+to common subexpressions and written out as a flat NumPy function. The
+generated source is executed, so it is only cached on disk in a
+directory the caller opts in to, then sympy is only needed the first
+time a column is seen.
+"""
+from collections import namedtuple
+import hashlib
+import os
+import numpy as np
+
+# bump when the generated source changes, older cache files are ignored
+KERNEL_VERSION = 1
+
+# directory of the generated kernels, None to keep them in memory only.
+# Files in it are executed, it must only be writable by trusted users
+KERNEL_CACHE = None
+
+KernelResult = namedtuple(
+    "KernelResult", [
+        "matrix", "derivatives", "output_plane_locations", "magnifications"
+    ]
+)
+KernelResult.__doc__ = """Column quantities evaluated by a kernel
+
+    Attributes:
+        matrix: (..., 2, 2) transfer matrix object plane to screen
+        derivatives: (..., K, 2, 2) derivative for each focal length, None
+            for a kernel derived without them
+        output_plane_locations: (..., K) image location of every lens
+        magnifications: (..., K) lens magnification on image/object
+    """
+
+# kernels already loaded, by column key
+KERNELS = {}
+
+
+def column_key(locations, object_location, screen_location, derivatives):
+    """hashable description of a column the kernel is specific to"""
+    return (
+        KERNEL_VERSION, tuple(float(z) for z in locations),
+        float(object_location), float(screen_location), bool(derivatives)
+    )
+
+
+def derive_column(num_lenses, derivatives=True):
+    """derive the column quantities of a number of lenses with sympy
+
+    The drifts between the planes are kept as symbols d0 ... dK, where
+    d0 is object to first lens and dK is last lens to screen.
+
+    Args:
+        num_lenses (int): number of lenses K
+        derivatives (bool): derive the matrix focal length derivatives
+
+    Returns:
+        focal_lengths (list): focal length symbols f0 ... fK-1
+        distances (list): drift symbols d0 ... dK
+        expressions (list): matrix entries A, B, C, D, every lens to
+            image distance, every lens magnification, then the matrix
+            derivatives lens by lens
+    """
+    import sympy
+
+    focal_lengths = sympy.symbols(f"f0:{num_lenses}")
+    distances = sympy.symbols(f"d0:{num_lenses + 1}")
+    matrix = sympy.Matrix([[1, distances[0]], [0, 1]])
+    for focal_length, distance in zip(focal_lengths, distances[1:]):
+        matrix = sympy.Matrix([[1, distance], [0, 1]]) \
+            * sympy.Matrix([[1, 0], [-1 / focal_length, 1]]) * matrix
+    entries = list(matrix)
+
+    image_distances = []
+    magnifications = []
+    object_distance = distances[0]
+    for j, focal_length in enumerate(focal_lengths):
+        denominator = 1 - object_distance / focal_length
+        image_distances.append(-object_distance / denominator)
+        magnifications.append(1 / denominator)
+        if j + 1 < num_lenses:
+            object_distance = distances[j + 1] - image_distances[-1]
+
+    expressions = entries + image_distances + magnifications
+    if derivatives:
+        expressions += [
+            sympy.diff(entry, focal_length)
+            for focal_length in focal_lengths for entry in entries
+        ]
+    return list(focal_lengths), list(distances), expressions
+
+
+def kernel_printer():
+    """NumPy printer writing small integer powers as products
+
+    Float powers like ``f0**(-1.0)`` go through the slow pow ufunc.
+    """
+    from sympy.printing.numpy import NumPyPrinter
+    from sympy.printing.precedence import precedence
+
+    class KernelPrinter(NumPyPrinter):
+        def _print_Pow(self, expr, rational=False):
+            if expr.exp.is_Integer and 0 < abs(expr.exp) <= 3:
+                base = self.parenthesize(expr.base, precedence(expr))
+                product = "*".join([base] * abs(int(expr.exp)))
+                return product if expr.exp > 0 else f"1/({product})"
+            return super()._print_Pow(expr, rational)
+
+    return KernelPrinter()
+
+
+def generate_source(key):
+    """write the source of the kernel of a column
+
+    Args:
+        key (tuple): column key from column_key
+
+    Returns:
+        str: python source defining kernel(f, out), f holds the focal
+            lengths along its first axis and out receives the
+            expressions along its first axis
+    """
+    import sympy
+
+    _, locations, object_location, screen_location, derivatives = key
+    focal_lengths, distances, expressions = derive_column(
+        len(locations), derivatives
+    )
+    planes = (object_location,) + locations + (screen_location,)
+    replacements, reduced = sympy.cse(
+        expressions, symbols=sympy.numbered_symbols("x")
+    )
+    printer = kernel_printer()
+    lines = [
+        "# generated by nanomi_optics.engine.symbolic, do not edit",
+        f"# {key!r}",
+        "def kernel(f, out):"
+    ]
+    lines += [
+        f"    {symbol} = f[{j}]" for j, symbol in enumerate(focal_lengths)
+    ]
+    lines += [
+        f"    {symbol} = {end - start!r}"
+        for symbol, start, end in zip(distances, planes, planes[1:])
+    ]
+    lines += [
+        f"    {symbol} = {printer.doprint(expression)}"
+        for symbol, expression in replacements
+    ]
+    lines += [
+        f"    out[{j}] = {printer.doprint(expression)}"
+        for j, expression in enumerate(reduced)
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def compile_source(source):
+    """execute the source of a kernel and return its function"""
+    namespace = {"numpy": np}
+    exec(compile(source, "<nanomi kernel>", "exec"), namespace)
+    return namespace["kernel"]
+
+
+class ColumnKernel:
+    """Generated closed form of a column with fixed lens locations
+
+    Attributes:
+        locations (np.array): lens locations from origin
+        object_location: location of the object plane
+        screen_location: location of the final plane
+        derivatives (bool): True if the kernel gives matrix derivatives
+        source (str): generated python source
+    """
+    def __init__(
+        self, locations, object_location, screen_location, derivatives,
+        source
+    ):
+        """Init the kernel from its generated source
+
+        Args:
+            locations: lens locations from origin
+            object_location: location of the object plane
+            screen_location: location of the final plane
+            derivatives (bool): True if the source gives matrix derivatives
+            source (str): generated python source
+        """
+        self.locations = np.array(locations, dtype=float)
+        self.object_location = object_location
+        self.screen_location = screen_location
+        self.derivatives = derivatives
+        self.source = source
+        self.function = compile_source(source)
+
+    def __reduce__(self):
+        """pickle by the source, the compiled function is not picklable"""
+        return (self.__class__, (
+            self.locations, self.object_location, self.screen_location,
+            self.derivatives, self.source
+        ))
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __call__(self, focal_lengths):
+        """evaluate the column for focal lengths
+
+        Args:
+            focal_lengths: (..., K) lens focal lengths
+
+        Returns:
+            KernelResult: matrix, derivatives, image planes and
+                magnifications
+        """
+        focal_lengths = np.asarray(focal_lengths, dtype=float)
+        batch = focal_lengths.shape[:-1]
+        num_lenses = len(self)
+        size = 4 + 2 * num_lenses
+        values = np.empty(
+            (size + 4 * num_lenses * self.derivatives,) + batch
+        )
+        self.function(np.moveaxis(focal_lengths, -1, 0), values)
+        values = np.moveaxis(values, 0, -1)
+        derivatives = None
+        if self.derivatives:
+            derivatives = values[..., size:].reshape(
+                batch + (num_lenses, 2, 2)
+            )
+        return KernelResult(
+            values[..., :4].reshape(batch + (2, 2)), derivatives,
+            self.locations + values[..., 4:4 + num_lenses],
+            values[..., 4 + num_lenses:size]
+        )
+
+    def screen_heights(self, rays, focal_lengths):
+        """height at the screen of rays at the object plane
+
+        Args:
+            rays: (N, 2) ray heights and angles at the object plane
+            focal_lengths: (..., K) lens focal lengths
+
+        Returns:
+            (np.array): (..., N) ray height at the screen
+        """
+        matrix = self(focal_lengths).matrix
+        rays = np.asarray(rays, dtype=float).reshape(-1, 2)
+        return matrix[..., None, 0, 0] * rays[:, 0] \
+            + matrix[..., None, 0, 1] * rays[:, 1]
+
+
+def column_kernel(
+    locations, object_location, screen_location, derivatives=True,
+    cache_dir=None
+):
+    """kernel of a column, derived with sympy the first time it is seen
+
+    Kernels are kept in memory, and their source in cache_dir when one
+    is given, keyed by the lens locations and end planes. Only deriving
+    a new column needs sympy. The cached sources are executed, the
+    directory must only be writable by trusted users.
+
+    Args:
+        locations: lens locations from origin
+        object_location: location of the object plane
+        screen_location: location of the final plane
+        derivatives (bool): derive the matrix focal length derivatives
+        cache_dir (str): directory of the generated sources, None for
+            KERNEL_CACHE, which keeps them in memory only by default
+
+    Returns:
+        ColumnKernel: the compiled kernel
+    """
+    key = column_key(
+        locations, object_location, screen_location, derivatives
+    )
+    if key in KERNELS:
+        return KERNELS[key]
+    path = None
+    cache_dir = KERNEL_CACHE if cache_dir is None else cache_dir
+    if cache_dir is not None:
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        path = os.path.join(cache_dir, f"column_{digest[:32]}.py")
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            source = f.read()
+    else:
+        try:
+            source = generate_source(key)
+        except ImportError as error:
+            raise ImportError(
+                "deriving a column kernel needs sympy, install the "
+                "symbolic extra of nanomi-optics"
+            ) from error
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # readers never see a partly written file
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                f.write(source)
+            os.replace(temporary, path)
+    kernel = ColumnKernel(
+        key[1], object_location, screen_location, key[-1], source
+    )
+    KERNELS[key] = kernel
+    return kernel
@@ -0,0 +1,278 @@
+import numpy as np
+from .ray_transfer import (
+    ColumnTrace, as_ray_array, free_space_matrices, thin_lens_matrices
+)
+
+
+def system_matrix(locations, focal_lengths, object_location, end_location):
+    """calculate the transfer matrix of a column of thin lenses
+
+    Leading dimensions of locations and focal_lengths are broadcast
+    against each other, so many columns are multiplied in one pass.
+
+    Args:
+        locations: (..., K) lens locations from origin
+        focal_lengths: (..., K) lens focal lengths
+        object_location: location where the matrix starts
+        end_location: location where the matrix ends
+
+    Returns:
+        (np.array): (..., 2, 2) transfer matrix object plane to end plane
+    """
+    locations, focal_lengths = np.broadcast_arrays(
+        np.asarray(locations, dtype=float),
+        np.asarray(focal_lengths, dtype=float)
+    )
+    matrix = np.broadcast_to(
+        np.identity(2), locations.shape[:-1] + (2, 2)
+    )
+    last_location = object_location
+    for j in range(locations.shape[-1]):
+        drift = free_space_matrices(locations[..., j] - last_location)
+        lens = thin_lens_matrices(focal_lengths[..., j])
+        matrix = lens @ drift @ matrix
+        last_location = locations[..., j]
+    return free_space_matrices(end_location - last_location) @ matrix
+
+
+def system_matrix_derivatives(
+    locations, focal_lengths, object_location, end_location
+):
+    """calculate a column transfer matrix and its focal length derivatives
+
+    The derivative with respect to lens k is S_k dL_k P_k, where P_k is
+    the product up to lens k and S_k the product after it, so one
+    forward and one backward sweep give every derivative exactly.
+
+    Args:
+        locations: K lens locations from origin
+        focal_lengths: K lens focal lengths
+        object_location: location where the matrix starts
+        end_location: location where the matrix ends
+
+    Returns:
+        matrix (np.array): 2x2 transfer matrix object plane to end plane
+        derivatives (np.array): (K, 2, 2) derivative for each focal length
+    """
+    locations = np.asarray(locations, dtype=float)
+    focal_lengths = np.asarray(focal_lengths, dtype=float)
+    boundaries = np.concatenate(
+        [[object_location], locations, [end_location]]
+    )
+    drifts = free_space_matrices(np.diff(boundaries))
+    lenses = thin_lens_matrices(focal_lengths)
+
+    num_lenses = len(locations)
+    before = np.empty((num_lenses, 2, 2))
+    after = np.empty((num_lenses, 2, 2))
+    matrix = np.identity(2)
+    for j in range(num_lenses):
+        before[j] = drifts[j] @ matrix
+        matrix = lenses[j] @ before[j]
+    matrix = drifts[-1] @ matrix
+    suffix = drifts[-1]
+    for j in range(num_lenses - 1, -1, -1):
+        after[j] = suffix
+        suffix = suffix @ lenses[j] @ drifts[j]
+
+    # d/df [[1, 0], [-1/f, 1]] = [[0, 0], [1/f^2, 0]]
+    derivatives = after[:, :, 1:2] * before[:, 0:1, :] \
+        / (focal_lengths ** 2)[:, None, None]
+    return matrix, derivatives
+
+
+class SystemMatrixCache:
+    """Caches the prefix and suffix products of a column's matrices
+
+    The column is the product D_K L_K-1 ... D_1 L_0 D_0 of drifts and thin
+    lenses. Changing a focal length only invalidates the prefix products
+    downstream of that lens and the suffix products upstream of it, so
+    the system matrix is rebuilt from the two cached neighbours and
+    the remaining products are recomputed lazily when they are needed.
+
+    Attributes:
+        locations: lens locations from origin
+        focal_lengths: lens focal lengths
+        object_location: location of the object plane
+        screen_location: location of the final plane
+        multiplications: number of matrix products computed so far
+    """
+    def __init__(
+        self, locations, focal_lengths, object_location, screen_location
+    ):
+        """Init the cache, no product is computed until needed
+
+        Args:
+            locations: lens locations from origin
+            focal_lengths: lens focal lengths
+            object_location: location of the object plane
+            screen_location: location of the final plane
+        """
+        self.locations = np.array(locations, dtype=float)
+        self.focal_lengths = np.array(focal_lengths, dtype=float)
+        self.object_location = object_location
+        self.screen_location = screen_location
+        self.multiplications = 0
+
+        num_lenses = len(self.locations)
+        boundaries = np.concatenate(
+            [[object_location], self.locations, [screen_location]]
+        )
+        self.drifts = free_space_matrices(np.diff(boundaries))
+        self.lenses = thin_lens_matrices(self.focal_lengths)
+        # prefix[j]: object plane to just after lens j
+        # suffix[j]: just after lens j to the screen
+        self.prefix = np.empty((num_lenses, 2, 2))
+        self.suffix = np.empty((num_lenses, 2, 2))
+        self.prefix_valid = 0
+        self.suffix_valid = num_lenses
+        self.last_changed = 0
+        self.system = None
+
+    def __len__(self):
+        return len(self.locations)
+
+    def set_focal_length(self, index, focal_length):
+        """change a single focal length
+
+        Args:
+            index (int): index of the lens to change
+            focal_length (float): new focal length
+        """
+        if self.focal_lengths[index] == focal_length:
+            return
+        self.focal_lengths[index] = focal_length
+        self.lenses[index] = thin_lens_matrices(focal_length)
+        self.prefix_valid = min(self.prefix_valid, index)
+        self.suffix_valid = max(self.suffix_valid, index)
+        self.last_changed = index
+        self.system = None
+
+    def set_focal_lengths(self, focal_lengths):
+        """change all focal lengths, only changed lenses are updated
+
+        Args:
+            focal_lengths (list): new focal lengths
+        """
+        for i, focal_length in enumerate(focal_lengths):
+            self.set_focal_length(i, focal_length)
+
+    def multiply(self, *matrices):
+        """multiply matrices from left to right, counting the products"""
+        result = matrices[0]
+        for matrix in matrices[1:]:
+            result = result @ matrix
+            self.multiplications += 1
+        return result
+
+    def prefix_product(self, index):
+        """transfer matrix from the object plane to just after a lens
+
+        Args:
+            index (int): lens index, -1 for the object plane itself
+
+        Returns:
+            (np.array): 2x2 transfer matrix
+        """
+        if index < 0:
+            return np.identity(2)
+        for j in range(self.prefix_valid, index + 1):
+            self.prefix[j] = self.multiply(
+                self.lenses[j], self.drifts[j], self.prefix_product(j - 1)
+            )
+            self.prefix_valid = j + 1
+        return self.prefix[index]
+
+    def before_lens(self, index):
+        """transfer matrix from the object plane to just before a lens"""
+        return self.multiply(
+            self.drifts[index], self.prefix_product(index - 1)
+        )
+
+    def suffix_product(self, index):
+        """transfer matrix from just after a lens to the screen
+
+        Args:
+            index (int): lens index
+
+        Returns:
+            (np.array): 2x2 transfer matrix
+        """
+        last = len(self) - 1
+        for j in range(self.suffix_valid - 1, index - 1, -1):
+            if j == last:
+                self.suffix[j] = self.drifts[j + 1]
+            else:
+                self.suffix[j] = self.multiply(
+                    self.suffix[j + 1], self.lenses[j + 1],
+                    self.drifts[j + 1]
+                )
+            self.suffix_valid = j
+        return self.suffix[index]
+
+    def system_matrix(self):
+        """transfer matrix from the object plane to the screen
+
+        Only the products around the last changed lens are needed, so
+        repeatedly changing the same lens costs a constant amount of work.
+
+        Returns:
+            (np.array): 2x2 transfer matrix
+        """
+        if self.system is None:
+            if len(self) == 0:
+                self.system = self.drifts[0]
+            else:
+                j = self.last_changed
+                self.system = self.multiply(
+                    self.suffix_product(j), self.lenses[j],
+                    self.before_lens(j)
+                )
+        return self.system
+
+    def output_plane_locations(self):
+        """image location of every lens
+
+        Returns:
+            (np.array): output plane locations, lens image distances
+        """
+        products = np.array([self.prefix_product(j) for j in range(len(self))])
+        distances = -products[:, 0, 1] / products[:, 1, 1]
+        return self.locations + distances, distances
+
+    def magnifications(self):
+        """magnification image/object of every lens
+
+        Returns:
+            (np.array): lens magnifications
+        """
+        # a drift keeps the D entry, so it is the inverse magnification
+        # from the object plane to the latest image
+        inverse = np.array(
+            [self.prefix_product(j)[1, 1] for j in range(-1, len(self))]
+        )
+        return inverse[:-1] / inverse[1:]
+
+    def trace(self, rays):
+        """trace a bundle of rays with the cached products
+
+        Args:
+            rays: (N, 2) ray heights and angles at the object plane
+
+        Returns:
+            ColumnTrace: ray heights, output planes and magnifications
+        """
+        rays = as_ray_array(rays)
+        num_lenses = len(self)
+        before = np.array([self.before_lens(j) for j in range(num_lenses)])
+        after = np.array([self.prefix_product(j) for j in range(num_lenses)])
+        output_locations, distances = self.output_plane_locations()
+        lens_heights = rays @ before[:, 0, :].T
+        exit_angles = rays @ after[:, 1, :].T
+        screen = rays @ self.system_matrix().T
+        return ColumnTrace(
+            lens_heights, exit_angles,
+            lens_heights + distances * exit_angles,
+            screen[:, 0], screen[:, 1],
+            output_locations, distances, self.magnifications()
+        )
@@ -0,0 +1,271 @@
+from collections import namedtuple
+import numpy as np
+from .column import lower_column
+from .system_matrix import system_matrix
+from .parallel import chunk_sizes, map_chunks
+
+# perturbed columns traced at once by a worker
+CHUNK_SIZE = 100000
+
+# perturbed quantities of a lens, by parameter name prefix
+PARAMETER_KINDS = ("z", "f", "tilt")
+
+# distributions a tolerance can be drawn from
+DISTRIBUTIONS = ("normal", "uniform")
+
+Tolerance = namedtuple(
+    "Tolerance", ["distribution", "scale", "relative"],
+    defaults=["normal", 0.0, False]
+)
+Tolerance.__doc__ = """Distribution of the error of one parameter
+
+    Attributes:
+        distribution: "normal" with scale the standard deviation, or
+            "uniform" with scale the half width
+        scale: size of the error, in mm for z and f and rad for tilt
+        relative: scale is a fraction of the nominal value
+    """
+
+ToleranceResult = namedtuple(
+    "ToleranceResult", [
+        "parameters", "perturbations", "magnification", "defocus",
+        "astigmatism", "nominal", "sensitivities", "yield_fraction"
+    ]
+)
+ToleranceResult.__doc__ = """Spread of a column over its tolerances
+
+    Attributes:
+        parameters: names of the perturbed parameters
+        perturbations: (S, P) error of every parameter in every column
+        magnification: (S) magnification of every perturbed column
+        defocus: (S) image location after the screen, at the circle of
+            least confusion
+        astigmatism: (S) image location in x less image location in y
+        nominal: dict of the unperturbed magnification, defocus and
+            astigmatism
+        sensitivities: dict of the quantity to the (P) linear change per
+            unit error of every parameter, fit over the columns
+        yield_fraction: fraction of the columns inside the
+            specification, None without one
+    """
+
+
+def parse_parameter(name, column):
+    """split a parameter name into its kind and the index of its lens
+
+    Args:
+        name (str): "z_<lens>", "f_<lens>" or "tilt_<lens>"
+        column (Column): column holding the lens
+
+    Returns:
+        kind (str): "z", "f" or "tilt"
+        index (int): index of the lens in the column
+    """
+    kind, _, lens = name.partition("_")
+    if kind not in PARAMETER_KINDS or lens not in column.names:
+        raise ValueError(f"unknown tolerance parameter: {name}")
+    return kind, column.names.index(lens)
+
+
+def draw_perturbations(rng, tolerances, nominal, num_samples):
+    """draw the error of every parameter
+
+    Args:
+        rng (np.random.Generator): random numbers
+        tolerances (list): Tolerance of every parameter
+        nominal (list): nominal value of every parameter
+        num_samples (int): perturbed columns
+
+    Returns:
+        (np.array): (S, P) error of every parameter
+    """
+    perturbations = np.empty((num_samples, len(tolerances)))
+    for j, (tolerance, value) in enumerate(zip(tolerances, nominal)):
+        scale = tolerance.scale * (abs(value) if tolerance.relative else 1)
+        if tolerance.distribution == "normal":
+            perturbations[:, j] = rng.normal(0, scale, num_samples)
+        elif tolerance.distribution == "uniform":
+            perturbations[:, j] = rng.uniform(-scale, scale, num_samples)
+        else:
+            raise ValueError(
+                f"unknown distribution: {tolerance.distribution}"
+            )
+    return perturbations
+
+
+def perturbed_images(
+    perturbations, kinds, lenses, locations, focal_lengths,
+    object_location, screen_location
+):
+    """magnification and image locations of perturbed columns
+
+    A lens tilted by t focuses rays in its plane of tilt with the power
+    P / cos(t)^2 and across it with P, the oblique astigmatism of a thin
+    lens to second order in the tilt. Tilts are about the y axis.
+
+    Args:
+        perturbations: (S, P) error of every parameter
+        kinds (list): "z", "f" or "tilt" of every parameter
+        lenses (list): lens index of every parameter
+        locations (np.array): K nominal lens locations
+        focal_lengths (np.array): K nominal lens focal lengths
+        object_location: location of the object plane
+        screen_location: location of the screen
+
+    Returns:
+        magnification (np.array): (S) mean of the x and y magnifications
+        defocus (np.array): (S) mean x and y image location after the
+            screen
+        astigmatism (np.array): (S) x less y image location
+    """
+    size = len(perturbations)
+    locations = np.tile(locations, (size, 1))
+    focal_lengths = np.tile(focal_lengths, (size, 1))
+    tilts = np.zeros_like(locations)
+    parameters = {"z": locations, "f": focal_lengths, "tilt": tilts}
+    for j, (kind, lens) in enumerate(zip(kinds, lenses)):
+        parameters[kind][:, lens] += perturbations[:, j]
+
+    # (2, S, 2, 2) matrices of the x and y planes
+    matrices = system_matrix(
+        locations, np.stack([focal_lengths * np.cos(tilts) ** 2,
+                             focal_lengths]),
+        object_location, screen_location
+    )
+    magnifications = matrices[..., 0, 0]
+    # the image forms where B + z D = 0 after the screen
+    images = -matrices[..., 0, 1] / matrices[..., 1, 1]
+    return (
+        magnifications.mean(axis=0), images.mean(axis=0),
+        images[0] - images[1]
+    )
+
+
+def tolerance_chunk(seed, num_samples, tolerances, nominal, *column):
+    """perturb and trace a chunk of columns
+
+    Returns:
+        perturbations (np.array): (S, P) error of every parameter
+        results (np.array): (3, S) magnification, defocus, astigmatism
+    """
+    rng = np.random.default_rng(seed)
+    perturbations = draw_perturbations(
+        rng, tolerances, nominal, num_samples
+    )
+    return perturbations, np.stack(perturbed_images(perturbations, *column))
+
+
+def sensitivities(perturbations, values):
+    """linear change of a quantity per unit error of every parameter
+
+    Least squares fit of the quantity against the errors with an
+    intercept, so parameters are separated even when drawn together.
+    Effects even in the error, such as a tilt, fit to zero.
+
+    Args:
+        perturbations: (S, P) error of every parameter
+        values: (S) quantity of every perturbed column
+
+    Returns:
+        (np.array): (P) fitted coefficients
+    """
+    design = np.column_stack([np.ones(len(values)), perturbations])
+    coefficients = np.linalg.lstsq(design, values, rcond=None)[0]
+    return coefficients[1:]
+
+
+def tolerance_analysis(
+    tolerances, column=None, num_samples=10000,
+    magnification_tolerance=None, defocus_tolerance=None, seed=0,
+    chunk_size=CHUNK_SIZE, processes=None
+):
+    """spread of the magnification and defocus of a column over errors of
+    its lens positions, focal lengths and tilts
+
+    Every perturbed column is one row of a batch traced with the matrices
+    of all columns multiplied at once. Chunks are spread across
+    processes by map_chunks.
+
+    Args:
+        tolerances (dict): parameter name ("z_Objective", "f_C1",
+            "tilt_Projective", ...) to its Tolerance
+        column (Column): nominal column, only active lenses are used,
+            None for the lower column
+        num_samples (int): perturbed columns
+        magnification_tolerance (float): largest relative change of the
+            magnification inside the specification
+        defocus_tolerance (float): largest change of the defocus in mm
+            inside the specification
+        seed (int): seed of the drawn errors
+        chunk_size (int): perturbed columns traced at once
+        processes (int): worker processes of map_chunks
+
+    Returns:
+        ToleranceResult: perturbations, quantities, sensitivities, yield
+    """
+    column = lower_column() if column is None else column
+    names = list(tolerances)
+    kinds, lenses = [], []
+    for name in names:
+        kind, lens = parse_parameter(name, column)
+        if not column.active[lens]:
+            raise ValueError(f"tolerance on an inactive lens: {name}")
+        kinds.append(kind)
+        lenses.append(lens)
+    active_index = column.active_index()
+    # parameters index the active lenses only
+    lenses = [int(np.searchsorted(active_index, lens)) for lens in lenses]
+    locations = column.locations[active_index]
+    focal_lengths = column.focal_lengths[active_index]
+    # lenses are not tilted nominally
+    nominal_values = [
+        locations[lens] if kind == "z"
+        else focal_lengths[lens] if kind == "f" else 0.0
+        for kind, lens in zip(kinds, lenses)
+    ]
+    trace = (
+        kinds, lenses, locations, focal_lengths, column.object_location,
+        column.screen_location
+    )
+
+    sizes = chunk_sizes(num_samples, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [
+        (chunk, size, [tolerances[name] for name in names], nominal_values,
+         *trace)
+        for chunk, size in zip(seeds, sizes)
+    ]
+    results = list(map_chunks(tolerance_chunk, arguments, processes))
+    perturbations = np.concatenate([result[0] for result in results])
+    magnification, defocus, astigmatism = np.concatenate(
+        [result[1] for result in results], axis=-1
+    )
+
+    nominal = dict(zip(
+        ("magnification", "defocus", "astigmatism"),
+        (float(value[0]) for value in perturbed_images(
+            np.zeros((1, len(names))), *trace
+        ))
+    ))
+    quantities = {
+        "magnification": magnification, "defocus": defocus,
+        "astigmatism": astigmatism
+    }
+    coefficients = {
+        key: sensitivities(perturbations, value)
+        for key, value in quantities.items()
+    }
+    inside = np.ones(num_samples, dtype=bool)
+    if magnification_tolerance is not None:
+        inside &= np.abs(
+            magnification / nominal["magnification"] - 1
+        ) <= magnification_tolerance
+    if defocus_tolerance is not None:
+        inside &= np.abs(defocus - nominal["defocus"]) <= defocus_tolerance
+    specified = magnification_tolerance is not None \
+        or defocus_tolerance is not None
+    return ToleranceResult(
+        tuple(names), perturbations, magnification, defocus, astigmatism,
+        nominal, coefficients,
+        float(np.mean(inside)) if specified else None
+    )
@@ -0,0 +1,333 @@
+"""Four dimensional (x, x', y, y') ray engine with beam steering elements.
+
+Rays are (..., 4) rows of x, x', y, y'. Lenses and stigmators are linear
+in the ray, deflectors and shifted lenses add a constant kick, so every
+element and every column is an affine map: a 4x4 matrix and an offset.
+The offset of a column is where it sends the on axis ray, i.e. the beam
+shift and tilt the deflectors produce. Element parameters may be arrays,
+their leading dimensions are broadcast so many columns go in one pass.
+"""
+from collections import namedtuple
+import numpy as np
+from .layout import (
+    LENS_NAMES, FOCAL_LENGTHS, SOURCE_LOCATION, SCINTILLATOR_LOCATION,
+    UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS
+)
+
+X, X_ANGLE, Y, Y_ANGLE = range(4)
+
+ThinLens = namedtuple(
+    "ThinLens", ["location", "focal_length", "shift_x", "shift_y"],
+    defaults=[0, 0]
+)
+ThinLens.__doc__ = """Round thin lens, optionally off the optical axis
+
+    Attributes:
+        location: location from origin
+        focal_length: focal length
+        shift_x, shift_y: offset of the lens centre from the axis
+    """
+
+Deflector = namedtuple("Deflector", ["location", "kick_x", "kick_y"])
+Deflector.__doc__ = """Thin deflector adding an angle to every ray
+
+    Attributes:
+        location: location from origin
+        kick_x, kick_y: angle added in x and y in rad
+    """
+
+Stigmator = namedtuple("Stigmator", ["location", "strength", "angle"])
+Stigmator.__doc__ = """Thin quadrupole stigmator
+
+    Attributes:
+        location: location from origin
+        strength: inverse focal length, focusing along the angle and
+            defocusing across it
+        angle: orientation of the focusing direction from x in rad
+    """
+
+AffineTransfer = namedtuple("AffineTransfer", ["matrix", "offset"])
+AffineTransfer.__doc__ = """Affine map of (x, x', y, y') rays, out = M in + c
+
+    Attributes:
+        matrix: (..., 4, 4) linear part
+        offset: (..., 4) constant part, the output of the on axis ray
+    """
+
+TransverseTrace = namedtuple(
+    "TransverseTrace", ["element_rays", "screen_rays"]
+)
+TransverseTrace.__doc__ = """Result of tracing (x, x', y, y') rays
+
+    Attributes:
+        element_rays: (..., E, N, 4) rays just after every element, in
+            the order of the elements along the column
+        screen_rays: (..., N, 4) rays at the screen
+    """
+
+
+def identity_transfer(batch=()):
+    """transfer leaving rays unchanged"""
+    return AffineTransfer(
+        np.broadcast_to(np.identity(4), batch + (4, 4)),
+        np.zeros(batch + (4,))
+    )
+
+
+def drift_transfer(distances):
+    """transfer through free space
+
+    Args:
+        distances: scalar or array of distances
+
+    Returns:
+        AffineTransfer: (..., 4, 4) matrices and zero offsets
+    """
+    distances = np.asarray(distances, dtype=float)
+    matrix = np.zeros(distances.shape + (4, 4))
+    matrix[..., range(4), range(4)] = 1
+    matrix[..., X, X_ANGLE] = distances
+    matrix[..., Y, Y_ANGLE] = distances
+    return AffineTransfer(matrix, np.zeros(distances.shape + (4,)))
+
+
+def element_transfer(element):
+    """transfer across a thin element
+
+    Args:
+        element: ThinLens, Deflector or Stigmator, parameters may be
+            arrays
+
+    Returns:
+        AffineTransfer: transfer of the element
+    """
+    if isinstance(element, Deflector):
+        kick_x, kick_y = np.broadcast_arrays(
+            np.asarray(element.kick_x, dtype=float),
+            np.asarray(element.kick_y, dtype=float)
+        )
+        transfer = identity_transfer(kick_x.shape)
+        transfer.offset[..., X_ANGLE] = kick_x
+        transfer.offset[..., Y_ANGLE] = kick_y
+        return transfer
+
+    if isinstance(element, ThinLens):
+        power, shift_x, shift_y = np.broadcast_arrays(
+            1 / np.asarray(element.focal_length, dtype=float),
+            np.asarray(element.shift_x, dtype=float),
+            np.asarray(element.shift_y, dtype=float)
+        )
+        transfer = identity_transfer(power.shape)
+        matrix = transfer.matrix.copy()
+        matrix[..., X_ANGLE, X] = -power
+        matrix[..., Y_ANGLE, Y] = -power
+        # the lens bends rays towards its own centre
+        transfer.offset[..., X_ANGLE] = power * shift_x
+        transfer.offset[..., Y_ANGLE] = power * shift_y
+        return AffineTransfer(matrix, transfer.offset)
+
+    if isinstance(element, Stigmator):
+        strength, angle = np.broadcast_arrays(
+            np.asarray(element.strength, dtype=float),
+            np.asarray(element.angle, dtype=float)
+        )
+        cos, sin = np.cos(2 * angle), np.sin(2 * angle)
+        transfer = identity_transfer(strength.shape)
+        matrix = transfer.matrix.copy()
+        matrix[..., X_ANGLE, X] = -strength * cos
+        matrix[..., X_ANGLE, Y] = -strength * sin
+        matrix[..., Y_ANGLE, X] = -strength * sin
+        matrix[..., Y_ANGLE, Y] = strength * cos
+        return AffineTransfer(matrix, transfer.offset)
+
+    raise TypeError(f"unknown column element: {element!r}")
+
+
+def compose(second, first):
+    """transfer of first followed by second"""
+    return AffineTransfer(
+        second.matrix @ first.matrix,
+        (second.matrix @ first.offset[..., None])[..., 0] + second.offset
+    )
+
+
+def apply_transfer(transfer, rays):
+    """send rays through a transfer
+
+    Args:
+        transfer (AffineTransfer): (...) batch of transfers
+        rays: (N, 4) or (..., N, 4) rays
+
+    Returns:
+        (np.array): (..., N, 4) output rays
+    """
+    rays = np.asarray(rays, dtype=float)
+    return rays @ np.swapaxes(transfer.matrix, -1, -2) \
+        + transfer.offset[..., None, :]
+
+
+def sorted_elements(elements):
+    """elements ordered along the column, stable for equal locations
+
+    Batched locations must keep the elements in the same order in every
+    column of the batch, so they are in order of their mean location.
+    Elements at equal locations in every column keep the order they are
+    given in. Elements coinciding in only some columns act in the order
+    of their means there too, which gives the same transfer: thin
+    elements at one location only add angles depending on the heights,
+    so they commute.
+
+    Raises:
+        ValueError: if the order differs between columns of the batch
+    """
+    ordered = sorted(
+        elements, key=lambda element: float(np.mean(element.location))
+    )
+    for first, second in zip(ordered, ordered[1:]):
+        if np.any(np.asarray(second.location) < first.location):
+            raise ValueError(
+                "batched element locations must keep the elements in the "
+                "same order in every column"
+            )
+    return ordered
+
+
+def column_transfer(elements, object_location, end_location):
+    """affine transfer of a column of thin elements
+
+    Elements at the same location act in the order they are given, in a
+    batch as sorted_elements orders them. Thin elements at one location
+    commute, so the order does not change the transfer.
+
+    Args:
+        elements (list): ThinLens, Deflector and Stigmator elements
+        object_location: location where the transfer starts
+        end_location: location where the transfer ends
+
+    Returns:
+        AffineTransfer: transfer object plane to end plane
+    """
+    transfer = identity_transfer()
+    last_location = object_location
+    for element in sorted_elements(elements):
+        location = np.asarray(element.location, dtype=float)
+        transfer = compose(
+            element_transfer(element),
+            compose(drift_transfer(location - last_location), transfer)
+        )
+        last_location = location
+    return compose(drift_transfer(end_location - last_location), transfer)
+
+
+def trace_transverse(rays, elements, object_location, screen_location):
+    """trace (x, x', y, y') rays through a column of thin elements
+
+    Args:
+        rays: (N, 4) rays at the object plane
+        elements (list): ThinLens, Deflector and Stigmator elements
+        object_location: location of the object plane
+        screen_location: location of the final plane
+
+    Returns:
+        TransverseTrace: rays after every element and at the screen
+    """
+    rays = np.asarray(rays, dtype=float).reshape(-1, 4)
+    element_rays = []
+    last_location = object_location
+    for element in sorted_elements(elements):
+        location = np.asarray(element.location, dtype=float)
+        rays = apply_transfer(drift_transfer(location - last_location), rays)
+        rays = apply_transfer(element_transfer(element), rays)
+        element_rays.append(rays)
+        last_location = location
+    screen_rays = apply_transfer(
+        drift_transfer(screen_location - last_location), rays
+    )
+    if element_rays:
+        element_rays = np.stack(
+            np.broadcast_arrays(*element_rays), axis=-3
+        )
+    else:
+        element_rays = np.empty(screen_rays.shape[:-2] + (0,) + rays.shape)
+    return TransverseTrace(element_rays, screen_rays)
+
+
+def beam_shift_tilt(elements, object_location, end_location):
+    """shift and tilt of the on axis ray at the end plane
+
+    Args:
+        elements (list): ThinLens, Deflector and Stigmator elements
+        object_location: location where the on axis ray starts
+        end_location: location the shift and tilt are predicted at
+
+    Returns:
+        shift (np.array): (..., 2) x, y position
+        tilt (np.array): (..., 2) x', y' angle
+    """
+    offset = column_transfer(elements, object_location, end_location).offset
+    return offset[..., [X, Y]], offset[..., [X_ANGLE, Y_ANGLE]]
+
+
+def tilt_shift_kicks(shift, tilt, separation):
+    """kicks of a deflector pair giving a beam shift and tilt
+
+    An on axis ray kicked by the first deflector and, a separation later,
+    by the second leaves the pair at shift with angle tilt.
+
+    Args:
+        shift: position after the second deflector
+        tilt: angle after the second deflector
+        separation: distance between the deflectors
+
+    Returns:
+        first, second: kicks of the first and second deflector
+    """
+    first = np.asarray(shift, dtype=float) / separation
+    return first, np.asarray(tilt, dtype=float) - first
+
+
+def lens_elements(
+    focal_lengths=FOCAL_LENGTHS,
+    locations=UPPER_LENS_LOCATIONS + LOWER_LENS_LOCATIONS,
+    active=(True,) * len(LENS_NAMES)
+):
+    """round lenses of the column as thin elements
+
+    Args:
+        focal_lengths (list): focal length of every lens
+        locations (list): location of every lens
+        active (list): bool list with for active lenses
+
+    Returns:
+        (list): ThinLens of every active lens
+    """
+    return [
+        ThinLens(location, focal_length)
+        for location, focal_length, act in zip(
+            locations, focal_lengths, active
+        )
+        if act
+    ]
+
+
+def column_shift_tilt(
+    deflectors, focal_lengths=FOCAL_LENGTHS,
+    active=(True,) * len(LENS_NAMES),
+    start=SOURCE_LOCATION, end=SCINTILLATOR_LOCATION
+):
+    """beam shift and tilt of deflector settings in the NanoMi column
+
+    Args:
+        deflectors (list): Deflector and Stigmator elements added to the
+            round lenses
+        focal_lengths (list): focal length of every lens
+        active (list): bool list with for active lenses
+        start: location the on axis ray starts from
+        end: location the shift and tilt are predicted at
+
+    Returns:
+        shift (np.array): (..., 2) x, y position
+        tilt (np.array): (..., 2) x', y' angle
+    """
+    elements = lens_elements(focal_lengths, active=active) + list(deflectors)
+    return beam_shift_tilt(elements, start, end)
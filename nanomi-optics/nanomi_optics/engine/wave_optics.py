@@ -0,0 +1,371 @@
+"""Wave-optical bright-field images of a weak phase specimen.
+
+The specimen spectrum is taken once with a real FFT, a whole defocus
+series is multiplied by its contrast transfer functions and brought back
+with one batched inverse FFT. Spectra, transfer functions and images are
+kept in caches keyed by a hash of the specimen and the parameters, so
+coming back to a setting costs nothing. All lengths are in mm.
+"""
+from collections import OrderedDict, namedtuple
+import hashlib
+import threading
+import numpy as np
+import scipy.fft
+from .monte_carlo import FWHM_SIGMA
+from .layout import BEAM_ENERGY
+
+# assumed spherical and chromatic aberration of the objective
+CS = 1.0
+CC = 1.0
+
+# full width at half maximum of the electron energies in eV
+ENERGY_SPREAD = 1.0
+
+# fraction of the specimen contrast from amplitude
+AMPLITUDE_CONTRAST = 0.07
+
+# pixels of the simulated image along each side
+IMAGE_SIZE = 2048
+
+# pixel size at the specimen, 0.05 nm
+PIXEL_SIZE = 0.05e-6
+
+# results kept by a simulator cache
+CACHE_SIZE = 16
+
+# electron rest energy in eV
+REST_ENERGY = 510998.95
+
+# planck constant times speed of light in eV mm
+HC = 1.23984198e-3
+
+SimulatedImages = namedtuple(
+    "SimulatedImages", ["defoci", "ctf", "images", "pixel_size"]
+)
+SimulatedImages.__doc__ = """Bright-field images of a defocus series
+
+    Attributes:
+        defoci: (D) defocus of every image, positive for underfocus
+        ctf: (D, H, W // 2 + 1) transfer function in real FFT layout
+        images: (D, H, W) intensity of every image, 1 without specimen
+        pixel_size: pixel size at the screen
+    """
+
+
+def electron_wavelength(energy=BEAM_ENERGY):
+    """relativistic wavelength of electrons
+
+    Args:
+        energy: kinetic energy in eV
+
+    Returns:
+        wavelength in mm
+    """
+    energy = np.asarray(energy, dtype=float)
+    return HC / np.sqrt(energy * (energy + 2 * REST_ENERGY))
+
+
+def column_defocus(column):
+    """defocus and magnification of the specimen imaged on the screen
+
+    The screen is conjugate to the plane a distance -B / A before the
+    object plane, for the matrix object to screen, which is the defocus
+    of the object. A weaker lens focuses before the object, underfocus.
+
+    Args:
+        column (Column): column with the specimen at its object plane
+
+    Returns:
+        defocus (float): defocus of the specimen, positive for underfocus
+        magnification (float): magnification object to screen
+    """
+    matrix = column.system_matrix()
+    return -matrix[0, 1] / matrix[0, 0], matrix[0, 0]
+
+
+def spatial_frequencies(shape, pixel_size):
+    """squared spatial frequency of every element of a real FFT
+
+    Args:
+        shape (tuple): (H, W) pixels of the image
+        pixel_size (float): pixel size at the specimen
+
+    Returns:
+        (np.array): (H, W // 2 + 1) squared frequency in 1 / mm^2
+    """
+    rows = scipy.fft.fftfreq(shape[0], pixel_size)
+    columns = scipy.fft.rfftfreq(shape[1], pixel_size)
+    return rows[:, None] ** 2 + columns[None, :] ** 2
+
+
+def contrast_transfer(
+    frequencies, defoci, cs=CS, cc=CC, energy_spread=ENERGY_SPREAD,
+    amplitude_contrast=AMPLITUDE_CONTRAST, convergence=0.0,
+    beam_energy=BEAM_ENERGY
+):
+    """contrast transfer function of a weak specimen at many defoci
+
+    chi(k) = pi lambda k^2 (Cs lambda^2 k^2 / 2 - defocus), damped by the
+    temporal coherence envelope of the focus spread from Cc and the
+    energy spread, and the spatial envelope of the illumination angle.
+
+    Args:
+        frequencies: (...) squared spatial frequency in 1 / mm^2
+        defoci: (D) defocus, positive for underfocus
+        cs (float): spherical aberration
+        cc (float): chromatic aberration
+        energy_spread (float): full width at half maximum of the
+            electron energies in eV
+        amplitude_contrast (float): fraction of contrast from amplitude
+        convergence (float): illumination semi angle in rad
+        beam_energy (float): beam energy in eV
+
+    Returns:
+        (np.array): (D, ...) transfer of every frequency at every defocus,
+            in the floating point type of the frequencies
+    """
+    k2 = np.asarray(frequencies)
+    if not np.issubdtype(k2.dtype, np.floating):
+        k2 = k2.astype(float)
+    defoci = np.asarray(defoci, dtype=k2.dtype).reshape(
+        (-1,) + (1,) * k2.ndim
+    )
+    # python floats keep the type of the frequencies
+    wavelength = float(electron_wavelength(beam_energy))
+    chi = np.pi * wavelength * k2 * (
+        0.5 * cs * wavelength ** 2 * k2 - defoci
+    )
+    transfer = (1 - amplitude_contrast ** 2) ** 0.5 * np.sin(chi) \
+        - amplitude_contrast * np.cos(chi)
+    focus_spread = cc * energy_spread / float(FWHM_SIGMA) / beam_energy
+    envelope = np.exp(-0.5 * (np.pi * wavelength * focus_spread * k2) ** 2)
+    if convergence:
+        # gradient of chi over 2 pi k
+        gradient = wavelength * (cs * wavelength ** 2 * k2 - defoci)
+        envelope = envelope * np.exp(
+            -(np.pi * convergence / wavelength) ** 2 * gradient ** 2 * k2
+        )
+    return transfer * envelope
+
+
+def specimen_phase(
+    shape=(IMAGE_SIZE, IMAGE_SIZE), pixel_size=PIXEL_SIZE, particles=200,
+    seed=0
+):
+    """phase of a test specimen: particles on an amorphous film
+
+    Args:
+        shape (tuple): (H, W) pixels of the image
+        pixel_size (float): pixel size at the specimen
+        particles (int): number of particles on the film
+        seed (int): seed of the film and particle positions
+
+    Returns:
+        (np.array): (H, W) phase shift in rad
+    """
+    rng = np.random.default_rng(seed)
+    k2 = spatial_frequencies(shape, pixel_size)
+    # film of random phase correlated over about 0.3 nm
+    film = scipy.fft.irfft2(
+        scipy.fft.rfft2(rng.normal(size=shape))
+        * np.exp(-k2 * (np.pi * 0.3e-6) ** 2), s=shape
+    )
+    film *= 0.05 / film.std()
+    # particles of about 2 nm across, 0.5 rad at their centre
+    centres = np.zeros(shape)
+    np.add.at(centres, (
+        rng.integers(0, shape[0], particles),
+        rng.integers(0, shape[1], particles)
+    ), 1)
+    # a unit area gaussian of 1 nm sigma, scaled to its peak
+    width = 1e-6 / pixel_size
+    blob = np.exp(-2 * (np.pi * 1e-6) ** 2 * k2)
+    return film + 0.5 * 2 * np.pi * width ** 2 * scipy.fft.irfft2(
+        scipy.fft.rfft2(centres) * blob, s=shape
+    )
+
+
+class SimulationCache:
+    """Least recently used results keyed by a parameter hash
+
+    Attributes:
+        max_size: results kept, the least recently used is dropped first
+        hits: lookups answered from the cache
+        misses: lookups that had to compute
+    """
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.results)
+
+    def lookup(self, compute, key):
+        """result of a key, computed only on a miss
+
+        Args:
+            compute (func): called without arguments to get the result
+            key (str): hash of everything the result depends on
+
+        Returns:
+            the stored or computed result
+        """
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.hits += 1
+                self.results.move_to_end(key)
+                return result
+            self.misses += 1
+        result = compute()
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+        return result
+
+    def clear(self):
+        """drop every result and reset the counters"""
+        with self.lock:
+            self.results.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def parameter_hash(*parameters):
+    """hash of arrays and plain values"""
+    digest = hashlib.blake2b(digest_size=16)
+    for parameter in parameters:
+        if isinstance(parameter, np.ndarray):
+            digest.update(str((parameter.dtype, parameter.shape)).encode())
+            digest.update(np.ascontiguousarray(parameter).tobytes())
+        else:
+            digest.update(repr(parameter).encode())
+    return digest.hexdigest()
+
+
+class ImageSimulator:
+    """Bright-field defocus series of a specimen with cached FFTs
+
+    The weak phase image is 1 + 2 F^-1[F[phase] CTF], a real FFT of the
+    specimen is reused for every defocus. In single precision the FFTs
+    and the transfer functions stay float32 throughout.
+
+    Attributes:
+        shape (tuple): (H, W) pixels of the image
+        pixel_size (float): pixel size at the specimen
+        dtype: float32 or float64 of the images
+        workers (int): threads of every FFT, -1 for one per core
+        spectra (SimulationCache): real FFTs of specimens
+        transfers (SimulationCache): transfer function stacks
+        images (SimulationCache): simulated image stacks
+    """
+    def __init__(
+        self, shape=(IMAGE_SIZE, IMAGE_SIZE), pixel_size=PIXEL_SIZE,
+        dtype=np.float32, workers=-1, cache_size=CACHE_SIZE
+    ):
+        self.shape = tuple(shape)
+        self.pixel_size = pixel_size
+        self.dtype = np.dtype(dtype)
+        self.workers = workers
+        self.frequencies = spatial_frequencies(
+            self.shape, pixel_size
+        ).astype(self.dtype)
+        self.spectra = SimulationCache(cache_size)
+        self.transfers = SimulationCache(cache_size)
+        self.images = SimulationCache(cache_size)
+
+    def spectrum(self, specimen):
+        """real FFT of a specimen phase, cached by its content
+
+        Returns:
+            key (str): hash of the specimen
+            spectrum (np.array): (H, W // 2 + 1) spectrum
+        """
+        specimen = np.asarray(specimen, dtype=self.dtype)
+        if specimen.shape != self.shape:
+            raise ValueError(
+                f"specimen of shape {specimen.shape}, not {self.shape}"
+            )
+        key = parameter_hash(specimen)
+        return key, self.spectra.lookup(
+            lambda: scipy.fft.rfft2(specimen, workers=self.workers), key
+        )
+
+    def ctf(self, defoci, **optics):
+        """transfer functions of a defocus series, cached by parameters
+
+        Args:
+            defoci: (D) defocus, positive for underfocus
+            **optics: keyword arguments of contrast_transfer
+
+        Returns:
+            (np.array): (D, H, W // 2 + 1) transfer functions
+        """
+        defoci = np.atleast_1d(np.asarray(defoci, dtype=float))
+        key = parameter_hash(
+            self.shape, self.pixel_size, self.dtype.str, defoci,
+            sorted(optics.items())
+        )
+        return self.transfers.lookup(
+            lambda: contrast_transfer(self.frequencies, defoci, **optics),
+            key
+        )
+
+    def simulate(self, specimen, defoci, magnification=1.0, **optics):
+        """bright-field images of a specimen over a defocus series
+
+        Args:
+            specimen: (H, W) phase shift of the specimen in rad
+            defoci: (D) defocus, positive for underfocus
+            magnification (float): magnification to the screen, a
+                negative one turns the images by half a turn
+            **optics: keyword arguments of contrast_transfer
+
+        Returns:
+            SimulatedImages: transfer functions and images
+        """
+        defoci = np.atleast_1d(np.asarray(defoci, dtype=float))
+        specimen_key, spectrum = self.spectrum(specimen)
+        ctf = self.ctf(defoci, **optics)
+        key = parameter_hash(
+            specimen_key, self.pixel_size, self.dtype.str, defoci,
+            np.sign(magnification), sorted(optics.items())
+        )
+
+        def compute():
+            images = scipy.fft.irfft2(
+                spectrum * ctf, s=self.shape, workers=self.workers,
+                overwrite_x=True
+            )
+            images *= 2
+            images += 1
+            if magnification < 0:
+                images = images[:, ::-1, ::-1]
+            return images
+
+        return SimulatedImages(
+            defoci, ctf, self.images.lookup(compute, key),
+            self.pixel_size * abs(magnification)
+        )
+
+    def simulate_column(self, column, specimen, offsets=(0.0,), **optics):
+        """images at the defocus of the current lens settings
+
+        Args:
+            column (Column): column with the specimen at its object plane
+            specimen: (H, W) phase shift of the specimen in rad
+            offsets: (D) defoci added to the one of the column
+            **optics: keyword arguments of contrast_transfer
+
+        Returns:
+            SimulatedImages: transfer functions and images
+        """
+        defocus, magnification = column_defocus(column)
+        return self.simulate(
+            specimen, defocus + np.asarray(offsets, dtype=float),
+            magnification, **optics
+        )
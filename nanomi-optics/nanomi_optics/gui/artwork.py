@@ -0,0 +1,585 @@
+"""
+Static artwork and ray path artists of the column diagram.
+Shared by the interactive diagram and the headless renderer, it only
+needs a matplotlib axis and never imports tkinter.
+"""
+
+from contextlib import nullcontext
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.patches import Rectangle
+from nanomi_optics.engine.column import upper_column, lower_column
+from nanomi_optics.engine.operating_point import (
+    OperatingPointCache, trace_operating_point
+)
+from nanomi_optics.engine.continuation import FocalLengthTracker
+from nanomi_optics.engine.layout import (
+    LENS_BORE, ASYMMETRIC_LENS_BORE, SOURCE_RAYS,
+    CONDENSOR_APERATURE_LOCATION, SAMPLE_LOCATION, SCINTILLATOR_LOCATION,
+    UPPER_LENS_LOCATIONS, LOWER_LENS_LOCATIONS, sample_rays
+)
+
+# stores info for the anode
+ANODE = [39.1, 30, 1.5, [0.5, 0, 0.3], 'Anode']
+
+# stores info for the sample
+SAMPLE = [SAMPLE_LOCATION, 1.5, -1, [1, 0.7, 0], 'Sample']
+
+# stores info for the scintillator
+SCINTILLATOR = [
+    SCINTILLATOR_LOCATION, 1.5, 1, [0.3, 0.75, 0.75], 'Scintillator'
+]
+
+# stores info for the condensor aperature
+CONDENSOR_APERATURE = [
+    CONDENSOR_APERATURE_LOCATION, 1.5, 1, [0, 0, 0], 'Cond. Apert'
+]
+
+# add color of each ray in same order as rays
+# red, green, blue, gold
+RAY_COLORS = [[1.0, 0, 0], [0.0, 1.0, 0], [0.0, 0.2, 1.0], [0.7, 0.4, 0]]
+
+# stores info for the lower lenses
+LOWER_LENSES = [
+    [LOWER_LENS_LOCATIONS[0], 1.5, -1, [0.3, 0.75, 0.75], 'Objective'],
+    [LOWER_LENS_LOCATIONS[1], 1.5, 1, [0.3, 0.75, 0.75], 'Intermediate'],
+    [LOWER_LENS_LOCATIONS[2], 1.5, 1, [0.3, 0.75, 0.75], 'Projective']
+]
+
+# stores info for the upper lenses
+UPPER_LENSES = [
+    [UPPER_LENS_LOCATIONS[0], 63.5, 1.5, [0.3, 0.9, 0.65], 'C1'],
+    [UPPER_LENS_LOCATIONS[1], 1.5, 1, [0.3, 0.75, 0.75], 'C2'],
+    [UPPER_LENS_LOCATIONS[2], 1.5, 1, [0.3, 0.75, 0.75], 'C3']
+]
+
+# scattered, shifted and parallel rays from the sample
+NUM_SAMPLE_RAYS = 3
+
+# resolution of the saved PNG files
+DPI = 100
+
+
+class ColumnArtwork:
+    """draws the column diagram on self.axis
+
+    The lens boxes are drawn once, the ray paths, crossovers and
+    magnification labels are artists updated from operating points.
+    """
+    def draw_column(self):
+        """draw the static column and create the ray artists"""
+        # axis labels
+        self.axis.text(
+            275, -2.1, 'X [mm]', color=[0, 0, 0], fontsize=6
+        )
+        self.axis.set_ylabel(
+            'Z [mm]', color=[0, 0, 0], fontsize=6
+        )
+
+        # draws anode
+        self.symmetrical_box(*ANODE)
+
+        # draws sample
+        self.sample_aperature_box(*SAMPLE)
+
+        # draws condensor aperature
+        self.sample_aperature_box(*CONDENSOR_APERATURE)
+
+        # draws scintillator
+        self.asymmetrical_box(*SCINTILLATOR)
+
+        # draw red dashed line on x-axis
+        self.axis.axhline(0, 0, 1, color='red', linestyle='--')
+
+        # magnification plots
+        self.mag_u_plot, self.mag_l_plot = [], []
+
+        # crossover points arrays
+        self.crossover_points_c, self.crossover_points_b = [], []
+
+        # takes in list of lens info, draws upper lenses
+        # and setup magnification plots
+        for i, row in enumerate(UPPER_LENSES):
+            # draw C1 lens
+            if i == 0:
+                self.symmetrical_box(*row)
+            # draw C2, C3 lens
+            else:
+                self.asymmetrical_box(*row)
+            # set up magnification plot
+            self.mag_u_plot.append(
+                self.axis.text(
+                    UPPER_LENSES[i][0] + 5,
+                    0.5, '', color='k', fontsize=8,
+                    rotation='vertical',
+                    backgroundcolor=[0.8, 1.0, 1.0]
+                )
+            )
+            # green circle to mark the crossover point of each lens
+            self.crossover_points_c.append(self.axis.plot([], 'go')[0])
+
+        # takes in list of lens info, draws lower lenses
+        # and set up crossover points
+        for i, row in enumerate(LOWER_LENSES):
+            # draw lens
+            self.asymmetrical_box(*row)
+            # set up magnification plot
+            self.mag_l_plot.append(
+                self.axis.text(
+                    LOWER_LENSES[i][0] + 5,
+                    0.5, '', color='k', fontsize=8,
+                    rotation='vertical',
+                    backgroundcolor=[0.8, 1, 1]
+                )
+            )
+            # green circle to mark the crossover point of each lens
+            self.crossover_points_b.append(self.axis.plot([], 'go')[0])
+
+        # lines representing the ray path, reused on every update
+        self.drawn_rays_c = self.ray_artists(len(SOURCE_RAYS))
+        self.drawn_rays_b = self.ray_artists(NUM_SAMPLE_RAYS)
+
+        # text to display extreme info
+        self.extreme_info = self.axis.text(
+            300, 1.64, '', color=[0, 0, 0],
+            fontsize='large', ha='center'
+        )
+
+    def ray_artists(self, num_rays):
+        """create the lines of every ray path, filled in when traced
+
+        Args:
+            num_rays (int): number of rays
+
+        Returns:
+            (list): for each ray, lines of the path, from the lenses to
+                their images and marking the images
+        """
+        return [
+            (
+                self.axis.plot([], [], lw=1, color=RAY_COLORS[i])[0],
+                self.axis.plot([], [], lw=2, color=RAY_COLORS[i])[0],
+                self.axis.plot([], [], lw=1, color="k")[0]
+            )
+            for i in range(num_rays)
+        ]
+
+    def ray_lines(self):
+        """lines that change with the lens settings"""
+        return [
+            line for lines in self.drawn_rays_c + self.drawn_rays_b
+            for line in lines
+        ] + self.crossover_points_c + self.crossover_points_b
+
+    def ray_layer(self):
+        """artists that change with the lens settings"""
+        return self.ray_lines() + self.mag_u_plot + self.mag_l_plot
+
+    def symmetrical_box(self, x, w, h, colour, name):
+        """ draws symmetrical box in diagram
+
+        Args:
+            x (float): box location
+            w (float): box width
+            h (float): box height
+            colour (list): RGB colors
+            name (str): lens name
+        """
+        # x = location of centre point of box along x-axis
+        # w = width, h = height, colour = color
+
+        # rectangle box
+        self.axis.add_patch(
+            Rectangle(
+                (x-w/2, -h), w, h*2, edgecolor=colour,
+                facecolor='none', lw=1
+            )
+        )
+        # top lens bore (horizontal line)
+        self.axis.hlines(LENS_BORE, x-w/2, x+w/2, colors=colour)
+        # bottom lens bore (horizontal line)
+        self.axis.hlines(-LENS_BORE, x-w/2, x+w/2, colors=colour)
+        # electrode location in lens
+        self.axis.vlines(x, -h, h, colors=colour, linestyles='--')
+
+        self.axis.text(
+            x, -h+0.05, name, fontsize=8,
+            rotation='vertical', ha='center'
+        )
+        return
+
+    # draws an asymmetrical box
+    def asymmetrical_box(self, x, h, position, colour, name):
+        """ draws symmetrical box in diagram
+
+        Args:
+            x (float): box location
+            h (float): box height
+            position (int): defines dashed line side
+            colour (list): RGB colors
+            name (str): box name
+        """
+        # Short, Long distance from mid holder to sample [mm]
+        long, short = ASYMMETRIC_LENS_BORE
+
+        self.axis.add_patch(
+            Rectangle(
+                (x+position*short, -h), -position*long-position*short,
+                2*h, edgecolor=colour, facecolor='none', lw=1
+            )
+        )
+        # electrode Location in lens
+        self.axis.vlines(x, -h, h, colors=colour, linestyles='--')
+        # bottom lens bore
+        self.axis.hlines(-LENS_BORE, x-long, x+short, colors=colour)
+        # top lens bore
+        self.axis.hlines(LENS_BORE, x-long, x+short, colors=colour)
+
+        self.axis.text(
+            x-position*10, -h+0.05, name, fontsize=8,
+            rotation='vertical', ha='center'
+        )
+        return
+
+    # draws box for sample and condensor aperature
+    def sample_aperature_box(self, x, h, position, colour, name):
+        """draws box for sample and condensor aperature
+
+        Args:
+            x (float): location of center point along (true) x-axis
+            h (float): height for box
+            position (int): defines dashed line side
+            colour (list): RGB colors
+            name (str): box name
+        """
+        # Short, Long distance from mid holder to sample [mm]
+        long = 25  # mm
+        short = 3  # mm
+
+        self.axis.add_patch(
+            Rectangle(
+                (x+position*short, -h), -position*long-position*short,
+                2*h, edgecolor=colour, facecolor='none', lw=1
+            )
+        )
+        # electrode location in lens
+        self.axis.vlines(x, h, -h, colors=colour, linestyle='--')
+        self.axis.text(
+            x-position*10, -h+0.05, name,
+            fontsize=8, ha='center', rotation='vertical'
+        )
+        return
+
+    def display_ray_path(self, point, artists, m_plot):
+        """set the ray path lines of a traced operating point
+
+        Args:
+            point (OperatingPoint): ray paths of a column
+            artists (list): path, lens to image and image lines of rays
+            m_plot (list): magnification plots
+        """
+        for lines, data in zip(artists, point.lines):
+            for line, (z, y) in zip(lines, data):
+                line.set_data(z, y)
+        for text, mag in zip(m_plot, point.magnifications):
+            text.set_text(f"{mag:.2E}x")
+
+    def clear_ray_path(self, artists):
+        """remove the ray path of a column without active lenses
+
+        Args:
+            artists (list): path, lens to image and image lines of rays
+        """
+        for lines in artists:
+            for line in lines:
+                line.set_data([], [])
+
+    def display_crossovers(self, point, markers):
+        """show the crossover of the active lenses, hide the others
+
+        Args:
+            point (OperatingPoint): ray paths of a column
+            markers (list): crossover marker of every lens
+        """
+        crossovers = iter(point.crossovers)
+        for marker, act in zip(markers, point.active):
+            if act:
+                marker.set_data([next(crossovers)], [0])
+            marker.set_visible(act)
+
+
+class Untimed:
+    """stands in for a StageProfiler when the stages are not timed"""
+    def time(self, stage):
+        """context of a stage, recording nothing"""
+        return nullcontext()
+
+
+class LiveDiagram(ColumnArtwork):
+    """column diagram updated as the lens settings change
+
+    The compute methods trace a column off the drawing thread, the show
+    methods set the ray artists from the traced operating point and
+    redraw draws only the rays over a kept copy of the static diagram.
+    Used by the GUI frame on a Tk canvas and by the benchmarks on Agg.
+
+    Attributes:
+        figure (Figure): figure of the diagram
+        canvas (FigureCanvasAgg): canvas of the figure
+        axis (Axes): axis holding the column
+        cf_u, cf_l (list): focal length of every upper and lower lens
+        active_lu, active_ll (list): bool of every upper and lower lens
+        distance_from_optical (float): distance from the optical axis at
+            the sample in mm
+        mag_upper, mag_lower (list): magnification of the active lenses
+        last_mag (float): magnification at the scintillator
+    """
+    def setup_diagram(self, figure, canvas, profiler=None):
+        """draw the static diagram and set the initial lens settings
+
+        Args:
+            figure (Figure): figure of the diagram
+            canvas (FigureCanvasAgg): canvas of the figure, Agg or Tk
+            profiler (StageProfiler): timings of the update stages, None
+                to not record them
+        """
+        self.figure = figure
+        self.canvas = canvas
+        self.axis = figure.add_subplot()
+        self.profiler = Untimed() if profiler is None else profiler
+
+        # initial focal distance of the lenses in [mm]
+        self.cf_u = [67.29, 22.94, 39.88]
+        self.cf_l = [19.67, 6.498, 6]
+
+        # list for active lenses
+        self.active_lu = [True, True, True]
+        self.active_ll = [True, True, True]
+
+        self.distance_from_optical = 0.00001
+        self.last_mag = 0
+
+        # list of lenses magnification
+        self.mag_lower, self.mag_upper = [], []
+        self.draw_column()
+
+        # the rays are drawn over a copy of the static diagram
+        self.background = None
+        self.axis.relim()
+        self.static_limits = self.axis.dataLim.frozen()
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        for artist in self.ray_layer():
+            artist.set_animated(True)
+
+        # lens arrays of each column, only changed by the compute methods
+        self.upper_column = upper_column()
+        self.lower_column = lower_column()
+        # ray paths of the recently seen lens settings of each column
+        self.upper_points = OperatingPointCache()
+        self.lower_points = OperatingPointCache()
+        # keeps the last optimized focal length between slider moves
+        self.focal_length_tracker = FocalLengthTracker()
+
+    def on_draw(self, event):
+        """keep the static diagram after a full draw, then add the rays"""
+        if self.canvas.is_saving():
+            # saved figures draw the animated artists themselves
+            return
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for artist in self.ray_layer():
+            artist.draw(event.renderer)
+
+    def compute_u_rays(self, focal_lengths, active):
+        """traces the active upper lenses, without touching the plots
+
+        Settings seen recently are answered from the operating point
+        cache without tracing.
+
+        Args:
+            focal_lengths (list): focal length of every upper lens
+            active (list): bool list with for active lenses
+
+        Returns:
+            OperatingPoint: ray paths, the argument of show_u_rays
+        """
+        rays = SOURCE_RAYS
+
+        def trace():
+            self.upper_column.set_focal_lengths(focal_lengths)
+            self.upper_column.set_active(active)
+            # the source is the object of the first lens
+            with self.profiler.time("compute"):
+                return trace_operating_point(self.upper_column, rays)
+
+        return self.upper_points.lookup(trace, focal_lengths, active, rays)
+
+    def show_u_rays(self, point):
+        """plots the traced ray paths of the upper lenses
+
+        Args:
+            point (OperatingPoint): ray paths of the upper lenses
+        """
+        with self.profiler.time("artists"):
+            self.mag_upper = list(point.magnifications)
+            self.display_crossovers(point, self.crossover_points_c)
+            if point.lines is not None:
+                self.display_ray_path(
+                    point, self.drawn_rays_c, self.mag_u_plot
+                )
+            else:
+                self.clear_ray_path(self.drawn_rays_c)
+
+    def display_u_rays(self):
+        """traces the active upper lenses and plots the ray paths"""
+        self.show_u_rays(self.compute_u_rays(self.cf_u, self.active_lu))
+
+    def compute_l_rays(
+        self, focal_lengths, active, distance, opt_sel="Image", lens_sel=-1
+    ):
+        """optimizes and traces the lower lenses, without touching the plots
+
+        Settings seen recently are answered from the operating point
+        cache without optimizing or tracing.
+
+        Args:
+            focal_lengths (list): focal length of every lower lens
+            active (list): bool list with for active lenses
+            distance (float): distance from the optical axis at the sample
+            opt_sel (str): image mode for optimization
+            lens_sel (int): lens index to optimize focal length, -1 for none
+
+        Returns:
+            OperatingPoint: ray paths with the optimized focal lengths,
+                the argument of show_l_rays
+        """
+        column = self.lower_column
+        rays = sample_rays(distance)
+
+        def trace():
+            optimized = list(focal_lengths)
+            if lens_sel != -1:
+                with self.profiler.time("optimize"):
+                    optimized[lens_sel] = self.focal_length_tracker.solve(
+                        opt_sel, lens_sel, column.locations, optimized,
+                        rays[0:2], active
+                    )
+            column.set_focal_lengths(optimized)
+            column.set_active(active)
+            # the sample is the object of the first lens
+            with self.profiler.time("compute"):
+                return trace_operating_point(column, rays)
+
+        optimization = (opt_sel, lens_sel) if lens_sel != -1 else ()
+        return self.lower_points.lookup(
+            trace, focal_lengths, active, rays, *optimization
+        )
+
+    def show_l_rays(self, point):
+        """plots the traced ray paths of the lower lenses
+
+        Args:
+            point (OperatingPoint): ray paths of the lower lenses
+        """
+        with self.profiler.time("artists"):
+            self.mag_lower = list(point.magnifications)
+            self.display_crossovers(point, self.crossover_points_b)
+            if point.lines is not None:
+                self.display_ray_path(
+                    point, self.drawn_rays_b, self.mag_l_plot
+                )
+                # the second ray starts at the distance from the axis
+                self.last_mag = abs(
+                    point.screen_heights[1] / point.rays[1][0]
+                )
+            else:
+                self.clear_ray_path(self.drawn_rays_b)
+
+    def display_l_rays(self):
+        """traces the active lower lenses and plots the ray paths"""
+        self.show_l_rays(self.compute_l_rays(
+            self.cf_l, self.active_ll, self.distance_from_optical
+        ))
+
+    def redraw(self):
+        """redraw diagram
+
+        Only the rays are drawn over the kept static diagram, unless the
+        view limits change with the rays or nothing was drawn yet.
+        """
+        with self.profiler.time("draw"):
+            view = self.axis.viewLim.frozen()
+            # only the rays change the limits of the static diagram
+            self.axis.dataLim.set(self.static_limits)
+            for line in self.ray_lines():
+                if line.get_visible():
+                    self.axis.update_datalim(line.get_xydata())
+            self.axis.autoscale_view()
+            if self.background is None or \
+                    not np.array_equal(self.axis.viewLim.get_points(),
+                                       view.get_points()):
+                self.canvas.draw()
+                return
+            self.canvas.restore_region(self.background)
+            for artist in self.ray_layer():
+                self.axis.draw_artist(artist)
+            self.canvas.blit(self.axis.bbox)
+
+
+class HeadlessDiagram(ColumnArtwork):
+    """column diagram on an Agg canvas
+
+    The lens boxes and labels are drawn once, only the ray paths,
+    crossovers and magnification labels change between configurations.
+
+    Attributes:
+        figure (Figure): figure of the diagram, as in the GUI
+        canvas (FigureCanvasAgg): canvas writing the files
+        axis (Axes): axis holding the column
+        static_limits (Bbox): data limits of the static artwork
+    """
+    def __init__(self):
+        self.figure = Figure(figsize=(10, 10))
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axis = self.figure.add_subplot()
+        self.draw_column()
+        self.axis.relim()
+        self.static_limits = self.axis.dataLim.frozen()
+        self.upper_column = upper_column()
+        self.lower_column = lower_column()
+
+    def show(self, focal_lengths, active, distance):
+        """set the ray paths of one configuration
+
+        Args:
+            focal_lengths (list): focal length of every lens, upper first
+            active (list): bool of every lens, upper first
+            distance (float): distance from the optical axis at the sample
+        """
+        self.upper_column.set_focal_lengths(focal_lengths[:3])
+        self.upper_column.set_active(active[:3])
+        self.lower_column.set_focal_lengths(focal_lengths[3:])
+        self.lower_column.set_active(active[3:])
+        for column, rays, markers, artists, m_plot in (
+            (self.upper_column, SOURCE_RAYS, self.crossover_points_c,
+             self.drawn_rays_c, self.mag_u_plot),
+            (self.lower_column, sample_rays(distance),
+             self.crossover_points_b, self.drawn_rays_b, self.mag_l_plot)
+        ):
+            point = trace_operating_point(column, rays)
+            self.display_crossovers(point, markers)
+            if point.lines is not None:
+                self.display_ray_path(point, artists, m_plot)
+            else:
+                self.clear_ray_path(artists)
+
+        # only the rays change the limits of the static diagram
+        self.axis.dataLim.set(self.static_limits)
+        for line in self.ray_lines():
+            if line.get_visible():
+                self.axis.update_datalim(line.get_xydata())
+        self.axis.autoscale_view()
+
+    def save(self, path, dpi=DPI):
+        """write the diagram, the extension selects the format"""
+        self.figure.savefig(path, dpi=dpi)
@@ -9,60 +9,85 @@ import threading
 import traceback
 
 
-class AsyncHandler:
+# most renders per second done by a FrameScheduler
+FRAME_RATE = 30
+
+
+class FrameScheduler:
     """
-    A handler spins off another theread and returns immediately.
+    Runs the computation of an update on a persistent worker thread and
+    renders its result on the Tk loop.
     Used with sliders and other GUI components to prevent laggy behaviour.
+    Only the latest request is computed and only the latest result is
+    rendered, at most once per frame, so fast slider drags are coalesced.
     """
 
-    def __init__(self, handler):
-        """Wraps a handler and returns an asynchronous handler."""
-        self.handler = handler
-        # there will be only one async thread being executed at any given time
-        self.thread = None
-        # indicates whether a call to handler is currently queued/delayed
-        self.delay = False
-        # these variables will store arguments in-case a call to the handler
-        # must be delayed
-        self.next_args = None
-        self.next_kwargs = None
-        # a lock that prevents any weird edge cases
-        # the handler is the only thing not executed in it
-        self.mutex = threading.Lock()
+    def __init__(self, widget, compute, render, frame_rate=FRAME_RATE):
+        """
+        Creates a scheduler, compute is called with the arguments of a
+        request on the worker, render with its result on the Tk loop.
+        """
+        self.widget = widget
+        self.compute = compute
+        self.render = render
+        self.interval = max(1, round(1000 / frame_rate))
+        # guards the request, result and busy state shared with the worker
+        self.condition = threading.Condition()
+        self.request = None
+        self.result = None
+        self.busy = False
+        # the pending Tk callback checking for results
+        self.after_id = None
+        self.worker = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
 
     def __call__(self, *args, **kwargs):
         """
-        Calls the async handler which either spins off a thread,
-        or delays the call if one is already running.
+        Requests an update, replacing any request not computed yet.
+        Must be called from the Tk thread.
         """
-        with self.mutex:
-            if self.thread is None:
-                self.thread = threading.Thread(
-                    target=self.async_thread, args=args, kwargs=kwargs)
-                self.thread.start()
-            else:
-                self.delay = True
-                self.next_args = args
-                self.next_kwargs = kwargs
-
-    def async_thread(self, *args, **kwargs):
-        """The main method to be run by the thread."""
-        # this will loop until there are no more delayed calls to make
-        while self.thread is not None:
+        with self.condition:
+            self.request = (args, kwargs)
+            self.condition.notify()
+        if self.after_id is None:
+            self.after_id = self.widget.after(self.interval, self.poll)
+
+    def work(self):
+        """The main method of the worker thread."""
+        while True:
+            with self.condition:
+                while self.request is None:
+                    self.condition.wait()
+                args, kwargs = self.request
+                self.request = None
+                self.busy = True
             try:
-                self.handler(*args, **kwargs)
+                result = (self.compute(*args, **kwargs),)
             except Exception as e:
                 print(traceback.format_exc())
                 print(e)
-            finally:
-                with self.mutex:
-                    if self.delay:
-                        self.delay = False
-                        args = self.next_args
-                        kwargs = self.next_kwargs
-                    else:
-                        # no delayed calls, get out of here
-                        self.thread = None
+                result = None
+            with self.condition:
+                self.busy = False
+                # an older result not rendered yet is dropped
+                if result is not None:
+                    self.result = result
+
+    def poll(self):
+        """Renders the latest result, runs on the Tk loop once a frame."""
+        with self.condition:
+            result, self.result = self.result, None
+            waiting = self.busy or self.request is not None
+        if result is not None:
+            try:
+                self.render(result[0])
+            except Exception as e:
+                print(traceback.format_exc())
+                print(e)
+        if waiting:
+            self.after_id = self.widget.after(self.interval, self.poll)
+        else:
+            self.after_id = None
 
 
 class ScaleSpinboxLink:
@@ -0,0 +1,156 @@
+import csv
+import threading
+import time
+from contextlib import contextmanager
+import tkinter as tk
+from tkinter import filedialog, ttk
+import numpy as np
+
+# timings kept of every stage, the oldest is overwritten first
+BUFFER_SIZE = 512
+
+# stages of a diagram update, in the order they are shown
+STAGES = ("compute", "optimize", "artists", "draw", "update")
+
+# milliseconds between refreshes of the profiler panel
+REFRESH_INTERVAL = 500
+
+
+class StageProfiler:
+    """Wall time of the stages of the diagram updates
+
+    The last timings of every stage are kept in a fixed size ring
+    buffer. Stages may be timed from the worker thread and the Tk loop
+    at once. A disabled profiler records nothing.
+
+    Attributes:
+        enabled (bool): timings are recorded
+        size (int): timings kept of every stage
+        seconds (dict): stage to ring buffer of durations
+        stamps (dict): stage to ring buffer of end times since the epoch
+        counts (dict): stage to number of timings recorded
+    """
+    def __init__(self, enabled=True, size=BUFFER_SIZE, stages=STAGES):
+        self.enabled = enabled
+        self.size = size
+        self.seconds = {stage: np.zeros(size) for stage in stages}
+        self.stamps = {stage: np.zeros(size) for stage in stages}
+        self.counts = dict.fromkeys(stages, 0)
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """store the duration of a stage
+
+        Args:
+            stage (str): name of the stage
+            seconds (float): wall time of the stage
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            index = self.counts[stage] % self.size
+            self.seconds[stage][index] = seconds
+            self.stamps[stage][index] = time.time()
+            self.counts[stage] += 1
+
+    @contextmanager
+    def time(self, stage):
+        """record the wall time of the body of a with statement"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timings(self, stage):
+        """kept durations of a stage, oldest first"""
+        with self.lock:
+            count = self.counts[stage]
+            seconds = self.seconds[stage]
+            if count <= self.size:
+                return seconds[:count].copy()
+            return np.roll(seconds, -(count % self.size))
+
+    def percentiles(self, stage, q=(50, 95)):
+        """percentiles of the kept durations of a stage
+
+        Returns:
+            (np.array): seconds at every percentile, nan without timings
+        """
+        timings = self.timings(stage)
+        if not len(timings):
+            return np.full(len(q), np.nan)
+        return np.percentile(timings, q)
+
+    def dump(self, path):
+        """write the kept timings of every stage to a CSV file
+
+        Rows are the end time since the epoch, the stage and the duration
+        in seconds, in the order they were recorded.
+        """
+        with self.lock:
+            rows = []
+            for stage, count in self.counts.items():
+                kept = min(count, self.size)
+                index = np.arange(count - kept, count) % self.size
+                rows.extend(zip(
+                    self.stamps[stage][index], [stage] * kept,
+                    self.seconds[stage][index]
+                ))
+        rows.sort(key=lambda row: row[0])
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["time", "stage", "seconds"])
+            writer.writerows(
+                (repr(float(t)), stage, repr(float(s)))
+                for t, stage, s in rows
+            )
+
+    def clear(self):
+        """drop every timing"""
+        with self.lock:
+            for stage in self.counts:
+                self.counts[stage] = 0
+
+
+class ProfilerPanel(tk.LabelFrame):
+    """panel showing the rolling p50 and p95 of every profiled stage"""
+    def __init__(self, master, profiler):
+        """init the table of stages and the dump button
+
+        Args:
+            master (tk.Window): master window
+            profiler (StageProfiler): timings shown
+        """
+        super().__init__(master, text="Profiler")
+        self.profiler = profiler
+        ttk.Label(self, text="p50 / p95 [ms]").grid(row=0, column=0)
+        self.labels = {}
+        for i, stage in enumerate(self.profiler.counts):
+            ttk.Label(self, text=stage).grid(row=0, column=2 * i + 1)
+            self.labels[stage] = ttk.Label(self, text="-", width=14)
+            self.labels[stage].grid(row=0, column=2 * i + 2)
+        self.dump_button = tk.Button(self, text="Dump", command=self.dump)
+        self.dump_button.grid(row=0, column=2 * len(self.labels) + 1)
+        self.refresh()
+
+    def refresh(self):
+        """show the current percentiles, again every refresh interval"""
+        for stage, label in self.labels.items():
+            p50, p95 = self.profiler.percentiles(stage) * 1e3
+            label.config(
+                text="-" if np.isnan(p50) else f"{p50:.1f} / {p95:.1f}"
+            )
+        self.after(REFRESH_INTERVAL, self.refresh)
+
+    def dump(self):
+        """save the kept timings in a csv file"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV File", "*.csv")]
+        )
+        if file_path:
+            self.profiler.dump(file_path)
@@ -2,10 +2,12 @@ import tkinter as tk
 from .frame_above_sample import AboveSampleFrame
 from .frame_below_sample import BelowSampleFrame
 from .frame_results import ResultsFrame
-from .frame_diagram import DiagramFrame, CA_DIAMETER
-from .common import AsyncHandler
+from .frame_diagram import DiagramFrame
+from .common import FrameScheduler
+from .profiler import ProfilerPanel, StageProfiler
 from nanomi_optics.engine.lens_excitation import ur_symmetric, ur_asymmetric
 from nanomi_optics.engine.save_results import save_csv
+from nanomi_optics.engine.layout import CA_DIAMETER
 
 PAD_X = 20
 PAD_Y = 20
@@ -13,8 +15,13 @@ PAD_Y = 20
 
 class MainWindow(tk.Tk):
     """main window for nanomi optics"""
-    def __init__(self):
-        """initialize window and setup widgets"""
+    def __init__(self, profile=False):
+        """initialize window and setup widgets
+
+        Args:
+            profile (bool): time the stages of the diagram updates and
+                show them in a panel
+        """
         super().__init__()
         # set title of window
         self.title('Nanomi Optics')
@@ -26,7 +33,8 @@ class MainWindow(tk.Tk):
         self.columnconfigure(1, weight=1)
 
         # Diagram
-        self.diagram = DiagramFrame(self)
+        self.profiler = StageProfiler(enabled=profile)
+        self.diagram = DiagramFrame(self, self.profiler)
         self.diagram.grid(row=1, column=0, sticky="nwse", columnspan=2)
         self.rowconfigure(1, weight=4)
 
@@ -44,12 +52,19 @@ class MainWindow(tk.Tk):
         settings_frame.columnconfigure(0, weight=1)
         settings_frame.columnconfigure(1, weight=1)
 
+        # the optics are computed off the Tk thread and drawn on it
+        self.upper_scheduler = FrameScheduler(
+            self, self.diagram.compute_u_rays, self.render_u
+        )
+        self.lower_scheduler = FrameScheduler(
+            self, self.compute_l, self.render_l
+        )
+
         # Upper Settings
-        async_hand_c = AsyncHandler(self.update_cf_u)
         self.upper_menu = AboveSampleFrame(settings_frame)
         self.upper_menu.grid(row=0, column=0, sticky="nwse")
         for i in range(len(self.upper_menu.links)):
-            self.upper_menu.links[i].set_command(async_hand_c)
+            self.upper_menu.links[i].set_command(self.update_cf_u)
             self.upper_menu.toggles[i].set_command(self.slider_status_u)
         self.upper_menu.mode_widget.option_var.trace(
             "w", lambda a, b, c: self.u_lens_mode()
@@ -57,12 +72,11 @@ class MainWindow(tk.Tk):
         self.mode = True
 
         # Lower Settings
-        async_hand_l = AsyncHandler(self.update_cf_l)
         self.lower_menu = BelowSampleFrame(settings_frame)
         self.lower_menu.grid(row=0, column=1, sticky="nwse")
-        self.lower_menu.distance_link.set_command(async_hand_l)
+        self.lower_menu.distance_link.set_command(self.update_cf_l)
         for i in range(len(self.lower_menu.sliders)):
-            self.lower_menu.links[i].set_command(async_hand_l)
+            self.lower_menu.links[i].set_command(self.update_cf_l)
             self.lower_menu.buttons[i].set_command(self.slider_status_l)
         self.lower_menu.opt_sel.trace(
             "w", lambda a, b, c: self.optimization_mode()
@@ -78,6 +92,11 @@ class MainWindow(tk.Tk):
         self.reset.grid(row=3, column=0, sticky="nwse")
         self.save = tk.Button(self, text="Save", command=self.save_results)
         self.save.grid(row=3, column=1, sticky="nwse")
+        if profile:
+            self.profiler_panel = ProfilerPanel(self, self.profiler)
+            self.profiler_panel.grid(
+                row=4, column=0, sticky="we", columnspan=2
+            )
         self.mag_u = self.diagram.mag_upper.copy()
         self.mag_l = self.diagram.mag_lower.copy()
 
@@ -86,16 +105,31 @@ class MainWindow(tk.Tk):
         self.diagram.cf_u = [
             float(i.get()) for i in self.upper_menu.links
         ]
-        self.diagram.update_u_lenses()
-        self.update_results()
+        self.request_u()
 
     def slider_status_u(self, value):
         """turns slider on and off based on toggle status + name"""
         self.diagram.active_lu = [
             i.get_status() for i in self.upper_menu.toggles
         ]
-        self.diagram.update_u_lenses()
-        self.update_results()
+        self.request_u()
+
+    def request_u(self):
+        """computes the upper lenses with the current settings"""
+        self.upper_scheduler(
+            list(self.diagram.cf_u), list(self.diagram.active_lu)
+        )
+
+    def render_u(self, result):
+        """draws the computed upper lenses
+
+        Args:
+            result (OperatingPoint): ray paths of the upper lenses
+        """
+        with self.profiler.time("update"):
+            self.diagram.show_u_rays(result)
+            self.diagram.redraw()
+            self.update_results()
 
     def update_cf_l(self, value):
         """update lower focal lenses"""
@@ -104,23 +138,52 @@ class MainWindow(tk.Tk):
         self.diagram.cf_l = [
             float(i.get()) for i in self.lower_menu.links
         ]
-
-        self.diagram.update_l_lenses(
-            self.current_lens != -1, self.current_opt, self.current_lens
-        )
-        self.set_slider_opt()
-        self.update_results()
+        self.request_l()
 
     def slider_status_l(self, value):
         """get status for on/off lower lenses"""
         self.diagram.active_ll = [
             b.get_status() for b in self.lower_menu.buttons
         ]
-        self.diagram.update_l_lenses(
-            self.current_lens != -1, self.current_opt, self.current_lens
+        self.request_l()
+
+    def request_l(self):
+        """computes the lower lenses with the current settings"""
+        self.lower_scheduler(
+            list(self.diagram.cf_l), list(self.diagram.active_ll),
+            self.diagram.distance_from_optical, self.current_opt,
+            self.current_lens
+        )
+
+    def compute_l(self, focal_lengths, active, distance, opt_sel, lens_sel):
+        """optimizes and traces the lower lenses on the worker thread
+
+        Returns:
+            lens_sel (int): lens index optimized, -1 for none
+            point (OperatingPoint): ray paths of the lower lenses
+        """
+        return lens_sel, self.diagram.compute_l_rays(
+            focal_lengths, active, distance, opt_sel, lens_sel
         )
-        self.set_slider_opt()
-        self.update_results()
+
+    def render_l(self, result):
+        """draws the computed lower lenses
+
+        The optimized lens is the one of the request, the selection may
+        have changed while it was computed.
+
+        Args:
+            result (tuple): lens index optimized and the ray paths of the
+                lower lenses, from compute_l
+        """
+        lens_sel, point = result
+        with self.profiler.time("update"):
+            if lens_sel != -1:
+                self.diagram.cf_l[lens_sel] = point.focal_lengths[lens_sel]
+            self.diagram.show_l_rays(point)
+            self.diagram.redraw()
+            self.set_slider_opt(lens_sel)
+            self.update_results()
 
     def optimization_mode(self):
         """set up optimization mode and lens index"""
@@ -131,15 +194,14 @@ class MainWindow(tk.Tk):
 
         if self.current_lens != -1:
             self.disable_lens_widgets(self.current_lens, True)
-            self.diagram.update_l_lenses(
-                True, self.current_opt, self.current_lens
-            )
-            self.set_slider_opt()
-            self.update_results()
+            self.request_l()
 
-    def set_slider_opt(self):
-        """enable/disable sliders for optimization"""
-        index = self.current_lens
+    def set_slider_opt(self, index):
+        """moves the slider of an optimized lens to its focal length
+
+        Args:
+            index (int): lens index optimized, -1 for none
+        """
         if index != -1:
             self.lower_menu.links[index].set(self.diagram.cf_l[index])
 
@@ -215,16 +277,12 @@ class MainWindow(tk.Tk):
             )
 
     def reset_settings(self):
-        """Reset the software to initial state"""
+        """Reset the software to initial state
+
+        Every widget reset requests an update from the schedulers, which
+        coalesce the requests and draw the final settings last.
+        """
         self.upper_menu.mode_widget.option_var.set("Cf")
-        temp_func_update_r = self.update_results
-        temp_diagram_l = self.diagram.display_l_rays
-        temp_diagram_u = self.diagram.display_u_rays
-        temp_u_mode = self.u_lens_mode
-        self.update_results = self.dummy_function
-        self.diagram.display_l_rays = self.dummy_function
-        self.diagram.display_u_rays = self.dummy_function
-        self.u_lens_mode = self.dummy_function
 
         for toggle in self.upper_menu.toggles:
             if not toggle.get_status():
@@ -242,12 +300,5 @@ class MainWindow(tk.Tk):
         for i, link in enumerate(self.lower_menu.links):
             link.set(self.lower_menu.slider_values[i + 1])
 
-        self.diagram.display_l_rays = temp_diagram_l
-        self.diagram.display_u_rays = temp_diagram_u
-        self.u_lens_mode = temp_u_mode
-        self.update_results = temp_func_update_r
         self.update_cf_l(None)
         self.update_cf_u(None)
-
-    def dummy_function(self):
-        pass
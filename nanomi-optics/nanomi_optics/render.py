@@ -0,0 +1,131 @@
+"""
+Headless rendering of column diagrams for reports.
+Reads configurations like the batch command and writes the diagram of
+every configuration as PNG or SVG files on the Agg backend, without
+importing tkinter. matplotlib is only imported to render.
+"""
+
+import os
+from .batch import (
+    read_configurations, configuration_rows, evaluate_configurations
+)
+from .engine.parallel import map_chunks
+from .engine.layout import LENS_NAMES
+
+# configurations rendered at once by a worker
+CHUNK_SIZE = 25
+
+# image formats written by default
+FORMATS = ("png",)
+
+# image formats the Agg canvas can write
+SUPPORTED_FORMATS = ("png", "svg")
+
+# diagram of the worker process, its static artwork is drawn once
+DIAGRAM = None
+
+
+def worker_diagram():
+    """diagram of this process, created on the first call"""
+    global DIAGRAM
+    if DIAGRAM is None:
+        # matplotlib is only imported by the processes that render
+        from .gui.artwork import HeadlessDiagram
+        DIAGRAM = HeadlessDiagram()
+    return DIAGRAM
+
+
+def diagram_paths(folder, row, formats):
+    """files of the diagram of a configuration"""
+    return [os.path.join(folder, f"diagram_{row:05d}.{fmt}")
+            for fmt in formats]
+
+
+def render_chunk(configurations, start, folder, formats=FORMATS):
+    """optimize, trace and render a chunk of configurations
+
+    Args:
+        configurations (dict): columns of the rows of the chunk
+        start (int): row index of the first configuration, numbering
+            the files
+        folder (str): folder of the files
+        formats (tuple): extensions of the files of every diagram
+
+    Returns:
+        (list): files written, in the order of the configurations
+    """
+    results = evaluate_configurations(configurations)
+    diagram = worker_diagram()
+    paths = []
+    for i in range(len(results["distance"])):
+        diagram.show(
+            [results[f"f_{name}"][i] for name in LENS_NAMES],
+            [results[f"active_{name}"][i] for name in LENS_NAMES],
+            results["distance"][i]
+        )
+        for path in diagram_paths(folder, start + i, formats):
+            diagram.save(path)
+            paths.append(path)
+    return paths
+
+
+def render_diagrams(
+    configurations, folder, formats=FORMATS, processes=None,
+    chunk_size=CHUNK_SIZE
+):
+    """render the diagram of every configuration across a process pool
+
+    Args:
+        configurations (dict): columns from read_configurations
+        folder (str): folder of the files, created if missing
+        formats (tuple): extensions of the files of every diagram
+        processes (int): worker processes of map_chunks
+        chunk_size (int): configurations rendered at once
+
+    Returns:
+        (list): files written, in the order of the configurations
+    """
+    unknown = set(formats) - set(SUPPORTED_FORMATS)
+    if unknown:
+        raise ValueError(f"unsupported formats: {', '.join(sorted(unknown))}")
+    os.makedirs(folder, exist_ok=True)
+    size = len(configurations["distance"])
+    starts = list(range(0, size, chunk_size))
+    stops = [min(start + chunk_size, size) for start in starts]
+    # every worker is only sent the rows of its own chunk
+    arguments = [
+        (configuration_rows(configurations, start, stop), start, folder,
+         formats)
+        for start, stop in zip(starts, stops)
+    ]
+    chunks = map_chunks(render_chunk, arguments, processes)
+    return [path for chunk in chunks for path in chunk]
+
+
+def add_arguments(parser):
+    """add the render command line arguments to a parser"""
+    parser.add_argument("input", help="CSV or NPZ file of configurations")
+    parser.add_argument("folder", help="folder for the diagram files")
+    parser.add_argument(
+        "--format", nargs="+", default=list(FORMATS),
+        choices=SUPPORTED_FORMATS, dest="formats",
+        help="file formats of every diagram"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="worker processes, one per core by default"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE,
+        help="configurations rendered at once by a worker"
+    )
+
+
+def main(args):
+    """run the render command with parsed command line arguments"""
+    configurations = read_configurations(args.input)
+    paths = render_diagrams(
+        configurations, args.folder, tuple(args.formats), args.processes,
+        args.chunk_size
+    )
+    print(f"{len(paths)} diagrams written to {os.path.abspath(args.folder)}")
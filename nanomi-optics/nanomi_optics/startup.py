@@ -0,0 +1,103 @@
+"""
+Import-time profiling of the application start.
+Every measurement runs in a fresh interpreter so nothing is cached.
+"""
+
+import subprocess
+import sys
+
+# module of the main window
+GUI_MODULE = "nanomi_optics.gui.window_main"
+
+# modules imported before the main window is shown, the command line
+# entry point first
+STARTUP_MODULES = ("nanomi_optics.__main__", GUI_MODULE)
+
+# seconds allowed to import the GUI and its entry point in a fresh
+# interpreter
+STARTUP_BUDGET = 2.0
+
+
+def import_statement(modules):
+    """statement importing a module name or a sequence of them"""
+    if isinstance(modules, str):
+        modules = (modules,)
+    return f"import {', '.join(modules)}"
+
+
+def import_times(modules=STARTUP_MODULES):
+    """import modules with -X importtime in a fresh interpreter
+
+    Args:
+        modules (tuple): names of the modules to import, or one name
+
+    Returns:
+        (list): (self seconds, cumulative seconds, module name) of every
+            module loaded, slowest cumulative first
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", import_statement(modules)],
+        capture_output=True, text=True, check=True
+    )
+    times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(own) * 1e-6, int(cumulative) * 1e-6, name.strip()))
+    return sorted(times, key=lambda time: -time[1])
+
+
+def cold_start(modules=STARTUP_MODULES, repeat=3):
+    """time importing modules in a fresh interpreter
+
+    Args:
+        modules (tuple): names of the modules to import, or one name
+        repeat (int): interpreters started, the fastest is kept
+
+    Returns:
+        seconds (float): fastest import time
+        modules (set): names of all modules loaded by the import
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{import_statement(modules)}\n"
+        "print(time.perf_counter() - start)\n"
+        "print(' '.join(sys.modules))\n"
+    )
+    seconds = []
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True,
+            check=True
+        )
+        elapsed, modules = process.stdout.splitlines()
+        seconds.append(float(elapsed))
+    return min(seconds), set(modules.split())
+
+
+def add_arguments(parser):
+    """add the startup command line arguments to a parser"""
+    parser.add_argument(
+        "--module", nargs="+", default=list(STARTUP_MODULES),
+        dest="modules", help="modules to import"
+    )
+    parser.add_argument(
+        "--top", type=int, default=15, help="number of imports listed"
+    )
+    parser.add_argument(
+        "--budget", type=float, default=STARTUP_BUDGET,
+        help="seconds allowed before the start counts as a regression"
+    )
+
+
+def main(args):
+    """list the slowest imports and check the start against the budget"""
+    print(f"{'self [s]':>10} {'total [s]':>10}  module")
+    for own, cumulative, name in import_times(args.modules)[:args.top]:
+        print(f"{own:10.3f} {cumulative:10.3f}  {name}")
+    seconds, _ = cold_start(args.modules)
+    print(f"cold start {seconds:.3f} s, budget {args.budget:.3f} s")
+    if seconds > args.budget:
+        sys.exit(1)
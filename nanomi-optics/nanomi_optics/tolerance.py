@@ -0,0 +1,97 @@
+"""
+Tolerance analysis of the lower column without the GUI.
+Reads the error distributions from a JSON file and prints the
+sensitivities and the yield, optionally writing every perturbed column.
+"""
+
+import json
+import os
+import numpy as np
+from .batch import write_results
+from .engine.tolerance import (
+    CHUNK_SIZE, DISTRIBUTIONS, Tolerance, tolerance_analysis
+)
+
+
+def read_tolerances(path):
+    """read error distributions and the specification from a JSON file
+
+    The file holds "parameters", a mapping of parameter name ("z_<lens>",
+    "f_<lens>" or "tilt_<lens>") to {"distribution": "normal" or
+    "uniform", "scale": ..., "relative": true/false}, and optionally
+    "samples", "seed", "magnification_tolerance" and "defocus_tolerance".
+
+    Args:
+        path (str): JSON file
+
+    Returns:
+        tolerances (dict): parameter name to Tolerance
+        options (dict): keyword arguments of tolerance_analysis
+    """
+    with open(path, "r") as file:
+        config = json.load(file)
+    tolerances = {}
+    for name, value in config.get("parameters", {}).items():
+        tolerance = Tolerance(**value)
+        if tolerance.distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"unknown distribution of {name}: {tolerance.distribution}"
+            )
+        tolerances[name] = tolerance
+    options = {}
+    for key, option in (
+        ("samples", "num_samples"), ("seed", "seed"),
+        ("magnification_tolerance", "magnification_tolerance"),
+        ("defocus_tolerance", "defocus_tolerance")
+    ):
+        if key in config:
+            options[option] = config[key]
+    return tolerances, options
+
+
+def add_arguments(parser):
+    """add the tolerance command line arguments to a parser"""
+    parser.add_argument("config", help="JSON file of error distributions")
+    parser.add_argument(
+        "--output", default=None,
+        help="CSV or NPZ file for every perturbed column"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="worker processes, one per core by default"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE,
+        help="perturbed columns traced at once by a worker"
+    )
+
+
+def main(args):
+    """run the tolerance command with parsed command line arguments"""
+    tolerances, options = read_tolerances(args.config)
+    result = tolerance_analysis(
+        tolerances, chunk_size=args.chunk_size, processes=args.processes,
+        **options
+    )
+    quantities = ("magnification", "defocus", "astigmatism")
+    print(f"{len(result.magnification)} perturbed columns")
+    print(f"{'':<24}" + "".join(f"{key:>16}" for key in quantities))
+    print(f"{'nominal':<24}" + "".join(
+        f"{result.nominal[key]:>16.6g}" for key in quantities
+    ))
+    print(f"{'spread (std)':<24}" + "".join(
+        f"{np.std(getattr(result, key)):>16.6g}" for key in quantities
+    ))
+    for j, name in enumerate(result.parameters):
+        print(f"{'d/d ' + name:<24}" + "".join(
+            f"{result.sensitivities[key][j]:>16.6g}" for key in quantities
+        ))
+    if result.yield_fraction is not None:
+        print(f"yield {result.yield_fraction:.2%}")
+
+    if args.output is not None:
+        results = {key: getattr(result, key) for key in quantities}
+        for j, name in enumerate(result.parameters):
+            results[f"d{name}"] = result.perturbations[:, j]
+        write_results(results, args.output)
+        print(f"perturbed columns written to {os.path.abspath(args.output)}")
@@ -0,0 +1,120 @@
+import subprocess
+import sys
+import numpy as np
+import pytest
+from nanomi_optics.__main__ import main
+from nanomi_optics.batch import (
+    evaluate_configurations, read_configurations, run_batch
+)
+from nanomi_optics.engine.ray_transfer import trace_column
+from nanomi_optics.engine.optimization import optimize_focal_length
+
+UPPER = [257.03, 349, 517]
+LOWER = [551.6, 706.4, 826.9]
+
+CSV = """f_C1,f_C2,active_C2,f_Objective,active_Intermediate,distance,\
+optimize_lens,optimize_mode
+67.29,22.94,1,19.67,1,10,,Image
+30,50,0,19.67,0,20,Projective,Diffraction
+100,22.94,true,15,off,5,0,Image
+"""
+
+
+def test_batch_csv_to_npz(tmp_path):
+    (tmp_path / "input.csv").write_text(CSV)
+    output = str(tmp_path / "output.npz")
+    main(["batch", str(tmp_path / "input.csv"), output])
+    results = np.load(output)
+    assert results["magnification"].shape == (3,)
+    assert results["upper_ray_heights"].shape == (3, 4, 4)
+    np.testing.assert_array_equal(
+        results["active_C2"], [True, False, True]
+    )
+
+    # second row: C2 off, projective optimized for diffraction
+    upper = trace_column(
+        [[1.5e-2, 0]], [UPPER[0], UPPER[2]], [30, 39.88], 0, 528.9
+    )
+    np.testing.assert_allclose(
+        results["upper_ray_heights"][1, 2, [0, 2, 3]],
+        [upper.lens_heights[0, 0], upper.lens_heights[0, 1],
+         upper.screen_heights[0]]
+    )
+    assert np.isnan(results["upper_ray_heights"][1, 2, 1])
+    assert results["mag_C2"][1] == 0
+
+    distance = 20e-6
+    angle = 0.0112e-6 / distance
+    rays = np.array([[0, angle], [distance, angle]])
+    cf = [19.67, 6.498, 6]
+    active = [True, False, True]
+    cf[2] = optimize_focal_length("Diffraction", 2, LOWER, cf, rays, active)
+    np.testing.assert_allclose(results["f_Projective"][1], cf[2])
+    lower = trace_column(
+        [rays[1]], [LOWER[0], LOWER[2]], [cf[0], cf[2]], 528.9, 972.7
+    )
+    np.testing.assert_allclose(
+        results["magnification"][1], abs(lower.screen_heights[0] / distance)
+    )
+    np.testing.assert_allclose(
+        results["lower_output_planes"][1, [0, 2]],
+        lower.output_plane_locations
+    )
+
+
+def test_batch_chunks_and_csv(tmp_path):
+    configurations = {
+        "f_C1": np.linspace(6, 300, 25),
+        "active_Objective": np.arange(25) % 2,
+        "distance": np.linspace(1, 50, 25)
+    }
+    np.savez(tmp_path / "input.npz", **configurations)
+    configurations = read_configurations(str(tmp_path / "input.npz"))
+    single = run_batch(configurations, processes=1)
+    pooled = run_batch(configurations, processes=2, chunk_size=7)
+    for key in single:
+        np.testing.assert_allclose(pooled[key], single[key])
+
+    output = str(tmp_path / "output.csv")
+    main(["batch", str(tmp_path / "input.npz"), output])
+    table = np.genfromtxt(output, delimiter=",", names=True)
+    assert len(table) == 25
+    np.testing.assert_allclose(table["magnification"], single["magnification"])
+    np.testing.assert_allclose(
+        table["lower_ray_heights_2_3"], single["lower_ray_heights"][:, 2, 3]
+    )
+
+
+def test_batch_is_headless():
+    code = (
+        "import sys, nanomi_optics.__main__; "
+        "print('tkinter' in sys.modules, 'matplotlib' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True,
+        check=True
+    ).stdout
+    assert output.split() == ["False", "False"]
+
+
+def test_batch_output_extensions(tmp_path):
+    (tmp_path / "input.csv").write_text(CSV)
+    for name in ("output.txt", "OUTPUT.CSV"):
+        main(["batch", str(tmp_path / "input.csv"), str(tmp_path / name)])
+        table = np.genfromtxt(tmp_path / name, delimiter=",", names=True)
+        assert len(table) == 3
+    main(["batch", str(tmp_path / "input.csv"), str(tmp_path / "OUT.NPZ")])
+    with np.load(tmp_path / "OUT.NPZ") as results:
+        assert results["magnification"].shape == (3,)
+
+
+def test_batch_lens_range(tmp_path):
+    (tmp_path / "input.csv").write_text(CSV.replace(",0,Image", ",3,Image"))
+    with pytest.raises(ValueError, match="configuration 2: optimize_lens 3"):
+        read_configurations(str(tmp_path / "input.csv"))
+    # a negative index would silently optimize an upper lens
+    (tmp_path / "input.csv").write_text(CSV)
+    configurations = read_configurations(str(tmp_path / "input.csv"))
+    configurations["optimize_lens"][1] = -2
+    with pytest.raises(ValueError, match="configuration 1: optimize_lens -2"):
+        evaluate_configurations(configurations)
@@ -0,0 +1,69 @@
+import gc
+import json
+import pytest
+import tempfile
+from nanomi_optics.__main__ import main
+from nanomi_optics.benchmark import (
+    BENCHMARKS, compare, results_npz, run_benchmarks
+)
+
+
+def run(**best):
+    return {"benchmarks": {
+        name: {"best": seconds, "median": seconds, "number": 1}
+        for name, seconds in best.items()
+    }}
+
+
+def test_run_benchmarks():
+    result = run_benchmarks(["single_ray", "optimize_image"], repeat=1)
+    assert set(result["benchmarks"]) == {"single_ray", "optimize_image"}
+    assert all(
+        value["best"] > 0 for value in result["benchmarks"].values()
+    )
+    # every benchmark can be set up
+    assert all(callable(setup()) for setup in BENCHMARKS.values())
+
+
+def test_compare_flags_regressions(tmp_path, capsys):
+    baseline = run(single_ray=1.0, save_csv=2.0, upper_rays=1.0)
+    current = run(single_ray=1.1, save_csv=3.0, lower_rays=1.0)
+    rows = compare(baseline, current, threshold=0.2)
+    assert [(row[0], row[-1]) for row in rows] == [
+        ("single_ray", False), ("save_csv", True)
+    ]
+
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+    (tmp_path / "current.json").write_text(json.dumps(current))
+    arguments = [
+        "bench", "--compare", "--baseline", str(tmp_path / "baseline.json"),
+        "--current", str(tmp_path / "current.json")
+    ]
+    with pytest.raises(SystemExit):
+        main(arguments)
+    assert "REGRESSION" in capsys.readouterr().out
+    main(arguments + ["--threshold", "0.6"])
+
+
+def test_baseline_is_merged(tmp_path):
+    baseline = str(tmp_path / "baseline.json")
+    for best in (run(single_ray=1.0, save_csv=2.0), run(single_ray=0.5)):
+        (tmp_path / "current.json").write_text(json.dumps(best))
+        main([
+            "bench", "--baseline", baseline,
+            "--current", str(tmp_path / "current.json")
+        ])
+    with open(baseline) as file:
+        benchmarks = json.load(file)["benchmarks"]
+    assert {name: value["best"] for name, value in benchmarks.items()} \
+        == {"single_ray": 0.5, "save_csv": 2.0}
+
+
+def test_temporary_files_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    write = results_npz()
+    write()
+    assert len(list(tmp_path.glob("*/results.npz"))) == 1
+    del write
+    gc.collect()
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from nanomi_optics.engine.calibration import (
+    ASYMMETRIC, CalibrationTable, calibration_tables, fit_calibration,
+    fit_power_law, power_law_table, read_measurements
+)
+from nanomi_optics.engine.chromatic import chromatic_ensemble
+from nanomi_optics.engine.lens_excitation import (
+    ur_symmetric, ur_asymmetric, cf_symmetric, cf_asymmetric
+)
+
+
+def test_tables_match_power_laws():
+    rng = np.random.default_rng(0)
+    focal_lengths = rng.uniform(6, 300, 1000)
+    excitations = rng.uniform(0.25, 1.04, 1000)
+    for symmetric, ur, cf in (
+        (True, ur_symmetric, cf_symmetric),
+        (False, ur_asymmetric, cf_asymmetric)
+    ):
+        table = power_law_table(symmetric)
+        np.testing.assert_allclose(
+            table.excitation(focal_lengths), ur(focal_lengths), rtol=1e-8
+        )
+        np.testing.assert_allclose(
+            table.focal_length(excitations), cf(excitations), rtol=1e-8
+        )
+        assert table.errors["round_trip"] < 1e-8
+        assert table.errors["model"] < 1e-8
+    # arrays of any shape, nan outside the table
+    table = power_law_table(True)
+    assert table.excitation([[6.0, 30.0]]).shape == (1, 2)
+    assert np.isnan(table.focal_length([0.01, 2.0])).all()
+    assert np.isnan(table.excitation(-1.0))
+    np.testing.assert_allclose(
+        table.excitation(table.focal_lengths[[0, -1]]),
+        table.excitations[[0, -1]]
+    )
+
+
+def test_fit_measurements():
+    rng = np.random.default_rng(1)
+    excitations = np.sort(rng.uniform(0.2, 1.1, 40))
+    noisy = cf_asymmetric(excitations) * (1 + rng.normal(0, 2e-2, 40))
+    law = fit_power_law(excitations, noisy, ASYMMETRIC)
+    np.testing.assert_allclose(law, ASYMMETRIC, rtol=0.1)
+    with pytest.raises(ValueError):
+        fit_calibration(excitations, noisy)
+    table = fit_calibration(excitations, noisy, model="power_law")
+    assert table.errors["measured"] < 0.1
+    assert table.excitations[0] == excitations[0]
+
+    # monotone interpolation passes through every measurement
+    measured = cf_asymmetric(excitations[::4])
+    table = fit_calibration(excitations[::4], measured)
+    np.testing.assert_allclose(
+        table.focal_length(excitations[::4]), measured, rtol=1e-6
+    )
+    between = np.linspace(excitations[0], excitations[-4], 500)
+    assert np.all(np.diff(table.focal_length(between)) < 0)
+
+
+def test_save_load_and_measurement_file(tmp_path):
+    excitations = np.linspace(0.3, 1.0, 6)
+    path = tmp_path / "measurements.csv"
+    path.write_text("lens,excitation,focal_length\n" + "".join(
+        f"Objective,{u},{f}\n"
+        for u, f in zip(excitations, cf_asymmetric(excitations))
+    ))
+    measurements = read_measurements(str(path))
+    tables = calibration_tables(measurements)
+    assert tables["C1"] is power_law_table(True)
+    assert tables["Objective"].measured.shape == (6, 2)
+
+    tables["Objective"].save(str(tmp_path / "objective.npz"))
+    table = CalibrationTable.load(str(tmp_path / "objective.npz"))
+    assert table.errors == tables["Objective"].errors
+    np.testing.assert_array_equal(
+        table.excitation([10.0, 20.0]),
+        tables["Objective"].excitation([10.0, 20.0])
+    )
+
+
+def test_chromatic_with_tables():
+    ripple = np.linspace(-3, 3, 7)
+    np.testing.assert_allclose(
+        chromatic_ensemble(ripple, tables=calibration_tables()).magnification,
+        chromatic_ensemble(ripple).magnification, rtol=1e-7
+    )
+    # a measured objective only calibrated close to its setting
+    excitation = ur_asymmetric(19.67)
+    excitations = excitation * np.array([0.9999, 1.0, 1.0001])
+    tables = calibration_tables(
+        {"Objective": (excitations, cf_asymmetric(excitations))}
+    )
+    with pytest.raises(ValueError):
+        chromatic_ensemble([0.0, 100.0], tables=tables)
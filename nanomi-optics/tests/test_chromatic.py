@@ -0,0 +1,52 @@
+import numpy as np
+from nanomi_optics.engine.chromatic import (
+    chromatic_ensemble, chromatic_focal_lengths
+)
+from nanomi_optics.engine.column import lower_column
+from nanomi_optics.engine.ray_transfer import trace_column
+
+LOWER = [551.6, 706.4, 826.9]
+
+
+def test_chromatic_focal_lengths():
+    symmetric = [True, False]
+    chromatic = chromatic_focal_lengths([67.29, 22.94], symmetric, [0, 5])
+    np.testing.assert_allclose(chromatic[0], [67.29, 22.94], rtol=1e-13)
+    # faster electrons are focused less
+    assert np.all(chromatic[1] > chromatic[0])
+
+
+def test_ensemble_matches_trace():
+    ripple = np.array([[-2.0, 0.0], [0.5, 3.0]])
+    result = chromatic_ensemble(ripple)
+    assert result.image_shift.shape == (2, 2)
+    # only the rounding of the excitation round trip at the beam energy
+    assert abs(result.image_shift[0, 1]) < 1e-9
+    assert abs(result.magnification_change[0, 1]) < 1e-12
+
+    trace = trace_column(
+        [[1, 0]], LOWER, result.focal_lengths.reshape(-1, 3), 528.9, 972.7
+    )
+    np.testing.assert_allclose(
+        result.magnification.ravel(), trace.screen_heights[:, 0]
+    )
+    np.testing.assert_allclose(
+        result.image_locations.ravel(), trace.output_plane_locations[:, -1]
+    )
+
+    # absolute energies give the same ensemble
+    energies = chromatic_ensemble(beam_energies=11.85e3 + ripple)
+    np.testing.assert_allclose(energies.image_shift, result.image_shift)
+
+
+def test_inactive_lenses():
+    column = lower_column()
+    column.set_active([True, False, False])
+    result = chromatic_ensemble([0, 1], column=column)
+    # a weaker objective images further down
+    assert result.image_shift[1] > 0
+    np.testing.assert_allclose(
+        result.image_locations[0],
+        trace_column([[1, 0]], LOWER[:1], [19.67], 528.9, 972.7)
+        .output_plane_locations[0]
+    )
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from nanomi_optics.engine.column import (
+    TWO_STEP, THREE_STEP, lower_column, upper_column
+)
+from nanomi_optics.engine.ray_transfer import trace_column
+from nanomi_optics.engine.system_matrix import system_matrix
+
+RAYS = np.array([[0, 1.12e-3], [1e-5, 1.12e-3], [1e-5, 0]])
+
+
+def test_element_views():
+    column = lower_column()
+    projective = column["Projective"]
+    assert projective.index == 2 and column[-1].index == 2
+    assert projective.type == TWO_STEP and column[0].type == THREE_STEP
+    assert not hasattr(projective, "__dict__")
+
+    # a view writes through to the column arrays
+    projective.focal_length = 12.5
+    projective.active = False
+    assert column.focal_lengths[2] == 12.5
+    assert list(column.active_index()) == [0, 1]
+    assert projective.crossover_location() == column.locations[2] + 12.5
+    assert [element.name for element in column] == list(column.names)
+    with pytest.raises(IndexError):
+        column[3]
+    assert upper_column()["C1"].symmetric
+
+
+def test_trace_active_elements():
+    column = lower_column()
+    for active, focal_lengths in [
+        ([True, True, True], [19.67, 6.498, 6]),
+        ([True, False, True], [10, 6.498, 20]),
+        ([True, True, True], [10, 6.498, 20])
+    ]:
+        column.set_active(active)
+        column.set_focal_lengths(focal_lengths)
+        index = column.active_index()
+        expected = trace_column(
+            RAYS, column.locations[index], column.focal_lengths[index],
+            528.9, 972.7
+        )
+        for actual, desired in zip(column.trace(RAYS), expected):
+            np.testing.assert_allclose(
+                actual, desired, rtol=1e-9, atol=1e-15
+            )
+        np.testing.assert_allclose(
+            column.system_matrix(), system_matrix(
+                column.locations[index], column.focal_lengths[index],
+                528.9, 972.7
+            )
+        )
+    # a cache per set of active lenses, kept when coming back to it
+    assert len(column.matrix_caches) == 2
@@ -0,0 +1,56 @@
+import numpy as np
+from nanomi_optics.engine.continuation import FocalLengthTracker
+from nanomi_optics.engine.optimization import (
+    optimize_focal_length, solve_focal_length
+)
+
+OPTICAL_DISTANCE = 0.00001
+SCATTERING_ANGLE = 0.0112e-6 / OPTICAL_DISTANCE
+RAYS = [
+    np.array([[0], [SCATTERING_ANGLE]]),
+    np.array([[OPTICAL_DISTANCE], [SCATTERING_ANGLE]])
+]
+LOCATION = [551.6, 706.4, 826.9]
+ACTIVE = [True, True, True]
+
+
+def test_tracker_follows_slider():
+    for mode in ["Image", "Diffraction"]:
+        tracker = FocalLengthTracker()
+        cf = [19.67, 6.498, 6]
+        cf[2] = tracker.solve(mode, 2, LOCATION, cf, RAYS, ACTIVE)
+        # drag the intermediate lens while the projective is optimized
+        for value in np.linspace(6.498, 40, 20):
+            cf[1] = value
+            cf[2] = tracker.solve(mode, 2, LOCATION, cf, RAYS, ACTIVE)
+            np.testing.assert_allclose(
+                cf[2],
+                solve_focal_length(mode, 2, LOCATION, cf, RAYS, ACTIVE),
+                rtol=1e-10
+            )
+            assert tracker.iterations <= 2
+        assert tracker.fallbacks == 0
+
+
+def test_tracker_restarts():
+    tracker = FocalLengthTracker()
+    cf = [19.67, 6.498, 6]
+    tracker.solve("Image", 2, LOCATION, cf, RAYS, ACTIVE)
+
+    # switching lens or active lenses does not reuse the last solution
+    active = [True, False, True]
+    cf[0] = tracker.solve("Image", 0, LOCATION, cf, RAYS, active)
+    assert tracker.key == ("Image", 0, (True, False, True))
+    np.testing.assert_allclose(
+        cf[0], solve_focal_length("Image", 0, LOCATION, cf, RAYS, active)
+    )
+
+    # no root inside the bounds, same answer as the numeric optimizer
+    cf = [300, 300, 300]
+    value = tracker.solve("Diffraction", 0, LOCATION, cf, RAYS, ACTIVE)
+    np.testing.assert_allclose(
+        value,
+        optimize_focal_length("Diffraction", 0, LOCATION, cf, RAYS, ACTIVE),
+        rtol=1e-6
+    )
+    assert tracker.fallbacks == 1
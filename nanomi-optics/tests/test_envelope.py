@@ -0,0 +1,77 @@
+import numpy as np
+from nanomi_optics.engine.envelope import (
+    Aperture, COLUMN_APERTURES, beam_envelope, envelope_chunk, sample_disk
+)
+
+LOCATIONS = [20, 45]
+FOCAL_LENGTHS = [12, -30]
+APERTURES = [
+    Aperture("plane", 10, 10, 0.6),
+    Aperture("bore", 15, 30, 0.8),
+    Aperture("exit", 40, 50, 0.5)
+]
+
+
+def test_envelope_matches_dense_trace():
+    z = np.arange(0, 60.5, 0.5)
+    seed = np.random.SeedSequence(3)
+    envelope, surviving, clipped = envelope_chunk(
+        seed, 5000, 0.2, 0.05, LOCATIONS, FOCAL_LENGTHS, APERTURES, z
+    )
+
+    # every aperture end and lens is on the grid, checking the rays at
+    # every grid point finds the same clipping
+    rng = np.random.default_rng(seed)
+    position = sample_disk(rng, 5000, 0.2)
+    angle = sample_disk(rng, 5000, 0.05)
+    alive = np.ones(5000, dtype=bool)
+    expected_clipped = np.zeros(3)
+    last = 0
+    for k, location in enumerate(z):
+        position = position + (location - last) * angle
+        last = location
+        radius = np.hypot(*position.T)
+        for index, aperture in enumerate(APERTURES):
+            if aperture.start <= location <= aperture.end:
+                hit = alive & (radius > aperture.radius)
+                expected_clipped[index] += np.count_nonzero(hit)
+                alive &= ~hit
+        np.testing.assert_allclose(
+            envelope[k], np.max(radius[alive] ** 2, initial=0), rtol=1e-12
+        )
+        assert surviving[k] == np.count_nonzero(alive)
+        for lens, focal_length in zip(LOCATIONS, FOCAL_LENGTHS):
+            if lens == location:
+                angle = angle - position / focal_length
+    np.testing.assert_array_equal(clipped, expected_clipped)
+
+
+def test_point_source_transmission():
+    # a point source filling a cone through a round plane aperture
+    result = beam_envelope(
+        200000, focal_lengths=[], active=[], locations=[],
+        apertures=[Aperture("plane", 100, 100, 0.02)], source_radius=0,
+        half_angle=0.001, end=150, chunk_size=30000, processes=2
+    )
+    np.testing.assert_allclose(result.transmission, 0.04, rtol=0.05)
+    assert result.clipped[0] == round(
+        (1 - result.transmission) * result.num_rays
+    )
+    # the envelope opens with the cone, then with the aperture edge
+    np.testing.assert_allclose(result.r_max[result.z == 50], 0.05, rtol=1e-3)
+    np.testing.assert_allclose(result.r_max[result.z == 150], 0.03, rtol=1e-2)
+    assert result.surviving[0] == 1
+
+
+def test_column_envelope():
+    result = beam_envelope(20000, processes=1)
+    assert len(result.clipped) == len(COLUMN_APERTURES)
+    assert 0 < result.transmission < 1
+    assert result.clipped.sum() == round(
+        (1 - result.transmission) * result.num_rays
+    )
+    # nothing above the bore survives inside it
+    for aperture in COLUMN_APERTURES:
+        inside = (result.z >= aperture.start) & (result.z <= aperture.end)
+        assert np.all(result.r_max[inside] <= aperture.radius)
+    assert np.all(np.diff(result.surviving) <= 0)
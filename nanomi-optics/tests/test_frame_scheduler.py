@@ -0,0 +1,80 @@
+import threading
+import time
+from nanomi_optics.gui.common import FrameScheduler
+
+
+class FakeWidget:
+    """stands in for the Tk loop, callbacks run when the test says so"""
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, interval, callback):
+        self.callbacks.append(callback)
+        return len(self.callbacks)
+
+    def run_frame(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def wait_idle(scheduler):
+    for _ in range(1000):
+        with scheduler.condition:
+            if not scheduler.busy and scheduler.request is None:
+                return
+        time.sleep(0.001)
+
+
+def test_latest_request_rendered_on_loop():
+    widget = FakeWidget()
+    release = threading.Event()
+    computed, rendered = [], []
+    main_thread = threading.get_ident()
+
+    def compute(value):
+        release.wait()
+        computed.append(value)
+        return value * 2
+
+    def render(result):
+        assert threading.get_ident() == main_thread
+        rendered.append(result)
+
+    scheduler = FrameScheduler(widget, compute, render)
+    scheduler(1)
+    while not scheduler.busy:
+        time.sleep(0.001)
+    # requests made while the worker is busy replace each other
+    for value in range(2, 10):
+        scheduler(value)
+    assert len(widget.callbacks) == 1
+    release.set()
+    wait_idle(scheduler)
+    widget.run_frame()
+
+    assert computed == [1, 9]
+    # only the latest result is drawn, once
+    assert rendered == [18]
+    assert widget.callbacks == [] and scheduler.after_id is None
+
+
+def test_failed_compute_is_not_rendered():
+    widget = FakeWidget()
+    rendered = []
+
+    def compute(value):
+        if value < 0:
+            raise ValueError(value)
+        return value
+
+    scheduler = FrameScheduler(widget, compute, rendered.append)
+    scheduler(-1)
+    wait_idle(scheduler)
+    widget.run_frame()
+    assert rendered == []
+
+    scheduler(3)
+    wait_idle(scheduler)
+    widget.run_frame()
+    assert rendered == [3]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from nanomi_optics.engine.inverse_design import (
+    COLUMN_LENS_LOCATIONS, Crossover, Magnification, ProbeSize,
+    design_focal_lengths, probe_diameter
+)
+from nanomi_optics.engine.system_matrix import (
+    system_matrix, system_matrix_derivatives
+)
+
+CF = [67.29, 22.94, 39.88, 19.67, 6.498, 6]
+ACTIVE = [True] * 6
+UPPER = COLUMN_LENS_LOCATIONS[:3]
+LOWER = COLUMN_LENS_LOCATIONS[3:]
+
+
+def test_matrix_derivatives():
+    cf = np.array(CF[3:])
+    matrix, derivatives = system_matrix_derivatives(LOWER, cf, 528.9, 972.7)
+    np.testing.assert_allclose(matrix, system_matrix(LOWER, cf, 528.9, 972.7))
+    for k in range(3):
+        step = np.zeros(3)
+        step[k] = 1e-6
+        difference = system_matrix(LOWER, cf + step, 528.9, 972.7) \
+            - system_matrix(LOWER, cf - step, 528.9, 972.7)
+        np.testing.assert_allclose(
+            difference / 2e-6, derivatives[k], rtol=1e-5, atol=1e-6
+        )
+
+
+def test_joint_design():
+    result = design_focal_lengths(
+        [Magnification(-1000), Crossover(528.9), ProbeSize(2e-3)],
+        CF, ACTIVE
+    )
+    assert result.success
+    assert result.iterations < 20
+    np.testing.assert_allclose(result.residuals, 0, atol=1e-9)
+
+    lower = system_matrix(LOWER, result.focal_lengths[3:], 528.9, 972.7)
+    np.testing.assert_allclose(lower[0], [-1000, 0], atol=1e-6)
+    upper = system_matrix(UPPER, result.focal_lengths[:3], 0, 528.9)
+    np.testing.assert_allclose(probe_diameter(upper), 2e-3)
+    assert np.all((result.focal_lengths >= 6) & (result.focal_lengths <= 300))
+
+
+def test_design_inactive_lenses():
+    active = [True, False, True, True, True, False]
+    result = design_focal_lengths([Magnification(200)], CF, active)
+    assert result.success
+    # inactive and untargeted lenses keep their focal length
+    np.testing.assert_allclose(result.focal_lengths[[0, 1, 2, 5]], [
+        CF[0], CF[1], CF[2], CF[5]
+    ])
+    lower = system_matrix(
+        LOWER[:2], result.focal_lengths[3:5], 528.9, 972.7
+    )
+    np.testing.assert_allclose(lower[0], [200, 0], atol=1e-6)
+
+    # the condensor aperature is above every lens
+    with pytest.raises(ValueError):
+        design_focal_lengths([Crossover(192.4)], CF, ACTIVE)
@@ -0,0 +1,56 @@
+import numpy as np
+from nanomi_optics.engine.layout import (
+    FOCAL_LENGTHS, SAMPLE_LOCATION, SCINTILLATOR_LOCATION,
+    LOWER_LENS_LOCATIONS
+)
+from nanomi_optics.engine.monte_carlo import (
+    Histogram, histogram_diameter, monte_carlo
+)
+
+# the objective alone images the sample on the scintillator
+OBJECTIVE_DISTANCES = (
+    LOWER_LENS_LOCATIONS[0] - SAMPLE_LOCATION,
+    SCINTILLATOR_LOCATION - LOWER_LENS_LOCATIONS[0]
+)
+FOCUSED = FOCAL_LENGTHS[:3] + [
+    np.prod(OBJECTIVE_DISTANCES) / np.sum(OBJECTIVE_DISTANCES), 6, 6
+]
+ACTIVE = [True, True, True, True, False, False]
+
+
+def test_blur_grows_with_energy_spread():
+    results = [
+        monte_carlo(
+            20000, spread, focal_lengths=FOCUSED, active=ACTIVE,
+            processes=1
+        )
+        for spread in (0, 1, 2)
+    ]
+    np.testing.assert_allclose(
+        results[0].magnification, -OBJECTIVE_DISTANCES[1]
+        / OBJECTIVE_DISTANCES[0]
+    )
+    assert results[0].image_blur.rms < 1e-12
+    # first order chromatic blur is proportional to the energy spread
+    np.testing.assert_allclose(
+        results[2].image_blur.rms, 2 * results[1].image_blur.rms, rtol=1e-3
+    )
+    for result in results:
+        for histogram in result[:3]:
+            assert histogram.counts.sum() + histogram.overflow == 20000
+
+
+def test_chunks_match_pool():
+    arguments = dict(num_samples=25000, bins=50, limits=[0.1, 200, 0.1])
+    single = monte_carlo(chunk_size=4000, processes=1, **arguments)
+    pooled = monte_carlo(chunk_size=4000, processes=2, **arguments)
+    for expected, histogram in zip(single[:3], pooled[:3]):
+        np.testing.assert_array_equal(histogram.counts, expected.counts)
+        np.testing.assert_allclose(histogram.rms, expected.rms)
+
+
+def test_histogram_diameter():
+    histogram = Histogram(np.linspace(0, 4, 5), np.array([1, 1, 1, 1]), 0, 0)
+    assert histogram_diameter(histogram) == 4
+    assert histogram_diameter(histogram, 0.25) == 2
+    assert histogram_diameter(histogram._replace(overflow=5)) == np.inf
@@ -0,0 +1,55 @@
+import numpy as np
+from nanomi_optics.engine.column import lower_column
+from nanomi_optics.engine.operating_point import (
+    OperatingPointCache, trace_operating_point
+)
+from nanomi_optics.engine.ray_transfer import trace_column
+
+RAYS = np.array([[0, 1.12e-3], [1e-5, 1.12e-3], [1e-5, 0]])
+
+
+def test_operating_point_lines():
+    column = lower_column()
+    point = trace_operating_point(column, RAYS)
+    trace = trace_column(
+        RAYS, column.locations, column.focal_lengths, 528.9, 972.7
+    )
+    np.testing.assert_allclose(point.magnifications, trace.magnifications)
+    np.testing.assert_allclose(
+        point.crossovers, column.locations + column.focal_lengths
+    )
+    path, lens_image, image = point.lines[1]
+    np.testing.assert_allclose(path[0], [528.9, *column.locations, 972.7])
+    np.testing.assert_allclose(path[1][1:-1], trace.lens_heights[1])
+    # the projective lens has no line from the lens to its image
+    assert len(lens_image[0]) == 2 * 3 and len(image[0]) == 3 * 3
+
+    column.set_active([False] * 3)
+    point = trace_operating_point(column, RAYS)
+    assert point.lines is None and point.magnifications == ()
+
+
+def test_cache_hits_and_bound():
+    computed = []
+    cache = OperatingPointCache(max_size=2)
+
+    def lookup(focal_lengths, *settings):
+        return cache.lookup(
+            lambda: computed.append(focal_lengths) or len(computed),
+            focal_lengths, [True, True], RAYS, *settings
+        )
+
+    assert lookup([10, 20]) == 1
+    # nearly equal focal lengths share a point
+    assert lookup([10 + 1e-12, 20]) == 1
+    assert lookup([10, 21]) == 2
+    assert lookup([10, 20], "Image", 1) == 3
+    assert (cache.hits, cache.misses) == (1, 3)
+    # [10, 20] without settings was the least recently used
+    assert len(cache) == 2
+    assert lookup([10, 20]) == 4
+    assert lookup([10, 20], "Image", 1) == 3
+    assert cache.hit_rate == 2 / 6
+
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == cache.misses == 0
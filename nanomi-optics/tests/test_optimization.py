@@ -1,6 +1,8 @@
 import numpy as np
 from nanomi_optics.engine.lens import Lens
-from nanomi_optics.engine.optimization import optimize_focal_length
+from nanomi_optics.engine.optimization import (
+    create_optimizable_funcion, optimize_focal_length, solve_focal_length
+)
 
 OPTICAL_DISTANCE = 0.00001
 LAMBDA_ELECTRON = 0.0112e-6
@@ -141,3 +143,36 @@ def test_ray_path():
     opt = ray_path(RAYS, lenses)
 
     assert abs(Y_POINTS_GREEN[2] - Y_POINTS_RED[2]) >= abs(opt)
+
+
+def test_solve_focal_length():
+    # the closed form root zeroes the optimized function
+    for mode in ["Image", "Diffraction"]:
+        for i in range(3):
+            cf = solve_focal_length(
+                mode, i, LOCATION, CF, RAYS, [True, True, True]
+            )
+            assert cf is not None
+            function = create_optimizable_funcion(
+                mode, i, LOCATION, CF, RAYS, [True, True, True]
+            )
+            assert abs(function([cf])) < 1e-12
+
+    # inactive lens cannot be solved
+    assert solve_focal_length(
+        "Image", 0, LOCATION, CF, RAYS, [False, True, True]
+    ) is None
+
+    # roots outside of the bounds fall back to the numeric optimizer
+    cf = solve_focal_length(
+        "Image", 2, LOCATION, CF, RAYS, [True, True, True], bounds=(6, 7)
+    )
+    assert cf is None
+    cf = [300, 300, 300]
+    assert solve_focal_length(
+        "Diffraction", 0, LOCATION, cf, RAYS, [True, True, True]
+    ) is None
+    cf[0] = optimize_focal_length(
+        "Diffraction", 0, LOCATION, cf, RAYS, [True, True, True]
+    )
+    np.testing.assert_allclose(cf[0], 300, rtol=1e-6)
@@ -0,0 +1,18 @@
+import operator
+from nanomi_optics.engine.parallel import chunk_sizes, map_chunks
+
+
+def test_chunk_sizes():
+    assert chunk_sizes(10, 4) == [4, 4, 2]
+    assert chunk_sizes(8, 4) == [4, 4]
+    assert chunk_sizes(3, 4) == [3]
+    # no items still make one empty chunk
+    assert chunk_sizes(0, 4) == [0]
+
+
+def test_map_chunks():
+    arguments = [(i, 10 * i) for i in range(5)]
+    expected = [11 * i for i in range(5)]
+    assert list(map_chunks(operator.add, arguments, processes=1)) == expected
+    assert list(map_chunks(operator.add, arguments, processes=2)) == expected
+    assert list(map_chunks(operator.add, [], processes=2)) == []
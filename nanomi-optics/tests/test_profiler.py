@@ -0,0 +1,46 @@
+import csv
+import numpy as np
+import pytest
+from nanomi_optics.__main__ import main
+from nanomi_optics.gui.profiler import StageProfiler
+
+
+def test_ring_buffer_percentiles():
+    profiler = StageProfiler(size=4)
+    assert np.all(np.isnan(profiler.percentiles("draw")))
+    for seconds in [1, 2, 3, 4, 5, 6]:
+        profiler.record("draw", seconds)
+    # the two oldest timings were overwritten
+    np.testing.assert_array_equal(profiler.timings("draw"), [3, 4, 5, 6])
+    np.testing.assert_allclose(profiler.percentiles("draw"), [4.5, 5.85])
+
+    with profiler.time("compute"):
+        pass
+    assert len(profiler.timings("compute")) == 1
+    profiler.clear()
+    assert len(profiler.timings("draw")) == 0
+
+
+def test_disabled_and_dump(tmp_path):
+    profiler = StageProfiler(enabled=False)
+    with profiler.time("compute"):
+        pass
+    assert profiler.counts["compute"] == 0
+
+    profiler = StageProfiler(size=2)
+    for stage, seconds in [("compute", 1), ("draw", 2), ("compute", 3),
+                           ("compute", 4)]:
+        profiler.record(stage, seconds)
+    path = tmp_path / "profile.csv"
+    profiler.dump(path)
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [(row["stage"], float(row["seconds"])) for row in rows] == [
+        ("draw", 2), ("compute", 3), ("compute", 4)
+    ]
+
+
+def test_profile_is_gui_only(capsys):
+    with pytest.raises(SystemExit):
+        main(["--profile", "startup"])
+    assert "--profile" in capsys.readouterr().err
@@ -0,0 +1,90 @@
+import numpy as np
+from nanomi_optics.engine.lens import Lens
+from nanomi_optics.engine.ray_transfer import (
+    as_ray_array, free_space_matrices, thin_lens_matrices, trace_column
+)
+
+OPTICAL_DISTANCE = 0.00001
+LAMBDA_ELECTRON = 0.0112e-6
+SCATTERING_ANGLE = LAMBDA_ELECTRON / OPTICAL_DISTANCE
+
+RAYS = [
+    np.array([[0], [SCATTERING_ANGLE]]),
+    np.array([[OPTICAL_DISTANCE], [SCATTERING_ANGLE]]),
+    np.array([[OPTICAL_DISTANCE], [0]])
+]
+CF = [19.67, 6.498, 6]
+LOCATION = [551.6, 706.4, 826.9]
+
+
+def lens_ray_path(ray, focal_lengths):
+    sample = Lens(528.9, None, None, None)
+    lenses = []
+    for i, cf in enumerate(focal_lengths):
+        lenses.append(
+            Lens(LOCATION[i], cf, lenses[-1] if i > 0 else sample, 3)
+        )
+    screen = Lens(972.7, 0, lenses[-1], 1)
+    heights, images, mags = [], [], []
+    for j, lens in enumerate(lenses):
+        if j != 0:
+            lens.update_output_plane_location()
+        _, el, _, mag = lens.ray_path(
+            ray if j == 0 else lenses[j - 1].ray_out_lens
+        )
+        heights.append(lens.ray_in_vac[0][0])
+        images.append(el[1][1])
+        mags.append(mag)
+    screen.ray_path(lenses[-1].ray_out_lens)
+    locations = [lens.output_plane_location for lens in lenses]
+    return heights, images, mags, locations, screen.ray_in_vac[0][0]
+
+
+def test_matrices():
+    np.testing.assert_allclose(
+        free_space_matrices([257.03, 349]),
+        [[[1, 257.03], [0, 1]], [[1, 349], [0, 1]]]
+    )
+    np.testing.assert_allclose(
+        thin_lens_matrices([67.29]),
+        [[[1, 0], [-0.014861049190073, 1]]],
+        rtol=1e-8,
+        atol=1e-8
+    )
+
+
+def test_trace_matches_lens():
+    rays = as_ray_array(RAYS)
+    assert rays.shape == (3, 2)
+    trace = trace_column(rays, LOCATION, CF, 528.9, 972.7)
+    for i, ray in enumerate(RAYS):
+        heights, images, mags, locations, screen = lens_ray_path(ray, CF)
+        np.testing.assert_allclose(
+            trace.lens_heights[i], heights, rtol=1e-12, atol=1e-15
+        )
+        np.testing.assert_allclose(
+            trace.image_heights[i], images, rtol=1e-12, atol=1e-15
+        )
+        np.testing.assert_allclose(
+            trace.screen_heights[i], screen, rtol=1e-12, atol=1e-15
+        )
+        np.testing.assert_allclose(trace.magnifications, mags, rtol=1e-12)
+        np.testing.assert_allclose(
+            trace.output_plane_locations, locations, rtol=1e-12
+        )
+
+
+def test_trace_broadcasts_columns():
+    focal_lengths = np.array([CF, [19.67, 7.0, 6], [25.0, 6.498, 12]])
+    trace = trace_column(RAYS, LOCATION, focal_lengths, 528.9, 972.7)
+    assert trace.lens_heights.shape == (3, 3, 3)
+    assert trace.screen_heights.shape == (3, 3)
+    assert trace.magnifications.shape == (3, 3)
+    for k, cf in enumerate(focal_lengths):
+        single = trace_column(RAYS, LOCATION, cf, 528.9, 972.7)
+        np.testing.assert_allclose(
+            trace.screen_heights[k], single.screen_heights
+        )
+        np.testing.assert_allclose(
+            trace.magnifications[k], single.magnifications
+        )
@@ -0,0 +1,72 @@
+import subprocess
+import sys
+import numpy as np
+from nanomi_optics.__main__ import main
+from nanomi_optics.batch import read_configurations
+from nanomi_optics.gui.artwork import HeadlessDiagram
+from nanomi_optics.render import render_diagrams, worker_diagram
+
+CSV = """f_C1,active_C2,f_Objective,active_Intermediate,distance,\
+optimize_lens,optimize_mode
+67.29,1,19.67,1,10,,Image
+30,0,19.67,0,20,Projective,Diffraction
+100,1,15,1,5,0,Image
+"""
+
+
+def test_render_png_and_svg(tmp_path):
+    (tmp_path / "input.csv").write_text(CSV)
+    configurations = read_configurations(str(tmp_path / "input.csv"))
+    folder = tmp_path / "diagrams"
+    paths = render_diagrams(
+        configurations, str(folder), ("png", "svg"), processes=1,
+        chunk_size=2
+    )
+    assert [p.rsplit("/", 1)[-1] for p in paths] == [
+        "diagram_00000.png", "diagram_00000.svg",
+        "diagram_00001.png", "diagram_00001.svg",
+        "diagram_00002.png", "diagram_00002.svg",
+    ]
+    for path in paths[::2]:
+        assert open(path, "rb").read(8) == b"\x89PNG\r\n\x1a\n"
+    for path in paths[1::2]:
+        assert "<svg" in open(path).read()
+
+    # the static artwork is drawn once and reused for every diagram
+    diagram = worker_diagram()
+    assert worker_diagram() is diagram
+    fresh = HeadlessDiagram()
+    assert len(diagram.axis.patches) == len(fresh.axis.patches)
+    assert len(diagram.axis.texts) == len(fresh.axis.texts)
+    # last configuration: objective optimized for the image
+    assert all(marker.get_visible() for marker in diagram.crossover_points_b)
+    assert diagram.mag_l_plot[0].get_text().endswith("x")
+
+
+def test_render_pool_matches_single_process(tmp_path):
+    configurations = {
+        "f_C1": np.linspace(20, 100, 5), "distance": np.linspace(5, 25, 5)
+    }
+    np.savez(tmp_path / "input.npz", **configurations)
+    main([
+        "render", str(tmp_path / "input.npz"), str(tmp_path / "pooled"),
+        "--processes", "2", "--chunk-size", "2"
+    ])
+    configurations = read_configurations(str(tmp_path / "input.npz"))
+    render_diagrams(configurations, str(tmp_path / "single"), processes=1)
+    for row in range(5):
+        name = f"diagram_{row:05d}.png"
+        assert (tmp_path / "pooled" / name).read_bytes() \
+            == (tmp_path / "single" / name).read_bytes()
+
+
+def test_render_is_headless():
+    code = (
+        "import sys, nanomi_optics.render as render; "
+        "render.worker_diagram(); print('tkinter' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True,
+        check=True
+    ).stdout
+    assert output.split() == ["False"]
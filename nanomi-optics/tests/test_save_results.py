@@ -1,7 +1,11 @@
 import os
 import csv
 from tempfile import TemporaryDirectory
-from nanomi_optics.engine.save_results import save_csv
+import numpy as np
+import pytest
+from nanomi_optics.engine.save_results import (
+    ResultsWriter, batch_schema, read_results, results_schema, save_csv
+)
 
 dirname = os.path.dirname(__file__)
 test_filename = os.path.join(dirname, 'resources/test.csv')
@@ -34,3 +38,103 @@ def test_csv():
                 output.append(row)
 
     assert test == output
+
+
+def columnar_results(size, rng):
+    return {
+        name: rng.random((size,) + shape) > 0.5 if dtype == "|b1"
+        else rng.random((size,) + shape)
+        for name, (dtype, shape) in batch_schema().items()
+    }
+
+
+@pytest.mark.parametrize("extension", [".npz", ".h5", ".parquet"])
+def test_columnar_round_trip(tmp_path, extension):
+    if extension == ".h5":
+        pytest.importorskip("h5py")
+    if extension == ".parquet":
+        pytest.importorskip("pyarrow")
+    results = columnar_results(1000, np.random.default_rng(0))
+    path = str(tmp_path / f"results{extension}")
+    # appends straddle the chunks
+    with ResultsWriter(path, chunk_rows=256) as writer:
+        for start in range(0, 1000, 300):
+            writer.append(
+                {key: value[start:start + 300]
+                 for key, value in results.items()}
+            )
+    with read_results(path) as reader:
+        assert len(reader) == 1000
+        assert reader.columns == list(batch_schema())
+        for key, value in results.items():
+            np.testing.assert_array_equal(reader[key], value)
+        np.testing.assert_array_equal(
+            reader.column("lower_ray_heights", 10, 20),
+            results["lower_ray_heights"][10:20]
+        )
+        # rows across chunks of the writer, Parquet row groups
+        np.testing.assert_array_equal(
+            reader.column("upper_ray_heights", 250, 530),
+            results["upper_ray_heights"][250:530]
+        )
+        np.testing.assert_array_equal(
+            reader.column("active_C1", -5), results["active_C1"][-5:]
+        )
+        assert len(reader.column("f_C1", 700, 600)) == 0
+        chunks = list(reader.chunks(["f_C1", "active_C2"], 400))
+        assert max(len(chunk["f_C1"]) for chunk in chunks) <= 400
+        np.testing.assert_array_equal(
+            np.concatenate([chunk["active_C2"] for chunk in chunks]),
+            results["active_C2"]
+        )
+
+
+def test_npz_is_mapped_and_loadable(tmp_path):
+    results = columnar_results(50, np.random.default_rng(1))
+    path = str(tmp_path / "results.npz")
+    with ResultsWriter(path, batch_schema(), chunk_rows=16) as writer:
+        writer.append(results)
+        with pytest.raises(ValueError):
+            writer.append({"f_C1": results["f_C1"]})
+    with np.load(path) as data:
+        np.testing.assert_array_equal(
+            data["upper_ray_heights"], results["upper_ray_heights"]
+        )
+    reader = read_results(path)
+    assert isinstance(reader["magnification"], np.memmap)
+
+    # compressed archives are read without mapping
+    np.savez_compressed(path, **results)
+    np.testing.assert_array_equal(
+        read_results(path)["active_C1"], results["active_C1"]
+    )
+    assert results_schema(results) == {
+        name: (np.dtype(dtype).str, shape)
+        for name, (dtype, shape) in batch_schema().items()
+    }
+
+
+@pytest.mark.parametrize("extension", [".npz", ".h5", ".parquet"])
+def test_small_and_failed_batches(tmp_path, extension):
+    if extension == ".h5":
+        h5py = pytest.importorskip("h5py")
+    if extension == ".parquet":
+        pytest.importorskip("pyarrow")
+    results = columnar_results(3, np.random.default_rng(2))
+    path = str(tmp_path / f"results{extension}")
+    with ResultsWriter(path) as writer:
+        writer.append(results)
+    # less than one uncompressed HDF5 chunk for every column
+    assert os.path.getsize(path) < 1 << 20
+    if extension == ".h5":
+        with h5py.File(path, "r") as file:
+            dataset = file["upper_ray_heights"]
+            assert np.prod(dataset.chunks) * 8 <= 1 << 20
+
+    # a batch failing halfway leaves no file with only some rows
+    os.remove(path)
+    with pytest.raises(RuntimeError):
+        with ResultsWriter(path, chunk_rows=2) as writer:
+            writer.append(results)
+            raise RuntimeError("configuration failed")
+    assert not os.listdir(tmp_path)
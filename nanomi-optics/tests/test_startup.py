@@ -0,0 +1,20 @@
+from nanomi_optics.startup import GUI_MODULE, cold_start, import_times
+
+
+def test_startup_modules():
+    # the time is tracked by the cold_start benchmark, not checked here
+    _, modules = cold_start(repeat=1)
+    # only needed when an optimization has no exact solution
+    assert "scipy.optimize" not in modules
+    assert GUI_MODULE in modules
+    # subcommands are only imported when they run
+    assert "nanomi_optics.__main__" in modules
+    assert "nanomi_optics.benchmark" not in modules
+
+
+def test_import_times():
+    times = import_times("nanomi_optics.engine.layout")
+    names = [name for _, _, name in times]
+    assert "nanomi_optics.engine.layout" in names
+    assert "numpy" in names
+    assert all(own <= cumulative for own, cumulative, _ in times)
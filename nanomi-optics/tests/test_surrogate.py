@@ -0,0 +1,37 @@
+import numpy as np
+from nanomi_optics.engine.ray_transfer import trace_column
+from nanomi_optics.engine.surrogate import SurrogateTable, build_table
+
+LOCATION = [551.6, 706.4, 826.9]
+
+
+def test_table_matches_exact_trace(tmp_path):
+    table = build_table(5, processes=1)
+    assert table.values.shape == (5, 5, 5, 7)
+    assert table.errors["magnification"] < 1e-9
+    assert table.errors["image_locations"] < 1e-9
+
+    # inside the bounds, and extrapolated outside of them
+    focal_lengths = [[19.67, 6.498, 6], [250, 40, 7.5], [3, -20, 500]]
+    exact = trace_column([[1, 0]], LOCATION, focal_lengths, 528.9, 972.7)
+    result = table(focal_lengths)
+    np.testing.assert_allclose(
+        result.magnification, exact.screen_heights[:, 0], rtol=1e-9
+    )
+    np.testing.assert_allclose(
+        result.image_locations, exact.output_plane_locations, rtol=1e-9
+    )
+
+    path = tmp_path / "table.npz"
+    table.save(path)
+    loaded = SurrogateTable.load(path)
+    assert loaded.errors == table.errors
+    np.testing.assert_array_equal(
+        loaded(focal_lengths).image_locations, result.image_locations
+    )
+
+
+def test_table_process_pool():
+    single = build_table(6, processes=1)
+    pooled = build_table(6, chunk_size=50, processes=2)
+    np.testing.assert_allclose(pooled.values, single.values)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from nanomi_optics.batch import evaluate_configurations, read_configurations
+from nanomi_optics.engine.inverse_design import probe_diameter
+from nanomi_optics.engine.layout import LAMBDA_ELECTRON
+from nanomi_optics.engine.ray_transfer import trace_column
+from nanomi_optics.engine.system_matrix import system_matrix
+from nanomi_optics.engine.sweep import FOCAL_LENGTHS, sweep
+
+UPPER = [257.03, 349, 517]
+LOWER = [551.6, 706.4, 826.9]
+
+
+def test_sweep_grid():
+    ranges = {
+        "f_C2": np.linspace(6, 300, 4),
+        "f_Projective": np.linspace(6, 300, 5),
+        "z_Intermediate": [700, 706.4, 710]
+    }
+    result = sweep(ranges, processes=1, chunk_size=7)
+    assert result.transverse_magnification.shape == (4, 5, 3)
+    assert result.crossover_locations.shape == (4, 5, 3, 3)
+    assert list(result.axes) == list(ranges)
+
+    for i, f_c2 in enumerate(ranges["f_C2"]):
+        for j, f_p in enumerate(ranges["f_Projective"]):
+            for k, z_i in enumerate(ranges["z_Intermediate"]):
+                upper_cf = [FOCAL_LENGTHS[0], f_c2, FOCAL_LENGTHS[2]]
+                lower_cf = [FOCAL_LENGTHS[3], FOCAL_LENGTHS[4], f_p]
+                lower_z = [LOWER[0], z_i, LOWER[2]]
+                upper = system_matrix(UPPER, upper_cf, 0, 528.9)
+                lower = trace_column(
+                    [[1, 0]], lower_z, lower_cf, 528.9, 972.7
+                )
+                np.testing.assert_allclose(
+                    result.probe_diameter[i, j, k], probe_diameter(upper)
+                )
+                np.testing.assert_allclose(
+                    result.transverse_magnification[i, j, k],
+                    lower.screen_heights[0]
+                )
+                np.testing.assert_allclose(
+                    result.image_locations[i, j, k],
+                    lower.output_plane_locations
+                )
+
+
+def test_sweep_and_batch_magnification(tmp_path):
+    f_p = np.linspace(20, 300, 4)
+    result = sweep({"f_Projective": f_p}, processes=1)
+    # the batch default of 10 nm from the axis
+    np.savez(tmp_path / "input.npz", f_Projective=f_p)
+    batch = evaluate_configurations(
+        read_configurations(str(tmp_path / "input.npz"))
+    )
+    cf = np.tile(FOCAL_LENGTHS[3:], (4, 1))
+    cf[:, 2] = f_p
+    matrix = system_matrix(LOWER, cf, 528.9, 972.7)
+    np.testing.assert_allclose(
+        result.transverse_magnification, matrix[:, 0, 0]
+    )
+    # the batch magnification includes the scattering angle
+    np.testing.assert_allclose(batch["magnification"], np.abs(
+        matrix[:, 0, 0] + matrix[:, 0, 1] * LAMBDA_ELECTRON / 1e-5 ** 2
+    ))
+
+
+def test_sweep_process_pool():
+    ranges = {"f_C1": np.linspace(6, 300, 30), "f_C3": [10, 20, 30]}
+    active = [True, True, True, True, False, True]
+    single = sweep(ranges, active=active, processes=1)
+    pooled = sweep(ranges, active=active, processes=2, chunk_size=16)
+    assert pooled.image_locations.shape == (30, 3, 2)
+    for expected, actual in zip(single[1:], pooled[1:]):
+        np.testing.assert_allclose(actual, expected)
+
+
+def test_sweep_unknown_parameter():
+    with pytest.raises(ValueError):
+        sweep({"f_C4": [1, 2]})
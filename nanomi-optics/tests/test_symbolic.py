@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from nanomi_optics.engine import symbolic
+from nanomi_optics.engine.ray_transfer import trace_column
+from nanomi_optics.engine.system_matrix import system_matrix_derivatives
+from nanomi_optics.engine.sweep import sweep
+
+pytest.importorskip("sympy")
+
+LOCATION = [551.6, 706.4, 826.9]
+CF = [19.67, 6.498, 6]
+
+
+def test_kernel_matches_numeric(tmp_path):
+    kernel = symbolic.column_kernel(
+        LOCATION, 528.9, 972.7, cache_dir=tmp_path
+    )
+    result = kernel(CF)
+    matrix, derivatives = system_matrix_derivatives(
+        LOCATION, CF, 528.9, 972.7
+    )
+    np.testing.assert_allclose(result.matrix, matrix, rtol=1e-9)
+    np.testing.assert_allclose(
+        result.derivatives, derivatives, rtol=1e-9, atol=1e-15
+    )
+
+    batch = [CF, [10, 20, 30], [-40, 7, 300]]
+    trace = trace_column([[1, 0], [0, 1]], LOCATION, batch, 528.9, 972.7)
+    result = kernel(batch)
+    np.testing.assert_allclose(
+        result.output_plane_locations, trace.output_plane_locations
+    )
+    np.testing.assert_allclose(result.magnifications, trace.magnifications)
+    np.testing.assert_allclose(
+        kernel.screen_heights([[1, 0], [0, 1]], batch), trace.screen_heights
+    )
+
+
+def test_kernel_source_cached_on_disk(tmp_path, monkeypatch):
+    kernel = symbolic.column_kernel(
+        LOCATION[:2], 528.9, 972.7, False, cache_dir=tmp_path
+    )
+    assert kernel(CF[:2]).derivatives is None
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # a new process only reads the generated source
+    monkeypatch.setattr(symbolic, "KERNELS", {})
+    monkeypatch.setattr(symbolic, "generate_source", None)
+    cached = symbolic.column_kernel(
+        LOCATION[:2], 528.9, 972.7, False, cache_dir=tmp_path
+    )
+    assert cached is not kernel and cached.source == kernel.source
+    # the key holds the lens locations
+    with pytest.raises(TypeError):
+        symbolic.column_kernel(
+            [551.6, 706.5], 528.9, 972.7, False, cache_dir=tmp_path
+        )
+
+
+def test_sweep_with_kernels():
+    ranges = {
+        "f_C2": np.linspace(6, 300, 4), "f_Projective": [-20, 6, 40]
+    }
+    expected = sweep(ranges, processes=1)
+    # the workers are sent the kernels, nothing is written to disk
+    for processes, chunk_size in ((1, 100), (2, 5)):
+        result = sweep(
+            ranges, processes=processes, chunk_size=chunk_size,
+            kernels=True
+        )
+        for actual, desired in zip(result[1:], expected[1:]):
+            np.testing.assert_allclose(actual, desired, rtol=1e-9)
+    assert symbolic.KERNEL_CACHE is None
@@ -0,0 +1,80 @@
+import numpy as np
+from nanomi_optics.engine.ray_transfer import trace_column
+from nanomi_optics.engine.system_matrix import (
+    SystemMatrixCache, system_matrix
+)
+
+OPTICAL_DISTANCE = 0.00001
+SCATTERING_ANGLE = 0.0112e-6 / OPTICAL_DISTANCE
+RAYS = np.array([
+    [0, SCATTERING_ANGLE],
+    [OPTICAL_DISTANCE, SCATTERING_ANGLE],
+    [OPTICAL_DISTANCE, 0]
+])
+CF = [19.67, 6.498, 6]
+LOCATION = [551.6, 706.4, 826.9]
+
+
+def assert_trace_close(trace, expected):
+    for actual, desired in zip(trace, expected):
+        np.testing.assert_allclose(actual, desired, rtol=1e-9, atol=1e-15)
+
+
+def test_system_matrix():
+    matrix = system_matrix(LOCATION, CF, 528.9, 972.7)
+    trace = trace_column(RAYS, LOCATION, CF, 528.9, 972.7)
+    np.testing.assert_allclose(
+        RAYS @ matrix.T[:, 0], trace.screen_heights, rtol=1e-9, atol=1e-15
+    )
+    # a column matrix keeps its determinant
+    np.testing.assert_allclose(np.linalg.det(matrix), 1)
+
+    batch = system_matrix(LOCATION, [CF, [10, 20, 30]], 528.9, 972.7)
+    assert batch.shape == (2, 2, 2)
+    np.testing.assert_allclose(batch[0], matrix)
+
+
+def test_cache_matches_trace():
+    cache = SystemMatrixCache(LOCATION, CF, 528.9, 972.7)
+    assert_trace_close(
+        cache.trace(RAYS), trace_column(RAYS, LOCATION, CF, 528.9, 972.7)
+    )
+
+    cf = [19.67, 12.5, 6]
+    cache.set_focal_lengths(cf)
+    assert_trace_close(
+        cache.trace(RAYS), trace_column(RAYS, LOCATION, cf, 528.9, 972.7)
+    )
+    np.testing.assert_allclose(
+        cache.system_matrix(), system_matrix(LOCATION, cf, 528.9, 972.7)
+    )
+
+
+def test_cache_single_lens_updates():
+    cache = SystemMatrixCache(LOCATION, CF, 528.9, 972.7)
+    cache.set_focal_length(1, 7)
+    cache.system_matrix()
+
+    # dragging one lens only costs the products around it
+    for cf in np.linspace(6, 300, 10):
+        cache.set_focal_length(1, cf)
+        count = cache.multiplications
+        matrix = cache.system_matrix()
+        assert cache.multiplications - count <= 3
+        np.testing.assert_allclose(
+            matrix, system_matrix(LOCATION, [19.67, cf, 6], 528.9, 972.7)
+        )
+
+    # prefix products upstream of the lens are reused
+    cache.output_plane_locations()
+    count = cache.multiplications
+    cache.set_focal_length(2, 50)
+    cache.output_plane_locations()
+    assert cache.multiplications - count == 2
+
+
+def test_cache_no_lenses():
+    cache = SystemMatrixCache([], [], 528.9, 972.7)
+    np.testing.assert_allclose(
+        cache.system_matrix(), [[1, 972.7 - 528.9], [0, 1]]
+    )
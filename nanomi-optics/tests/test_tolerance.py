@@ -0,0 +1,76 @@
+import json
+import numpy as np
+from nanomi_optics.__main__ import main
+from nanomi_optics.engine.column import lower_column
+from nanomi_optics.engine.system_matrix import system_matrix
+from nanomi_optics.engine.tolerance import Tolerance, tolerance_analysis
+
+LOWER = [551.6, 706.4, 826.9]
+FOCAL_LENGTHS = [19.67, 6.498, 6]
+
+
+def defocus(locations, focal_lengths):
+    matrix = system_matrix(locations, focal_lengths, 528.9, 972.7)
+    return -matrix[0, 1] / matrix[1, 1]
+
+
+def test_sensitivities_match_derivatives():
+    tolerances = {
+        "z_Intermediate": Tolerance("normal", 1e-4),
+        "f_Objective": Tolerance("uniform", 1e-5, relative=True),
+        "tilt_Projective": Tolerance("normal", 1e-3)
+    }
+    result = tolerance_analysis(
+        tolerances, num_samples=5000, defocus_tolerance=2e-3, processes=1
+    )
+    assert result.perturbations.shape == (5000, 3)
+    assert result.nominal["defocus"] == defocus(LOWER, FOCAL_LENGTHS)
+    assert result.nominal["astigmatism"] == 0
+
+    step = 1e-6
+    expected = [
+        (defocus([LOWER[0], LOWER[1] + step, LOWER[2]], FOCAL_LENGTHS)
+         - defocus(LOWER, FOCAL_LENGTHS)) / step,
+        (defocus(LOWER, [FOCAL_LENGTHS[0] + step, *FOCAL_LENGTHS[1:]])
+         - defocus(LOWER, FOCAL_LENGTHS)) / step
+    ]
+    np.testing.assert_allclose(
+        result.sensitivities["defocus"][:2], expected, rtol=1e-2
+    )
+    # a tilt is even in its error, it only adds astigmatism
+    assert abs(result.sensitivities["defocus"][2]) < 1e-2 * abs(expected[0])
+    assert np.all(result.astigmatism[result.perturbations[:, 2] != 0] != 0)
+    assert 0 < result.yield_fraction < 1
+
+
+def test_chunks_and_inactive_lens():
+    tolerances = {"f_Projective": Tolerance("normal", 0.01)}
+    single = tolerance_analysis(tolerances, num_samples=300, processes=1)
+    chunked = tolerance_analysis(
+        tolerances, num_samples=300, chunk_size=100, processes=2
+    )
+    assert single.yield_fraction is None
+    assert chunked.magnification.shape == (300,)
+
+    column = lower_column()
+    column.set_active([True, False, True])
+    result = tolerance_analysis(
+        tolerances, column=column, num_samples=10, processes=1
+    )
+    matrix = system_matrix([LOWER[0], LOWER[2]], [19.67, 6], 528.9, 972.7)
+    assert result.nominal["magnification"] == matrix[0, 0]
+
+
+def test_tolerance_command(tmp_path, capsys):
+    config = {
+        "samples": 200, "seed": 1, "magnification_tolerance": 0.05,
+        "parameters": {"z_Objective": {"scale": 0.01}}
+    }
+    (tmp_path / "tolerance.json").write_text(json.dumps(config))
+    output = str(tmp_path / "columns.npz")
+    main([
+        "tolerance", str(tmp_path / "tolerance.json"), "--output", output,
+        "--processes", "1"
+    ])
+    assert "yield" in capsys.readouterr().out
+    assert np.load(output)["dz_Objective"].shape == (200,)
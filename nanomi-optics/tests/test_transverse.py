@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from nanomi_optics.engine.layout import FOCAL_LENGTHS
+from nanomi_optics.engine.ray_transfer import trace_column
+from nanomi_optics.engine.transverse import (
+    Deflector, Stigmator, ThinLens, beam_shift_tilt, column_shift_tilt,
+    column_transfer, lens_elements, tilt_shift_kicks, trace_transverse
+)
+
+LOCATIONS = [551.6, 706.4, 826.9]
+
+RAYS = np.array([[0, 1e-3, 0, 0], [1e-5, 1e-3, 2e-5, -1e-3], [0, 0, 1e-5, 0]])
+
+
+def test_round_lenses_match_meridional_trace():
+    elements = lens_elements(FOCAL_LENGTHS[3:], LOCATIONS)
+    result = trace_transverse(RAYS, elements, 528.9, 972.7)
+    for plane in (slice(0, 2), slice(2, 4)):
+        trace = trace_column(
+            RAYS[:, plane], LOCATIONS, FOCAL_LENGTHS[3:], 528.9, 972.7
+        )
+        np.testing.assert_allclose(
+            result.screen_rays[:, plane.start], trace.screen_heights
+        )
+        np.testing.assert_allclose(
+            result.element_rays[:, :, plane.start].T, trace.lens_heights,
+            atol=1e-18
+        )
+
+
+def test_deflector_pair_shift_and_tilt():
+    first, second = tilt_shift_kicks([1e-3, 0], [0, 2e-3], 10)
+    pair = [
+        Deflector(100, first[0], first[1]),
+        Deflector(110, second[0], second[1])
+    ]
+    shift, tilt = beam_shift_tilt(pair, 0, 110)
+    np.testing.assert_allclose(shift, [1e-3, 0], atol=1e-18)
+    np.testing.assert_allclose(tilt, [0, 2e-3], atol=1e-18)
+
+    # a batch of settings in one pass, linear in the kicks
+    kicks = np.linspace(-1e-3, 1e-3, 5)
+    shift, tilt = column_shift_tilt([Deflector(300, kicks, 0)])
+    assert shift.shape == (5, 2)
+    np.testing.assert_allclose(shift[:, 0], kicks / kicks[-1] * shift[-1, 0])
+    np.testing.assert_allclose(shift[:, 1], 0)
+
+
+def test_stigmator_and_shifted_lens():
+    # focusing along 45 degrees couples x into y
+    transfer = column_transfer([Stigmator(0, 0.01, np.pi / 4)], 0, 0)
+    np.testing.assert_allclose(
+        transfer.matrix[[1, 1, 3, 3], [0, 2, 0, 2]], [0, -0.01, -0.01, 0],
+        atol=1e-18
+    )
+    # a ray through the centre of a shifted lens is not deflected
+    result = trace_transverse(
+        [[0.5, 0, -0.2, 0]], [ThinLens(10, 5, 0.5, -0.2)], 0, 20
+    )
+    np.testing.assert_allclose(result.screen_rays, [[0.5, 0, -0.2, 0]])
+
+
+def test_batched_locations():
+    kicks = [1e-3, 2e-3]
+    lens = ThinLens([100, 120], 10)
+    # at the lens in the first column and after it in the second
+    deflector = Deflector([100, 130], kicks, 0)
+    shift, _ = beam_shift_tilt([deflector, lens], 0, 200)
+    # every column on its own, in the given order
+    for i in range(2):
+        expected, _ = beam_shift_tilt(
+            [Deflector(deflector.location[i], kicks[i], 0),
+             ThinLens(lens.location[i], 10)], 0, 200
+        )
+        np.testing.assert_allclose(shift[i], expected)
+    # the deflector is after the lens in the first column only
+    with pytest.raises(ValueError):
+        beam_shift_tilt([lens, Deflector([105, 110], kicks, 0)], 0, 200)
@@ -0,0 +1,69 @@
+import numpy as np
+from nanomi_optics.engine.column import lower_column
+from nanomi_optics.engine.layout import LAMBDA_ELECTRON
+from nanomi_optics.engine.ray_transfer import free_space_matrices
+from nanomi_optics.engine.wave_optics import (
+    ImageSimulator, column_defocus, contrast_transfer, electron_wavelength,
+    specimen_phase, spatial_frequencies
+)
+
+SHAPE = (64, 48)
+PIXEL_SIZE = 0.2e-6
+
+
+def test_transfer_function():
+    assert abs(electron_wavelength() / LAMBDA_ELECTRON - 1) < 1e-3
+    defocus = 1e-4
+    # chi is -pi / 2 at half the squared frequency of the first zero
+    k2 = 0.5 / (electron_wavelength() * defocus)
+    ctf = contrast_transfer(
+        [0, k2], [defocus, -defocus], cs=0, energy_spread=0,
+        amplitude_contrast=0
+    )
+    np.testing.assert_allclose(ctf, [[0, -1], [0, 1]], atol=1e-12)
+    damped = contrast_transfer([k2], [defocus], cs=0, convergence=1e-3)
+    assert 0 < -damped[0, 0] < 1
+
+    frequencies = spatial_frequencies(SHAPE, PIXEL_SIZE)
+    assert frequencies.shape == (64, 25)
+    single = contrast_transfer(frequencies.astype(np.float32), [defocus])
+    assert single.dtype == np.float32
+
+
+def test_images_match_direct_fft():
+    specimen = specimen_phase(SHAPE, PIXEL_SIZE, particles=5)
+    simulator = ImageSimulator(SHAPE, PIXEL_SIZE, dtype=np.float64)
+    defoci = [0, 2e-4]
+    result = simulator.simulate(specimen, defoci, magnification=-100)
+    assert result.images.shape == (2, 64, 48)
+    assert result.pixel_size == 100 * PIXEL_SIZE
+
+    rows = np.fft.fftfreq(SHAPE[0], PIXEL_SIZE)
+    columns = np.fft.fftfreq(SHAPE[1], PIXEL_SIZE)
+    ctf = contrast_transfer(rows[:, None] ** 2 + columns ** 2, defoci)
+    expected = 1 + 2 * np.fft.ifft2(np.fft.fft2(specimen) * ctf).real
+    # a negative magnification turns the image by half a turn
+    np.testing.assert_allclose(result.images, expected[:, ::-1, ::-1])
+
+    # the same parameters come from the cache
+    again = simulator.simulate(specimen, defoci, magnification=-100)
+    assert again.images is result.images
+    assert simulator.images.hits == 1 and simulator.spectra.hits == 1
+    blank = ImageSimulator(SHAPE, PIXEL_SIZE).simulate(np.zeros(SHAPE), 0)
+    assert blank.images.dtype == np.float32
+    np.testing.assert_allclose(blank.images, 1)
+
+
+def test_column_defocus():
+    column = lower_column()
+    defocus, magnification = column_defocus(column)
+    # the screen is in focus for the plane the defocus before the sample
+    matrix = column.system_matrix() @ free_space_matrices(defocus)
+    assert abs(matrix[0, 1]) < 1e-9 * abs(column.system_matrix()[0, 1])
+    assert magnification == matrix[0, 0]
+
+    simulator = ImageSimulator(SHAPE, PIXEL_SIZE)
+    result = simulator.simulate_column(
+        column, specimen_phase(SHAPE, PIXEL_SIZE), [0, 1e-4]
+    )
+    np.testing.assert_allclose(result.defoci, defocus + np.array([0, 1e-4]))